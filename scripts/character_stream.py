@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Stream characters in and out of import files one at a time.
+
+Import files are either the importer's wrapped JSON ({"characters": [...]}),
+a bare JSON list of characters, or NDJSON (one character per line). Reading
+decodes one character at a time from a bounded buffer, and writing emits each
+character as soon as it is ready, so memory use is bounded by the largest
+single character rather than by the file.
+
+The JSON writer produces the same bytes as json.dump(..., indent=2) of the
+whole document would.
+"""
+
+import json
+import os
+from pathlib import Path
+
+
+CHUNK_SIZE = 1 << 20
+WRAPPER_KEY = 'characters'
+
+_decoder = json.JSONDecoder()
+
+
+def detect_format(path) -> str:
+    """'ndjson' for .ndjson/.jsonl files, otherwise 'json'."""
+    return 'ndjson' if Path(path).suffix.lower() in ('.ndjson', '.jsonl') else 'json'
+
+
+class _Reader:
+    """A text file with a decode position, refilled in chunks as needed."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of file)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in character file, found {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next JSON value, reading more of the file until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def array(self):
+        """Yield the items of the JSON array at the current position."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+
+def iter_characters(f, fmt: str = 'json'):
+    """Yield characters from an open text file one at a time.
+
+    `fmt` 'json' accepts both the wrapped {"characters": [...]} object (other
+    top-level keys are skipped) and a bare list; 'ndjson' reads one character
+    per non-empty line.
+    """
+    if fmt == 'ndjson':
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    reader = _Reader(f)
+    if reader.peek() == '[':
+        yield from reader.array()
+        return
+
+    reader.expect('{')
+    while reader.peek() != '}':
+        key = reader.value()
+        reader.expect(':')
+        if key == WRAPPER_KEY:
+            yield from reader.array()
+        else:
+            reader.value()
+        if reader.peek() == ',':
+            reader.pos += 1
+
+
+class CharacterWriter:
+    """Write characters one at a time to a temporary file, renamed into place on close.
+
+    `fmt` 'json' writes the wrapped {"characters": [...]} object the importer
+    and the import API use; 'ndjson' writes one character per line.
+    """
+
+    def __init__(self, path, fmt: str = 'json'):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(self.path.name + '.tmp')
+        self.fmt = fmt
+        self.count = 0
+        self.f = open(self.tmp_path, 'w', encoding='utf-8')
+        if fmt == 'json':
+            self.f.write(f'{{\n  "{WRAPPER_KEY}": [')
+
+    def write(self, character: dict) -> None:
+        if self.fmt == 'ndjson':
+            self.f.write(json.dumps(character, ensure_ascii=False) + '\n')
+        else:
+            # Indented as it would be inside the whole document
+            text = json.dumps(character, indent=2, ensure_ascii=False).replace('\n', '\n    ')
+            self.f.write((',\n    ' if self.count else '\n    ') + text)
+        self.count += 1
+
+    def close(self) -> None:
+        if self.fmt == 'json':
+            self.f.write('\n  ]\n}' if self.count else ']\n}')
+        self.f.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Close and delete the partial output, leaving any existing file untouched."""
+        self.f.close()
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -2,11 +2,21 @@
 """
 Edit and enrich vault character data.
 Fixes typos, improves formatting, corrects relationship types, adds missing NPCs.
+
+Character-specific edits are declarative patch files in character_patches/.
 """
 
+import argparse
+import contextlib
+import hashlib
 import json
 import re
 import sys
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+
+from character_stream import CharacterWriter, detect_format, iter_characters
 
 sys.stdout.reconfigure(encoding='utf-8')
 
@@ -203,598 +213,263 @@ def clean_npc_notes(notes):
     return notes.strip()
 
 
-# ========== CHARACTER-SPECIFIC EDIT FUNCTIONS ==========
-
-def edit_anastasia(char):
-    """Edit Anastasia Callahan."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['notes'] = fix_formatting(fix_common_typos(char.get('notes', '')))
-    char['race'] = 'Human'
-    char['character_tags'] = ['magic-user', 'noble-connected', 'underground']
-
-    char['important_people'] = [
-        {
-            'name': 'Giselbert Almayda',
-            'relationship_type': 'mentor',
-            'notes': 'One of the Talabheim Eleven. Sharp, patient, and oddly kind. Became a friend as much as a teacher. Nickname is "Orchpyre" (set a lot of orcs on fire). Needs allies to investigate the murder of his old mentor Eike von Hath. Powerful in the Hexenguilde.'
-        },
-        {
-            'name': 'Jaime de Sabatin',
-            'relationship_type': 'criminal_contact',
-            'notes': "Don't trust him. Uses Ana as middleman for selling magic items to Hexenguilde members. Has powerful enemies that keep him in Talabheim. Transient - doesn't know where he stays."
-        },
-        {
-            'name': 'Baron Rainer Feuerbach',
-            'relationship_type': 'patron',
-            'notes': "Very smart and ambitious. Has good connections. In a secret relationship with Ebore, a courtier who is strange and probably magically gifted. Has relations with Caroline Von Kassel (noble). Ana's former employer - she just left one day."
-        },
-        {
-            'name': 'Penny',
-            'relationship_type': 'pet_familiar',
-            'notes': 'Black ferret familiar. Useful in Jaime\'s line of work.'
-        },
-        {
-            'name': 'Egon',
-            'relationship_type': 'family',
-            'notes': 'Father. Priest of Morr. Fled with baby Ana to Talabheim after her mother was burned for witchcraft. Arranged her training with Baron Feuerbach to keep her safe.'
-        }
-    ]
-    return char
-
-
-def edit_cornelia(char):
-    """Edit Cornelia 'Lia' O'Nest."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Air Genasi'
-    char['class'] = 'Druid'
-    char['character_tags'] = ['nature', 'magic-user', 'outsider']
-
-    char['important_people'] = [
-        {
-            'name': 'Mrs. Cabbernath',
-            'relationship_type': 'other',
-            'notes': 'Old woman Lia tried to help with potions. Accidentally almost blew off the roof of her hut.'
-        },
-        {
-            'name': 'Alfonse "Big Al" Kalazorn',
-            'relationship_type': 'other',
-            'notes': 'Ranch owner whose ranch was attacked by orcs. The party helped him.'
-        }
-    ]
-    return char
-
-
-def edit_cove(char):
-    """Edit Cove."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Water Genasi'
-    char['class'] = 'Blood Hunter'
-    char['character_tags'] = ['blood-magic', 'revenge', 'magic-user']
-
-    # Fix TLDR typos
-    if char.get('tldr'):
-        char['tldr'] = [fix_common_typos(item) for item in char['tldr']]
-
-    char['important_people'] = [
-        {
-            'name': 'Tide',
-            'relationship_type': 'family',
-            'notes': 'Twin brother. Lazy but full of light. Was sent away to serve in Lathander\'s clergy. Now travels with Cove.'
-        },
-        {
-            'name': 'Father',
-            'relationship_type': 'family',
-            'notes': 'Fisherman. Became a broken man after his wife was killed. Now retired.'
-        },
-        {
-            'name': 'Mother',
-            'relationship_type': 'family',
-            'notes': 'Deceased. Killed by pirates while returning from a fishing trip with Cove. Fought to protect her daughter before being struck down.'
-        },
-        {
-            'name': 'Neritha',
-            'relationship_type': 'patron',
-            'notes': 'Deep sea witch, more fishlike than human. Gave Cove blood magic in exchange for a blood pact. Her voice still whispers in Cove\'s head: "Child of the sea. You\'ve only just begun to drown."'
-        }
-    ]
-    return char
-
-
-def edit_daeja(char):
-    """Edit Daeja."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Human'
-    char['class'] = 'Ranger'
-    char['background'] = 'Noble'
-    char['character_tags'] = ['royal-heritage', 'nature', 'hidden-identity']
-    char['fears'] = ['darkness', 'ducks']
-
-    char['important_people'] = [
-        {
-            'name': 'The Queen',
-            'relationship_type': 'family',
-            'notes': 'Biological mother. Had an affair with the commander of the king\'s guard. Ordered Daeja to be taken away to hide the affair.'
-        },
-        {
-            'name': 'Uncle (Commander)',
-            'relationship_type': 'family',
-            'notes': 'Biological father. Commander of the king\'s guard. Staged a kidnapping of Daeja and raised her as his niece in Ruby\'s Creek. Taught her archery and survival. Recently disappeared without explanation.'
-        },
-        {
-            'name': 'The King',
-            'relationship_type': 'other',
-            'notes': 'Not Daeja\'s real father, though he believes she was kidnapped as a child.'
-        }
-    ]
-    return char
-
-
-def edit_emerlin(char):
-    """Edit Emerlin Reeves."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Human'
-    char['class'] = 'Swashbuckler'
-    char['character_tags'] = ['pirate', 'betrayed', 'survivor']
-
-    char['important_people'] = [
-        {
-            'name': 'Emily',
-            'relationship_type': 'family',
-            'notes': 'Mother. A baker. Adored Emerlin, perhaps too much.'
-        },
-        {
-            'name': 'Challas',
-            'relationship_type': 'family',
-            'notes': 'Father. A blacksmith.'
-        },
-        {
-            'name': 'Emmet, Ethan, Elias',
-            'relationship_type': 'family',
-            'notes': 'Three older brothers. Resented Emerlin for receiving their parents\' attention. Sold her to a pirate ship out of jealousy.'
-        },
-        {
-            'name': 'Noah',
-            'relationship_type': 'romantic',
-            'notes': 'Young crew member who taught Emerlin to fight with a rapier. They grew close. Last seen fending off attackers when their ship was attacked. Emerlin hopes he survived.'
-        }
-    ]
-    return char
-
-
-def edit_eve(char):
-    """Edit Eve Astor."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Human'
-    char['class'] = 'Fighter'
-    char['character_tags'] = ['military', 'family-honor', 'underdog']
-
-    char['important_people'] = [
-        {
-            'name': 'Parents',
-            'relationship_type': 'family',
-            'notes': 'Guard/military background. Disappointed in Eve for not being as skilled as her sisters.'
-        },
-        {
-            'name': 'Six Sisters',
-            'relationship_type': 'family',
-            'notes': 'All better fighters than Eve. Family of protectors and law upholders.'
-        }
-    ]
-    return char
-
-
-def edit_fleur_alerie(char):
-    """Edit Fleur Alerie."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Human'
-    char['class'] = 'Wizard'
-    char['character_tags'] = ['magic-user', 'cursed-family', 'investigator']
-
-    # Remove the incorrect "Centuries-old" NPC
-    char['important_people'] = [
-        {
-            'name': 'Bertrand',
-            'relationship_type': 'family',
-            'notes': 'Adoptive father. Antiquarian of magical ancient artifacts. Put on "The Ring of Futures" which whispered to him and drove him mad. Left to protect Fleur. She swore to find a way to break the curse and save him.'
-        },
-        {
-            'name': 'Father',
-            'relationship_type': 'family',
-            'notes': 'Biological father. Travelling merchant who sold artifacts to Bertrand. Left Fleur in Bertrand\'s care after her mother died.'
-        },
-        {
-            'name': 'Mother',
-            'relationship_type': 'family',
-            'notes': 'Deceased. Got sick shortly after Fleur\'s birth and passed away.'
-        }
-    ]
-    return char
-
-
-def edit_fleur(char):
-    """Edit Fleur (the half-elf, different from Fleur Alerie)."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Half-Elf'
-    char['class'] = 'Fighter'
-    char['character_tags'] = ['royal-heritage', 'orphan', 'survivor', 'criminal']
-
-    if char.get('tldr'):
-        char['tldr'] = [fix_common_typos(item) for item in char['tldr']]
-
-    char['important_people'] = [
-        {
-            'name': 'King Zeon',
-            'relationship_type': 'family',
-            'notes': 'Biological father. King who had a one-night affair with Aela during a blood moon. Doesn\'t know Fleur exists.'
-        },
-        {
-            'name': 'Aela',
-            'relationship_type': 'family',
-            'notes': 'Mother. Beautiful elven woman whose father was on the high council. Left Ora-Tel\'Teuvel to hide her pregnancy. Never returned after seeking help from the king when Fleur was six.'
-        },
-        {
-            'name': 'Nana',
-            'relationship_type': 'family',
-            'notes': 'Older lady who runs "High Tide Pie" shop. Took in Fleur after catching her stealing a pie. Raised her as her own.'
-        }
-    ]
-    return char
-
-
-def edit_freya(char):
-    """Edit Freya Le Croy."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Elf'
-    char['age'] = 26
-    char['character_tags'] = ['scarred', 'loner', 'criminal']
-
-    char['important_people'] = [
-        {
-            'name': 'Mother',
-            'relationship_type': 'family',
-            'notes': 'Strict mother who raised her with a strong fist.'
-        }
-    ]
-    return char
-
-
-def edit_kitanya(char):
-    """Edit Kitanya Neaze."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Goblin'
-    char['class'] = 'Rogue'
-    char['background'] = 'Criminal'
-    char['character_tags'] = ['hidden-identity', 'criminal', 'outsider']
-    char['fears'] = ['water', 'frogs']
-    char['common_phrases'] = [
-        "Hold me back",
-        "Who are you calling small?!",
-        "Let me have em!",
-        "I'm human you doofus"
-    ]
-
-    char['important_people'] = [
-        {
-            'name': 'Morris',
-            'relationship_type': 'family',
-            'notes': 'Brother. "Dumb as a door" according to Kitanya.'
-        },
-        {
-            'name': 'Mama',
-            'relationship_type': 'family',
-            'notes': 'Human adoptive mother. Told Kitanya that everyone is different.'
-        }
-    ]
-    return char
-
-
-def edit_lyra(char):
-    """Edit Lyra Forglemmigej."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Half-Elf'
-    char['class'] = 'Ranger'
-    char['character_tags'] = ['amnesia', 'kindhearted', 'nature', 'tragic-past']
-
-    char['important_people'] = [
-        {
-            'name': 'Father',
-            'relationship_type': 'family',
-            'notes': 'Elf. Good with animals. Was driven mad by illusion magic and killed Flora, thinking she was a monster. Then killed by the elves.'
-        },
-        {
-            'name': 'Mother',
-            'relationship_type': 'family',
-            'notes': 'Human. Good with medicine and healing. Killed by drunk elves who attacked their camp.'
-        },
-        {
-            'name': 'Flora',
-            'relationship_type': 'family',
-            'notes': 'Little sister (half-elf). Killed by her own father who was under illusion magic.'
-        }
-    ]
-    return char
-
-
-def edit_mascha(char):
-    """Edit Mascha Huxley (Lancer)."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Human'
-    char['class'] = 'Mech Pilot'
-    char['game_system'] = 'Lancer'
-    char['character_tags'] = ['scientist', 'tragic-past', 'cybernetics']
-
-    char['important_people'] = [
-        {
-            'name': 'Aala',
-            'relationship_type': 'family',
-            'notes': 'Sister. Died of leukemia at around 16. Inspired Mascha\'s work in bioengineering and human enhancement. Her mech is named after her.'
-        },
-        {
-            'name': 'Father',
-            'relationship_type': 'family',
-            'notes': 'Mechanic. Very busy, not home much.'
-        },
-        {
-            'name': 'Mother',
-            'relationship_type': 'family',
-            'notes': 'Nurse at a hospital for the poor. Basically lived at the hospital, very disconnected from family.'
-        },
-        {
-            'name': 'Grandmother',
-            'relationship_type': 'family',
-            'notes': 'Almost blind. Looked after the children while parents worked.'
-        },
-        {
-            'name': 'Kato',
-            'relationship_type': 'pet_familiar',
-            'notes': 'Cyborg dog. Found as a scruffy street dog hit by a car. Mascha saved him and spent months creating the perfect cyborg companion. Name means "All-knowing" in Latin.'
-        }
-    ]
-    return char
-
-
-def edit_mei(char):
-    """Edit Mei Day."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Lightfoot Halfling'
-    char['class'] = 'Rogue'
-    char['character_tags'] = ['criminal', 'orphan', 'thief']
-
-    char['important_people'] = [
-        {
-            'name': 'Huxley',
-            'relationship_type': 'family',
-            'notes': 'Adoptive father. A scammer, con artist, and thief who found Mei abandoned as a baby. Taught her his lifestyle. Has criminal acquaintances.'
-        }
-    ]
-    return char
-
-
-def edit_nora(char):
-    """Edit Nora (Two)."""
-    char['name'] = 'Nora (Two)'
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Changeling'
-    char['class'] = 'Inquisitive Rogue'
-    char['character_tags'] = ['assassin', 'changeling', 'escaped', 'hidden-identity']
-
-    char['important_people'] = [
-        {
-            'name': 'Ezra',
-            'relationship_type': 'enemy',
-            'notes': 'Father. Power-mad man who created "The House of Ezra" - an empire of assassins and thieves. Seduced women across the land and took the changeling children to raise as killers.'
-        },
-        {
-            'name': 'Amir',
-            'relationship_type': 'mentor',
-            'notes': 'Ezra\'s right hand. Elite assassin who trained the children.'
-        },
-        {
-            'name': 'One',
-            'relationship_type': 'enemy',
-            'notes': 'Former best friend and sibling. Shared a bedroom with Two. Refused to escape with her and threatened to tell Ezra. Two had to knock him out to flee.'
-        },
-        {
-            'name': 'Katarina',
-            'relationship_type': 'other',
-            'notes': 'A 6-year-old girl Two was sent to assassinate. Unable to kill a child, Two failed the mission and was punished. This led to her escape.'
-        }
-    ]
-    return char
-
-
-def edit_rue(char):
-    """Edit Rue Redistuo."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Changeling'
-    char['class'] = 'Sorcerer'
-    char['character_tags'] = ['changeling', 'orphan', 'magic-user', 'survivor']
-
-    char['important_people'] = [
-        {
-            'name': 'Fallax',
-            'relationship_type': 'family',
-            'notes': 'Biological parent. Changeling spy from The Nexus who works as a corrupt spy. Left a magical tattoo on Rue\'s wrist that becomes visible when she comes of age.'
-        },
-        {
-            'name': 'Adoptive Father',
-            'relationship_type': 'enemy',
-            'notes': 'Killed one of his own children thinking it was Rue when she accidentally shapeshifted. Called her a witch and swore to find and kill her.'
-        },
-        {
-            'name': 'Alex',
-            'relationship_type': 'friend',
-            'notes': 'Similar-aged male who found Rue on the streets and took her in. Taught her about magic. His parents were replaced by changelings (possibly related to Rue\'s origin). She helped him escape.'
-        }
-    ]
-    return char
-
-
-def edit_seraphine(char):
-    """Edit Seraphine Valeriel."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['race'] = 'Half-Siren'
-    char['class'] = 'Fighter'
-    char['character_tags'] = ['military', 'outsider', 'half-blood', 'loyal']
-
-    char['important_people'] = [
-        {
-            'name': 'Adoptive Father',
-            'relationship_type': 'family',
-            'notes': 'High-ranking member of the Aresian council. Found Seraphine as a toddler and adopted her. Never had time for a partner or children of his own. Trained her in military discipline.'
-        },
-        {
-            'name': 'Trishera',
-            'relationship_type': 'enemy',
-            'notes': 'Rival. Finished just below Seraphine in training and has been jealous ever since. Makes it her personal mission to make Seraphine\'s life miserable.'
-        },
-        {
-            'name': 'Astar',
-            'relationship_type': 'friend',
-            'notes': 'Blind traveler Seraphine defended at an inn. She treated his wounds and apologized for her squad\'s behavior. They left together the next morning. Searching for artifacts to cure a sickness.'
-        }
-    ]
+# ========== DECLARATIVE EDIT PATCHES ==========
+#
+# Per-character edits live in character_patches/*.json instead of code. Each
+# file holds {"patches": [...]}; a patch is
+#
+#   {
+#     "note": "optional comment",
+#     "match": {"ids": ["<character id>"], "names": ["Nora _ Two", "Nora (Two)"]},
+#     "fix": {"format": ["description"], "typos": ["tldr"]},
+#     "set": {"race": "Changeling", ...},
+#     "append": {"fears": ["ducks"]},
+#     "merge": {"important_people": [{"name": "Ezra", "notes": "..."}]}
+#   }
+#
+# applied in that order: "format" runs fix_common_typos + fix_formatting on a
+# text field, "typos" runs fix_common_typos on a text or list field, "set"
+# replaces fields, "append" adds missing list items, and "merge" updates list
+# entries with the same name (or dict keys) and adds the rest. Characters no
+# patch matches get DEFAULT_PATCH.
+#
+# fix_formatting() is not idempotent, so every edited character is stamped
+# with a hash of the rules applied and of the resulting content. A character
+# whose stamp still matches both is passed through untouched on later runs.
+
+PATCHES_DIR = Path(__file__).parent / "character_patches"
+
+DEFAULT_PATCH = {'fix': {'format': ['description', 'notes']}}
+
+STAMP_FIELD = 'edit_stamp'
+# Part of every rules hash, so edits made by another version of this script
+# (and its formatting functions) are redone
+EDITOR_VERSION = hashlib.sha1(Path(__file__).read_bytes()).hexdigest()[:12]
+
+
+def normalize_character_name(name):
+    """Normalise a name for matching: accents, quotes, punctuation and case are dropped."""
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = re.sub(r'[\'"\u2018\u2019\u201c\u201d]', '', name.casefold())
+    return ' '.join(re.sub(r'[\W_]+', ' ', name).split())
+
+
+def load_patches(patches_dir=PATCHES_DIR):
+    """All patches from the JSON files in a directory, in file name order."""
+    patches = []
+    for path in sorted(Path(patches_dir).glob('*.json')):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for patch in data.get('patches', []):
+            patch = dict(patch)
+            patch['source'] = path.name
+            patches.append(patch)
+    return patches
+
+
+class PatchIndex:
+    """Patches indexed by character ID and normalised name for constant-time lookup."""
+
+    def __init__(self, patches):
+        self.patches = patches
+        self.by_id = defaultdict(list)
+        self.by_name = defaultdict(list)
+        self._rules = {}
+        for position, patch in enumerate(patches):
+            match = patch.get('match', {})
+            for char_id in match.get('ids', []):
+                self.by_id[str(char_id)].append(position)
+            for name in match.get('names', []):
+                self.by_name[normalize_character_name(name)].append(position)
+
+    def patches_for(self, char):
+        """Patches matching a character by ID or name, in load order."""
+        positions = set(self.by_name.get(normalize_character_name(char.get('name')), []))
+        if char.get('id') is not None:
+            positions.update(self.by_id.get(str(char['id']), []))
+        return [self.patches[p] for p in sorted(positions)]
+
+    def rules_hash(self, patches):
+        """Hash of the editor version and the given patches (cached per combination)."""
+        key = tuple(id(p) for p in patches)
+        if key not in self._rules:
+            rules = [EDITOR_VERSION] + [{k: v for k, v in p.items() if k != 'source'} for p in patches]
+            encoded = json.dumps(rules, sort_keys=True, ensure_ascii=False).encode('utf-8')
+            self._rules[key] = hashlib.sha1(encoded).hexdigest()
+        return self._rules[key]
+
+
+def content_hash(char):
+    """Hash of a character's content, excluding its edit stamp."""
+    content = {k: v for k, v in char.items() if k != STAMP_FIELD}
+    return hashlib.sha1(json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _merge_value(current, update):
+    """Merge a patch value into a field: dicts by key, lists of named dicts by name."""
+    if isinstance(current, dict) and isinstance(update, dict):
+        return {**current, **update}
+    if not isinstance(current, list) or not isinstance(update, list):
+        return update
+    merged = [dict(item) if isinstance(item, dict) else item for item in current]
+    positions = {normalize_character_name(item.get('name')): i
+                 for i, item in enumerate(merged) if isinstance(item, dict) and item.get('name')}
+    for item in update:
+        key = normalize_character_name(item.get('name')) if isinstance(item, dict) else None
+        if key and key in positions:
+            merged[positions[key]].update(item)
+        elif item not in merged:
+            if key:
+                positions[key] = len(merged)
+            merged.append(item)
+    return merged
+
+
+def apply_patch(char, patch):
+    """Apply one patch to a character in place."""
+    fix = patch.get('fix', {})
+    for field in fix.get('format', []):
+        char[field] = fix_formatting(fix_common_typos(char.get(field, '')))
+    for field in fix.get('typos', []):
+        value = char.get(field)
+        if isinstance(value, list):
+            char[field] = [fix_common_typos(item) for item in value]
+        elif value:
+            char[field] = fix_common_typos(value)
+
+    for field, value in patch.get('set', {}).items():
+        char[field] = value
+    for field, values in patch.get('append', {}).items():
+        items = list(char.get(field) or [])
+        for value in values:
+            if value not in items:
+                items.append(value)
+        char[field] = items
+    for field, value in patch.get('merge', {}).items():
+        char[field] = _merge_value(char.get(field), value)
     return char
 
 
-def edit_shae(char):
-    """Edit Shae Nadine Flint."""
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['game_system'] = 'Spelljammer/D&D 5e'
-    char['character_tags'] = ['pirate', 'spelljammer', 'noble', 'twins']
-
-    # Remove the incorrectly detected NPCs and add correct ones
-    char['important_people'] = [
-        {
-            'name': 'Captain Nathaniel Flint',
-            'relationship_type': 'family',
-            'notes': 'Father. Notorious pirate captain who ruled with an iron fist. Feared throughout the cosmos. "Show no weakness, show no mercy" was his creed.'
-        },
-        {
-            'name': 'Mother (The Queen)',
-            'relationship_type': 'family',
-            'notes': 'Equally ruthless as her husband. Together they were feared throughout the starlit void.'
-        },
-        {
-            'name': 'Shadow',
-            'relationship_type': 'family',
-            'notes': 'Twin sibling. Inseparable from Shae, two sides of the same coin. As they grew, tension developed - Shae began questioning the violence while Shadow embraced it.'
-        }
-    ]
-    return char
-
-
-def edit_silvia(char):
-    """Edit Silvia 'Baby' Jennings."""
-    char['name'] = 'Silvia "Baby" Jennings'
-    char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-    char['status'] = 'draft'
-    char['character_tags'] = ['poor-background']
-
-    char['important_people'] = [
-        {
-            'name': 'Parents',
-            'relationship_type': 'family',
-            'notes': 'Poor family.'
-        },
-        {
-            'name': 'Three Brothers',
-            'relationship_type': 'family',
-            'notes': 'Has three brothers.'
-        }
-    ]
-    return char
-
-
-def main():
-    input_file = r"C:\Users\edbar\Downloads\Character\vault_characters_import.json"
-    output_file = r"C:\Users\edbar\Downloads\Character\vault_characters_import_edited.json"
-
-    with open(input_file, 'r', encoding='utf-8') as f:
-        characters = json.load(f)
-
-    print(f"Loaded {len(characters)} characters")
-    print("=" * 70)
-
-    edit_functions = {
-        'anastasia callahan': edit_anastasia,
-        'cornelia': edit_cornelia,  # Match by first name due to special chars
-        'cove': edit_cove,
-        'daeja': edit_daeja,
-        'emerlin reeves': edit_emerlin,
-        'eve astor': edit_eve,
-        'fleur alerie': edit_fleur_alerie,
-        'freya le croy': edit_freya,
-        'kitanya neaze': edit_kitanya,
-        'lyra forglemmigej': edit_lyra,
-        'mascha huxley': edit_mascha,
-        'mei day': edit_mei,
-        'nora': edit_nora,  # Match by first name due to extra spaces
-        'rue redistuo': edit_rue,
-        'seraphine valeriel': edit_seraphine,
-        'shae nadine flint': edit_shae,
-        'silvia': edit_silvia,  # Match by first name due to special chars
-    }
-    # Special handling for Fleur (there are two)
-    edit_functions_fleur = edit_fleur
-
-    def normalize_name(n):
-        """Normalize name for matching by removing special chars."""
-        import unicodedata
-        # Normalize unicode
-        n = unicodedata.normalize('NFKD', n)
-        # Replace common special chars
-        for old, new in [('"', '"'), ('"', '"'), ("'", "'"), ("'", "'"), ('  ', ' ')]:
-            n = n.replace(old, new)
-        return n.lower().strip()
-
-    def find_edit_function(name):
-        """Find the edit function for a character name."""
-        norm = normalize_name(name)
-        # Direct match
-        if norm in edit_functions:
-            return edit_functions[norm]
-        # First name match
-        first_name = norm.split()[0] if norm else ''
-        if first_name in edit_functions:
-            return edit_functions[first_name]
-        # Special case for "Fleur" (there are two - Fleur Alerie and just Fleur)
-        if first_name == 'fleur' and 'alerie' not in norm:
-            return edit_functions_fleur
-        # Partial match
-        for key in edit_functions:
-            if key in norm or norm.startswith(key):
-                return edit_functions[key]
+class PreviousOutput:
+    """Characters from the last run's output, looked up by the hash of their unedited input.
+
+    Read lazily alongside the input: characters come out in input order, so
+    the one wanted is usually the next one, and any skipped on the way are
+    kept until asked for.
+    """
+
+    def __init__(self, path, fmt):
+        self.f = open(path, 'r', encoding='utf-8')
+        self.characters = iter_characters(self.f, fmt)
+        self.skipped = {}
+
+    def find(self, input_hash):
+        if input_hash in self.skipped:
+            return self.skipped.pop(input_hash)
+        try:
+            for char in self.characters:
+                stamped = (char.get(STAMP_FIELD) or {}).get('input')
+                if stamped == input_hash:
+                    return char
+                if stamped:
+                    self.skipped[stamped] = char
+        except ValueError:
+            # An unreadable previous output only means nothing can be reused
+            self.characters = iter(())
         return None
 
-    for i, char in enumerate(characters):
-        name = char['name']
-        print(f"\nEditing: {name}")
-
-        edit_fn = find_edit_function(name)
-        if edit_fn:
-            char = edit_fn(char)
-        else:
-            # Apply general fixes
-            char['description'] = fix_formatting(fix_common_typos(char.get('description', '')))
-            char['notes'] = fix_formatting(fix_common_typos(char.get('notes', '')))
-
-        characters[i] = char
-
-        # Show summary
-        print(f"  Race: {char.get('race', '?')}")
-        print(f"  Class: {char.get('class', '?')}")
-        print(f"  Tags: {char.get('character_tags', [])}")
-        print(f"  NPCs: {len(char.get('important_people', []))}")
-        for npc in char.get('important_people', []):
-            print(f"    - {npc['name']} ({npc['relationship_type']})")
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def edit_character(char, index, previous=None):
+    """Apply every matching patch (or DEFAULT_PATCH) to a character and stamp it.
+
+    The stamp records the rules, the hash of the unedited input and the hash
+    of the result. A character is not edited again when it is already stamped
+    with the same rules and unchanged since, or when `previous` (the last
+    run's output) holds it edited from the same input with the same rules.
+    Returns (character, patches, whether it was edited).
+    """
+    patches = index.patches_for(char) or [DEFAULT_PATCH]
+    rules = index.rules_hash(patches)
+    stamp = char.get(STAMP_FIELD)
+    if stamp and stamp.get('rules') == rules and stamp.get('content') == content_hash(char):
+        return char, patches, False
+
+    char.pop(STAMP_FIELD, None)
+    input_hash = content_hash(char)
+    if previous is not None:
+        done = previous.find(input_hash)
+        if done is not None and done[STAMP_FIELD].get('rules') == rules:
+            return done, patches, False
+
+    for patch in patches:
+        apply_patch(char, patch)
+    char[STAMP_FIELD] = {'rules': rules, 'input': input_hash, 'content': content_hash(char)}
+    return char, patches, True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply declarative edit patches to vault characters.")
+    parser.add_argument('--input', default=r"C:\Users\edbar\Downloads\Character\vault_characters_import.json")
+    parser.add_argument('--output', default=r"C:\Users\edbar\Downloads\Character\vault_characters_import_edited.json")
+    parser.add_argument('--patches', type=Path, default=PATCHES_DIR, help="directory of patch JSON files")
+    parser.add_argument('--format', choices=['auto', 'json', 'ndjson'], default='auto',
+                        help="input format; auto picks ndjson for .ndjson/.jsonl files")
+    parser.add_argument('--output-format', choices=['auto', 'json', 'ndjson'], default='auto',
+                        help="output format; auto uses the same format as the input")
+    parser.add_argument('--quiet', action='store_true', help="only print the final count")
+    args = parser.parse_args(argv)
+
+    input_format = detect_format(args.input) if args.format == 'auto' else args.format
+    output_format = input_format if args.output_format == 'auto' else args.output_format
+
+    index = PatchIndex(load_patches(args.patches))
+    print(f"Loaded {len(index.patches)} patches")
+    print("=" * 70)
 
-    # Save edited version
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(characters, f, indent=2, ensure_ascii=False)
+    # The last run's output, to reuse characters whose input and rules are unchanged.
+    # It is opened last so it is closed before the writer replaces the file
+    # (Windows cannot replace a file that is still open), also on errors.
+    reuse = Path(args.output).exists() and Path(args.output).resolve() != Path(args.input).resolve()
+
+    # Characters are read, edited and written one at a time
+    edited = 0
+    with open(args.input, 'r', encoding='utf-8') as f, CharacterWriter(args.output, output_format) as writer, \
+            (PreviousOutput(args.output, output_format) if reuse else contextlib.nullcontext()) as previous:
+        for char in iter_characters(f, input_format):
+            char, patches, changed = edit_character(char, index, previous)
+            writer.write(char)
+            edited += changed
+            if args.quiet:
+                continue
+
+            print(f"\nEditing: {char['name']}")
+            if not changed:
+                print(f"  Already edited with the current rules, unchanged")
+                continue
+            sources = ', '.join(p['source'] for p in patches if 'source' in p) or 'general fixes'
+            print(f"  Patches: {sources}")
+
+            # Show summary
+            print(f"  Race: {char.get('race', '?')}")
+            print(f"  Class: {char.get('class', '?')}")
+            print(f"  Tags: {char.get('character_tags', [])}")
+            print(f"  NPCs: {len(char.get('important_people', []))}")
+            for npc in char.get('important_people', []):
+                print(f"    - {npc['name']} ({npc.get('relationship_type', '?')})")
 
     print(f"\n{'=' * 70}")
-    print(f"Saved edited characters to: {output_file}")
+    print(f"Saved {writer.count} characters ({edited} edited, {writer.count - edited} already up to date) "
+          f"to: {args.output}")
     print("\nReview the file, then rename it to vault_characters_import.json to use for import.")
 
 
@@ -4,12 +4,9 @@ Extract all character documents from .docx files.
 Outputs both raw text and embedded images.
 """
 
-import os
+import argparse
 import json
-import re
 from pathlib import Path
-from docx import Document
-from docx.opc.constants import RELATIONSHIP_TYPE as RT
 
 # Source directory
 SOURCE_DIR = Path(r"C:\Users\edbar\Downloads\Character\Charactere")
@@ -17,6 +14,8 @@ OUTPUT_DIR = Path(r"C:\Users\edbar\Documents\Projects\dnd-campaign-manager\scrip
 
 def extract_document(docx_path: Path) -> dict:
     """Extract text and images from a docx file."""
+    from docx import Document
+
     doc = Document(docx_path)
 
     result = {
@@ -85,7 +84,9 @@ def extract_document(docx_path: Path) -> dict:
     return result
 
 
-def main():
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Export the text and embedded images of every character document.")
+    parser.parse_args(argv)
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
     all_documents = []
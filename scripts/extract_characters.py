@@ -4,28 +4,19 @@ Character Document Extractor
 Extracts text from all .docx files and saves as .txt for manual review/import.
 """
 
-import os
+import argparse
 import sys
-import codecs
 import json
 from pathlib import Path
 
-# Force UTF-8 output
-sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'replace')
-
-try:
-    import docx
-except ImportError:
-    print("Installing python-docx...")
-    os.system("pip install python-docx")
-    import docx
-
 # Paths
 SOURCE_DIR = Path("C:/Users/edbar/Downloads/Character/Charactere")
 OUTPUT_DIR = Path(__file__).parent / "character_exports"
 
 def extract_document(filepath: Path) -> dict:
     """Extract all text content from a .docx file."""
+    import docx
+
     doc = docx.Document(str(filepath))
 
     paragraphs = []
@@ -60,7 +51,12 @@ def extract_document(filepath: Path) -> dict:
         'raw_text': '\n\n'.join(p['text'] for p in paragraphs)
     }
 
-def main():
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Export each character document's text for review.")
+    parser.parse_args(argv)
+    # Force UTF-8 output
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
     # Get all docx files
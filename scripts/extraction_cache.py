@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Content-hash memoisation for the character extractors.
+
+Re-importing the vault used to re-run every extractor on every document even
+when a player had only edited one session entry. Extraction is split into
+units (a whole document, one NPC block, one session block, a document-wide
+pass) and each unit's result is stored under a hash of exactly the input it
+reads. A unit whose input is unchanged is served from the cache, so a small
+edit only recomputes the blocks it touched plus the document-wide passes.
+
+Results are stored as JSON text, so every hit is a fresh copy that callers may
+mutate. The cache is saved next to the import output and is discarded when
+the extractor code changes (the `version` passed to load()).
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+CACHE_VERSION = 1
+
+
+def content_key(*parts) -> str:
+    """Stable hash of the arguments of one extractor call."""
+    encoded = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=sorted)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+class ExtractionCache:
+    """Extractor results per document, keyed by unit name and a hash of the unit's input.
+
+    Call begin(document) before extracting a document. Entries are saved per
+    document, so the blocks of an unchanged document survive for when it is
+    next edited, and documents that were not imported this run are dropped.
+    """
+
+    def __init__(self, version: str = ''):
+        self.version = version
+        self.previous = {}       # document -> unit -> key -> JSON text, from the last run
+        self.current = {}        # the same, for what this run used or computed
+        self.document = None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: Path, version: str = '') -> 'ExtractionCache':
+        """Load a saved cache, or start empty if it is missing, unreadable or stale."""
+        cache = cls(version)
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('cache_version') == CACHE_VERSION and data.get('version') == version:
+                cache.previous = data['documents']
+        except (OSError, json.JSONDecodeError, KeyError):
+            pass
+        return cache
+
+    def save(self, path: Path) -> None:
+        """Write this run's entries atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'cache_version': CACHE_VERSION, 'version': self.version,
+                       'documents': self.current}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def begin(self, document: str) -> None:
+        """Make `document` the scope of the following get/put/memo calls."""
+        self.document = document
+        self.current[document] = {}
+
+    def keep_document(self) -> None:
+        """Carry all of the current document's entries over from the last run."""
+        for unit, entries in self.previous.get(self.document, {}).items():
+            self.current[self.document].setdefault(unit, {}).update(entries)
+
+    def rollover(self) -> None:
+        """Serve the current document's entries as if they came from the last run.
+
+        For long-running callers that extract the same document repeatedly.
+        """
+        if self.document is not None:
+            self.previous[self.document] = self.current[self.document]
+
+    def drop(self, document: str) -> None:
+        """Forget a document that no longer exists."""
+        self.previous.pop(document, None)
+        self.current.pop(document, None)
+        if self.document == document:
+            self.document = None
+
+    def get(self, unit: str, key: str):
+        """Cached result for `key`, or None."""
+        stored = self.current[self.document].get(unit, {}).get(key)
+        if stored is None:
+            stored = self.previous.get(self.document, {}).get(unit, {}).get(key)
+        if stored is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.current[self.document].setdefault(unit, {})[key] = stored
+        return json.loads(stored)
+
+    def put(self, unit: str, key: str, result) -> None:
+        self.current[self.document].setdefault(unit, {})[key] = json.dumps(result, ensure_ascii=False)
+
+    def memo(self, unit: str, compute, *args):
+        """compute(*args), served from the cache when the arguments are unchanged."""
+        key = content_key(*args)
+        result = self.get(unit, key)
+        if result is None:
+            result = compute(*args)
+            self.put(unit, key, result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': sum(len(entries) for units in self.current.values() for entries in units.values()),
+        }
+
+
+def memo(cache: ExtractionCache, unit: str, compute, *args):
+    """cache.memo(unit, compute, *args), or a plain call without a cache."""
+    if cache is None:
+        return compute(*args)
+    return cache.memo(unit, compute, *args)
@@ -21,33 +21,29 @@ Handles:
 - Party Relations
 - Physical Appearance
 - Secondary Characters in same document
+
+Requires python-docx (pip install python-docx), and requests for uploading
+to the API. Both are imported when first needed, so loading the script (for
+--help, or from vault.py) stays fast.
 """
 
 import os
 import sys
 import json
+import argparse
 import re
+import hashlib
 import unicodedata
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 
-sys.stdout.reconfigure(encoding='utf-8')
+from extraction_cache import ExtractionCache, content_key, memo
+from near_duplicates import check_documents, print_report, resolve_duplicates, split_paragraphs
+from npc_registry import NPCRegistry
+from vault_search import DEFAULT_INDEX_DIR, update_index
 
-try:
-    from docx import Document
-    from docx.opc.exceptions import PackageNotFoundError
-except ImportError:
-    print("Installing python-docx...")
-    os.system(f"{sys.executable} -m pip install python-docx")
-    from docx import Document
-    from docx.opc.exceptions import PackageNotFoundError
-
-try:
-    import requests
-except ImportError:
-    print("Installing requests...")
-    os.system(f"{sys.executable} -m pip install requests")
-    import requests
+sys.stdout.reconfigure(encoding='utf-8')
 
 
 # =============================================================================
@@ -57,6 +53,12 @@ except ImportError:
 CHARACTERS_DIR = r"C:\Users\edbar\Downloads\Character\Charactere"
 API_URL = "http://localhost:3000/api/vault/import"
 OUTPUT_FILE = r"C:\Users\edbar\Downloads\Character\vault_characters_import.json"
+NPC_REGISTRY_FILE = r"C:\Users\edbar\Downloads\Character\vault_npc_registry.json"
+PREVIEW_FILE = r"C:\Users\edbar\Downloads\Character\vault_characters_preview.json"
+EXTRACTION_CACHE_FILE = r"C:\Users\edbar\Downloads\Character\vault_extraction_cache.json"
+NEAR_DUPLICATES_FILE = r"C:\Users\edbar\Downloads\Character\vault_near_duplicates.json"
+# Cached extraction results are only valid for the extractor code that produced them
+EXTRACTOR_VERSION = hashlib.sha1(Path(__file__).read_bytes()).hexdigest()[:12]
 DEFAULT_GAME_SYSTEM = "D&D 5e"
 DEFAULT_PRONOUNS = "she/her"
 
@@ -150,6 +152,9 @@ def fix_common_typos(text: str) -> str:
 
 def extract_paragraphs(filepath: str) -> list[str]:
     """Extract all paragraphs from a docx file, preserving structure."""
+    from docx import Document
+    from docx.opc.exceptions import PackageNotFoundError
+
     try:
         doc = Document(filepath)
     except PackageNotFoundError:
@@ -224,6 +229,7 @@ SECTION_HEADERS = {
 }
 
 
+@lru_cache(maxsize=16384)
 def is_section_header(text: str) -> bool:
     """Check if text looks like a section header.
 
@@ -828,7 +834,8 @@ def extract_inline_quotes(full_text: str) -> list[str]:
 # RELATIONSHIPS / NPCs EXTRACTION
 # =============================================================================
 
-def extract_relationships(paragraphs: list[str], char_name: str) -> list[dict]:
+def extract_relationships(paragraphs: list[str], char_name: str,
+                          cache: ExtractionCache = None) -> list[dict]:
     """Extract NPC/relationship information from BOTH:
     1. Standalone NPC blocks (name line + details)
     2. Inline mentions in backstory prose
@@ -836,6 +843,8 @@ def extract_relationships(paragraphs: list[str], char_name: str) -> list[dict]:
     NPCs appear in documents as:
     - Standalone: "Giselbert Almayda" followed by bullet points
     - Inline: "her twin, Tide" or "Neritha, a deep sea witch"
+
+    With a cache, each NPC block is only rebuilt when its lines changed.
     """
     relationships = []
     seen_names = set()  # Track to avoid duplicates
@@ -889,7 +898,7 @@ def extract_relationships(paragraphs: list[str], char_name: str) -> list[dict]:
                 j += 1
 
             if details:
-                rel = build_relationship(npc_name, details)
+                rel = memo(cache, 'npc_block', build_relationship, npc_name, details)
                 relationships.append(rel)
                 seen_names.add(npc_name.lower())
 
@@ -1286,6 +1295,7 @@ def extract_inline_npcs(text: str, char_name: str, seen_names: set) -> list[dict
     return npcs
 
 
+@lru_cache(maxsize=16384)
 def is_npc_name_line(text: str, char_name: str) -> bool:
     """Check if text looks like a standalone NPC name line.
 
@@ -1394,6 +1404,7 @@ def is_npc_name_line(text: str, char_name: str) -> bool:
     return False
 
 
+@lru_cache(maxsize=16384)
 def is_major_section_header(text: str) -> bool:
     """Check if this is a MAJOR section header that would end an NPC block.
 
@@ -1748,7 +1759,7 @@ def extract_companions(paragraphs: list[str], full_text: str) -> list[dict]:
 # SESSION JOURNAL EXTRACTION
 # =============================================================================
 
-def extract_session_journal(paragraphs: list[str]) -> list[dict]:
+def extract_session_journal(paragraphs: list[str], cache: ExtractionCache = None) -> list[dict]:
     """Extract session journal entries.
 
     Handles multiple formats:
@@ -1756,7 +1767,8 @@ def extract_session_journal(paragraphs: list[str]) -> list[dict]:
     - "Session 21/03/2021", "Session 15/04/2021" (date-based)
     - "Session #1 - Title"
 
-    Deduplicates sessions with the same number.
+    Deduplicates sessions with the same number. With a cache, each session
+    block is only reformatted when its text changed.
     """
     journal = []
     seen_session_numbers = set()
@@ -1774,7 +1786,7 @@ def extract_session_journal(paragraphs: list[str]) -> list[dict]:
                         journal[i] = {
                             'session_number': session_num,
                             'title': f"Session {session_num}",
-                            'summary': fix_formatting(session['content'])
+                            'summary': memo(cache, 'session_block', fix_formatting, session['content'])
                         }
                     break
             continue
@@ -1783,7 +1795,7 @@ def extract_session_journal(paragraphs: list[str]) -> list[dict]:
             journal.append({
                 'session_number': session_num,
                 'title': f"Session {session_num}",
-                'summary': fix_formatting(session['content'])
+                'summary': memo(cache, 'session_block', fix_formatting, session['content'])
             })
             seen_session_numbers.add(session_num)
 
@@ -2094,208 +2106,267 @@ def detect_secondary_characters(paragraphs: list[str], full_text: str) -> list[d
 
 
 # =============================================================================
-# MAIN CHARACTER EXTRACTION
+# CHARACTER FIELDS AND EXTRACTOR DEPENDENCIES
 # =============================================================================
 
-def extract_character(filepath: str) -> dict:
-    """Extract ALL character data from a document with ZERO data loss."""
-    filename = os.path.basename(filepath)
-    name = os.path.splitext(filename)[0]
-    name = strip_emojis_from_name(normalize_text(name))
-
-    print(f"\nProcessing: {name}")
-
-    paragraphs = extract_paragraphs(filepath)
-    if not paragraphs:
-        print(f"  Warning: No paragraphs extracted")
-        return None
-
-    full_text = extract_full_text(paragraphs)
-    full_text = fix_common_typos(full_text)
-
-    # ============ BASIC INFO ============
-    game_system = detect_game_system(full_text)
-    race, char_class, subclass = detect_race_class(full_text)
-    appearance = extract_physical_appearance(paragraphs, full_text)
-
-    # ============ TEXT SECTIONS ============
-    backstory = find_section(paragraphs, ['backstory', 'background', 'history'])
-    personality = find_section(paragraphs, ['personality', 'traits'])
-    goals = find_section(paragraphs, ['goals', 'objectives', 'ambitions'])
-    secrets = find_section(paragraphs, ['secrets', 'hidden', 'secret'])
-    fears_text = find_section(paragraphs, ['fears', 'phobias', 'weakness'])
-    extra = find_section(paragraphs, ['extra', 'extra information', 'additional'])
-
-    # Summary from TLDR or first paragraph
-    summary = find_section(paragraphs, ['summary', 'overview'])
-    if not summary and backstory:
+def _summary(summary_section: str, backstory: str) -> str:
+    """Summary from the summary section, or the first backstory paragraph."""
+    if not summary_section and backstory:
         first_para = backstory.split('\n\n')[0]
         if len(first_para) > 50:
-            summary = first_para[:500] + '...' if len(first_para) > 500 else first_para
+            return first_para[:500] + '...' if len(first_para) > 500 else first_para
+    return summary_section
+
+
+def _notes(backstory: str, full_text: str) -> str:
+    # The UI displays 'notes' field as "Full Backstory"
+    # Use clean backstory text without ## headers
+    return clean_backstory_text(fix_formatting(backstory if backstory else full_text))
+
+
+def _section_text(section: str):
+    return clean_backstory_text(fix_formatting(section)) if section else None
+
+
+def _formatted(text: str):
+    return fix_formatting(text) if text else None
+
+
+def _or_none(values):
+    return values if values else None
+
+
+# Extractors and the values they read: name -> (inputs, function of the inputs).
+# 'paragraphs', 'name' and 'cache' are supplied by extract_character(); every
+# other value is computed on first use, so shared intermediates such as
+# full_text and the text sections only run when a requested field needs them.
+CHARACTER_EXTRACTORS = {
+    'full_text': (('paragraphs',), lambda paragraphs: fix_common_typos(extract_full_text(paragraphs))),
+
+    # Basic info
+    'game_system': (('full_text',), detect_game_system),
+    'race_class': (('full_text',), detect_race_class),
+    'appearance': (('paragraphs', 'full_text'), extract_physical_appearance),
+
+    # Text sections
+    'backstory_section': (('paragraphs',), lambda p: find_section(p, ['backstory', 'background', 'history'])),
+    'personality_section': (('paragraphs',), lambda p: find_section(p, ['personality', 'traits'])),
+    'goals_section': (('paragraphs',), lambda p: find_section(p, ['goals', 'objectives', 'ambitions'])),
+    'secrets_section': (('paragraphs',), lambda p: find_section(p, ['secrets', 'hidden', 'secret'])),
+    'weakness_section': (('paragraphs',), lambda p: find_section(p, ['fears', 'phobias', 'weakness'])),
+    'fears_section': (('paragraphs',), lambda p: find_section(p, ['fears'])),
+    'summary_section': (('paragraphs',), lambda p: find_section(p, ['summary', 'overview'])),
+    'tldr_section': (('paragraphs',), lambda p: find_section(p, ['tldr', 'tl;dr', 'backstory highlights'])),
+    'knives_section': (('paragraphs',), lambda p: find_section(p, ['knives', 'plot hooks', 'story hooks'])),
+    'open_questions_section': (('paragraphs',), lambda p: find_section(p, ['open questions', 'mysteries'])),
+    'summary': (('summary_section', 'backstory_section'), _summary),
+    'notes': (('backstory_section', 'full_text'), _notes),
+
+    # Quotes
+    'quotes': (('paragraphs', 'full_text'),
+               lambda p, text: list(set(extract_quotes_section(p) + extract_inline_quotes(text)))),
+    'common_phrases': (('paragraphs',), extract_common_phrases),
+
+    # Structured data
+    'relationships': (('paragraphs', 'name', 'cache'), extract_relationships),
+    'backstory_phases': (('paragraphs',), extract_backstory_phases),
+    'companions': (('paragraphs', 'full_text'), extract_companions),
+    'session_journal': (('paragraphs', 'cache'), extract_session_journal),
+    'character_writings': (('paragraphs',), lambda p: extract_letters(p) + extract_campfire_stories(p)),
+    'rumors': (('paragraphs',), extract_rumors),
+    'dm_qa': (('paragraphs',), extract_dm_qa),
+    'player_meta': (('paragraphs',), extract_player_meta),
+    'party_relations': (('paragraphs',), extract_party_relations),
+    'possessions': (('paragraphs',), extract_possessions),
+    'combat_stats': (('full_text',), extract_combat_stats),
+
+    # Tags and links
+    'tags': (('full_text', 'race_class'), lambda text, rc: extract_character_tags(text, rc[0], rc[1])),
+    'media_links': (('full_text',), extract_media_links),
+    'gold': (('full_text',), extract_gold),
+}
 
-    # ============ ARRAYS ============
-    tldr_section = find_section(paragraphs, ['tldr', 'tl;dr', 'backstory highlights'])
-    tldr = extract_bullet_points(tldr_section)
+# Character fields, in output order: field -> (extractors read, function of their values)
+CHARACTER_FIELDS = {
+    'name': (('name',), lambda name: name),
+    'type': ((), lambda: 'pc'),
+    'game_system': (('game_system',), lambda system: system),
+    'pronouns': ((), lambda: DEFAULT_PRONOUNS),
+
+    # Basic info
+    'race': (('race_class',), lambda rc: rc[0]),
+    'class': (('race_class',), lambda rc: rc[1]),
+    'subclass': (('race_class',), lambda rc: rc[2]),
+
+    # Physical appearance
+    'height': (('appearance',), lambda a: a.get('height')),
+    'weight': (('appearance',), lambda a: a.get('weight')),
+    'hair': (('appearance',), lambda a: a.get('hair')),
+    'eyes': (('appearance',), lambda a: a.get('eyes')),
+    'skin': (('appearance',), lambda a: a.get('skin')),
+    'voice': (('appearance',), lambda a: a.get('voice')),
+    'age': (('appearance',), lambda a: a.get('age')),
+    'distinguishing_marks': (('appearance',), lambda a: a.get('distinguishing_marks')),
+
+    # Text content
+    'backstory': (('backstory_section',), _section_text),
+    'description': (('backstory_section',), _section_text),
+    'summary': (('summary',), _formatted),
+    'personality': (('personality_section',), _formatted),
+    'goals': (('goals_section',), _formatted),
+    'secrets': (('secrets_section',), _formatted),
+    'notes': (('notes',), _formatted),
+
+    # Arrays
+    'quotes': (('quotes',), _or_none),
+    'common_phrases': (('common_phrases',), _or_none),
+    'tldr': (('tldr_section',), lambda text: _or_none(extract_bullet_points(text))),
+    'plot_hooks': (('knives_section',), lambda text: _or_none(extract_bullet_points(text))),
+    'open_questions': (('open_questions_section',), lambda text: _or_none(extract_bullet_points(text))),
+    'weaknesses': (('weakness_section',), lambda text: _or_none(extract_bullet_points(text) if text else [])),
+    'fears': (('fears_section',), lambda text: _or_none(extract_bullet_points(text))),
+    'character_tags': (('tags',), _or_none),
+    'gameplay_tips': ((), lambda: None),  # Could extract from "Tips" sections
+
+    # Structured JSONB
+    'backstory_phases': (('backstory_phases',), _or_none),
+    'companions': (('companions',), _or_none),
+    'session_journal': (('session_journal',), _or_none),
+    'possessions': (('possessions',), _or_none),
+    'character_writings': (('character_writings',), _or_none),
+    'rumors': (('rumors',), _or_none),
+    'dm_qa': (('dm_qa',), _or_none),
+
+    # Player meta
+    'player_discord': (('player_meta',), lambda meta: meta.get('player_discord')),
+    'player_timezone': (('player_meta',), lambda meta: meta.get('player_timezone')),
+    'player_experience': (('player_meta',), lambda meta: meta.get('player_experience')),
+    'player_preferences': (('player_meta',), lambda meta: meta.get('player_preferences')),
+    'player_name': (('player_meta',), lambda meta: meta.get('player_name')),
+
+    'party_relations': (('party_relations',), _or_none),
+    'combat_stats': (('combat_stats',), lambda stats: stats),
+
+    # Relationships (for separate table)
+    'relationships': (('relationships',), _or_none),
+
+    # Media links
+    'theme_music_url': (('media_links',), lambda links: links.get('theme_music_url')),
+    'character_sheet_url': (('media_links',), lambda links: links.get('character_sheet_url')),
+    'spotify_playlist': (('media_links',), lambda links: links.get('spotify_playlist')),
+
+    # Tracking
+    'gold': (('gold',), lambda gold: gold),
+    'status': (('full_text',), lambda text: 'Active' if len(text) > 200 else 'Concept'),
+    'source_file': (('filename',), lambda filename: filename),
+    'imported_at': ((), lambda: datetime.now().isoformat()),
+    'raw_document_text': (('full_text',), lambda text: text),
+}
 
-    knives_section = find_section(paragraphs, ['knives', 'plot hooks', 'story hooks'])
-    plot_hooks = extract_bullet_points(knives_section)
 
-    open_questions_section = find_section(paragraphs, ['open questions', 'mysteries'])
-    open_questions = extract_bullet_points(open_questions_section)
+def parse_fields(value: str) -> list[str]:
+    """Comma-separated field names, checked against CHARACTER_FIELDS."""
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in CHARACTER_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. "
+                         f"Known fields: {', '.join(CHARACTER_FIELDS)}")
+    return fields
 
-    weaknesses = extract_bullet_points(fears_text) if fears_text else []
-    fears = extract_bullet_points(find_section(paragraphs, ['fears']))
 
-    # ============ QUOTES ============
-    quotes_from_section = extract_quotes_section(paragraphs)
-    quotes_inline = extract_inline_quotes(full_text)
-    all_quotes = list(set(quotes_from_section + quotes_inline))
+def required_extractors(fields) -> set:
+    """Every extractor the given fields need, directly or through other extractors."""
+    needed = set()
+    pending = [name for field in fields for name in CHARACTER_FIELDS[field][0]]
+    while pending:
+        name = pending.pop()
+        if name in needed or name not in CHARACTER_EXTRACTORS:
+            continue
+        needed.add(name)
+        pending.extend(CHARACTER_EXTRACTORS[name][0])
+    return needed
 
-    common_phrases = extract_common_phrases(paragraphs)
 
-    # ============ STRUCTURED DATA ============
-    relationships = extract_relationships(paragraphs, name)
-    backstory_phases = extract_backstory_phases(paragraphs)
-    companions = extract_companions(paragraphs, full_text)
-    session_journal = extract_session_journal(paragraphs)
+class _LazyValues(dict):
+    """Extractor values, each computed from CHARACTER_EXTRACTORS on first access."""
 
-    # ============ NEW: CHARACTER WRITINGS ============
-    letters = extract_letters(paragraphs)
-    campfire_stories = extract_campfire_stories(paragraphs)
-    character_writings = letters + campfire_stories
+    def __missing__(self, name):
+        inputs, extract = CHARACTER_EXTRACTORS[name]
+        value = extract(*(self[i] for i in inputs))
+        self[name] = value
+        return value
 
-    # ============ NEW: RUMORS ============
-    rumors = extract_rumors(paragraphs)
 
-    # ============ NEW: DM Q&A ============
-    dm_qa = extract_dm_qa(paragraphs)
+# =============================================================================
+# MAIN CHARACTER EXTRACTION
+# =============================================================================
 
-    # ============ NEW: PLAYER META ============
-    player_meta = extract_player_meta(paragraphs)
+def extract_character(filepath: str, cache: ExtractionCache = None, fields: list[str] = None,
+                      paragraphs: list[str] = None) -> dict:
+    """Extract ALL character data from a document with ZERO data loss.
 
-    # ============ NEW: PARTY RELATIONS ============
-    party_relations = extract_party_relations(paragraphs)
+    With `fields`, only those character fields (plus 'name') are returned, and
+    only the extractors they depend on are run. `paragraphs` skips reading the
+    document when the caller already has them.
 
-    # ============ NEW: POSSESSIONS ============
-    possessions = extract_possessions(paragraphs)
+    With a cache, an unchanged document is returned whole from the last
+    import, and an edited one only re-extracts its changed NPC and session
+    blocks (document-wide passes always re-run).
+    """
+    filename = os.path.basename(filepath)
+    name = os.path.splitext(filename)[0]
+    name = strip_emojis_from_name(normalize_text(name))
 
-    # ============ NEW: COMBAT STATS ============
-    combat_stats = extract_combat_stats(full_text)
+    print(f"\nProcessing: {name}")
 
-    # ============ TAGS AND LINKS ============
-    tags = extract_character_tags(full_text, race, char_class)
-    media_links = extract_media_links(full_text)
-    gold = extract_gold(full_text)
+    if paragraphs is None:
+        paragraphs = extract_paragraphs(filepath)
+    if not paragraphs:
+        print(f"  Warning: No paragraphs extracted")
+        return None
 
-    # ============ CLEAN BACKSTORY FOR NOTES FIELD ============
-    # The UI displays 'notes' field as "Full Backstory"
-    # Use clean backstory text without ## headers
-    if backstory:
-        notes = clean_backstory_text(fix_formatting(backstory))
-    else:
-        notes = clean_backstory_text(fix_formatting(full_text))
-
-    # ============ BUILD CHARACTER OBJECT ============
-    character = {
-        'name': name,
-        'type': 'pc',
-        'game_system': game_system,
-        'pronouns': DEFAULT_PRONOUNS,
-
-        # Basic info
-        'race': race,
-        'class': char_class,
-        'subclass': subclass,
-
-        # Physical appearance
-        'height': appearance.get('height'),
-        'weight': appearance.get('weight'),
-        'hair': appearance.get('hair'),
-        'eyes': appearance.get('eyes'),
-        'skin': appearance.get('skin'),
-        'voice': appearance.get('voice'),
-        'age': appearance.get('age'),
-        'distinguishing_marks': appearance.get('distinguishing_marks'),
-
-        # Text content
-        'backstory': clean_backstory_text(fix_formatting(backstory)) if backstory else None,
-        'description': clean_backstory_text(fix_formatting(backstory)) if backstory else None,
-        'summary': fix_formatting(summary) if summary else None,
-        'personality': fix_formatting(personality) if personality else None,
-        'goals': fix_formatting(goals) if goals else None,
-        'secrets': fix_formatting(secrets) if secrets else None,
-        'notes': fix_formatting(notes) if notes else None,
-
-        # Arrays
-        'quotes': all_quotes if all_quotes else None,
-        'common_phrases': common_phrases if common_phrases else None,
-        'tldr': tldr if tldr else None,
-        'plot_hooks': plot_hooks if plot_hooks else None,
-        'open_questions': open_questions if open_questions else None,
-        'weaknesses': weaknesses if weaknesses else None,
-        'fears': fears if fears else None,
-        'character_tags': tags if tags else None,
-        'gameplay_tips': None,  # Could extract from "Tips" sections
-
-        # Structured JSONB
-        'backstory_phases': backstory_phases if backstory_phases else None,
-        'companions': companions if companions else None,
-        'session_journal': session_journal if session_journal else None,
-        'possessions': possessions if possessions else None,
-
-        # NEW: Character writings
-        'character_writings': character_writings if character_writings else None,
-
-        # NEW: Rumors
-        'rumors': rumors if rumors else None,
-
-        # NEW: DM Q&A
-        'dm_qa': dm_qa if dm_qa else None,
-
-        # NEW: Player meta
-        'player_discord': player_meta.get('player_discord'),
-        'player_timezone': player_meta.get('player_timezone'),
-        'player_experience': player_meta.get('player_experience'),
-        'player_preferences': player_meta.get('player_preferences'),
-        'player_name': player_meta.get('player_name'),
-
-        # NEW: Party relations
-        'party_relations': party_relations if party_relations else None,
-
-        # NEW: Combat stats
-        'combat_stats': combat_stats,
-
-        # Relationships (for separate table)
-        'relationships': relationships if relationships else None,
-
-        # Media links
-        'theme_music_url': media_links.get('theme_music_url'),
-        'character_sheet_url': media_links.get('character_sheet_url'),
-        'spotify_playlist': media_links.get('spotify_playlist'),
-
-        # Tracking
-        'gold': gold,
-        'status': 'Active' if len(full_text) > 200 else 'Concept',
-        'source_file': filename,
-        'imported_at': datetime.now().isoformat(),
-        'raw_document_text': full_text,
-    }
+    if fields is not None:
+        fields = ['name'] + [f for f in fields if f != 'name']
+
+    if cache is not None:
+        cache.begin(filename)
+        document_key = content_key(name, paragraphs)
+        cached = cache.get('character', document_key)
+        if cached:
+            cache.keep_document()
+            cached['imported_at'] = datetime.now().isoformat()
+            print(f"  Unchanged since last import (cached)")
+            return {f: cached.get(f) for f in fields} if fields else cached
+
+    values = _LazyValues(paragraphs=paragraphs, name=name, filename=filename, cache=cache)
+    character = {}
+    for field in fields or CHARACTER_FIELDS:
+        inputs, build = CHARACTER_FIELDS[field]
+        character[field] = build(*(values[i] for i in inputs))
+
+    if fields is not None:
+        computed = [n for n in values if n in CHARACTER_EXTRACTORS]
+        print(f"  Fields: {', '.join(fields)} ({len(computed)} of {len(CHARACTER_EXTRACTORS)} extractors run)")
+        return character
 
     # ============ REPORT ============
-    print(f"  Game System: {game_system}")
-    print(f"  Race: {race or 'Unknown'}")
-    print(f"  Class: {char_class or 'Unknown'}")
-    print(f"  Backstory: {len(backstory or '')} chars")
-    print(f"  Relationships: {len(relationships)}")
-    print(f"  Backstory Phases: {len(backstory_phases)}")
-    print(f"  Session Journal: {len(session_journal)} entries")
-    print(f"  Character Writings: {len(character_writings)} (letters/stories)")
-    print(f"  Rumors: {len(rumors)}")
-    print(f"  DM Q&A: {len(dm_qa)}")
-    print(f"  Quotes: {len(all_quotes)}")
-    print(f"  Party Relations: {len(party_relations)}")
+    print(f"  Game System: {character['game_system']}")
+    print(f"  Race: {character['race'] or 'Unknown'}")
+    print(f"  Class: {character['class'] or 'Unknown'}")
+    print(f"  Backstory: {len(values['backstory_section'] or '')} chars")
+    print(f"  Relationships: {len(values['relationships'])}")
+    print(f"  Backstory Phases: {len(values['backstory_phases'])}")
+    print(f"  Session Journal: {len(values['session_journal'])} entries")
+    print(f"  Character Writings: {len(values['character_writings'])} (letters/stories)")
+    print(f"  Rumors: {len(values['rumors'])}")
+    print(f"  DM Q&A: {len(values['dm_qa'])}")
+    print(f"  Quotes: {len(values['quotes'])}")
+    print(f"  Party Relations: {len(values['party_relations'])}")
+    tags = values['tags']
     print(f"  Tags: {', '.join(tags[:5])}{'...' if len(tags) > 5 else ''}")
 
+    if cache is not None:
+        cache.put('character', document_key, character)
     return character
 
 
@@ -2381,20 +2452,66 @@ def extract_ideas_document(filepath: str) -> dict:
     return document
 
 
-def process_directory(directory: str) -> list[dict]:
-    """Process all Word documents in a directory."""
+def find_near_duplicates(directory: str, filenames: list[str], action: str) -> tuple:
+    """Check documents for near-duplicates before anything is extracted.
+
+    Reads every document once and reports copies and forks (see
+    near_duplicates.py). With 'skip' or 'merge', copies are resolved as in
+    test_parser.py. Returns ({filename: paragraphs} for the documents to
+    extract, {skipped filename: kept filename}).
+    """
+    paragraphs = {filename: extract_paragraphs(os.path.join(directory, filename)) for filename in filenames}
+    documents = [(os.path.splitext(filename)[0], '\n\n'.join(paragraphs[filename])) for filename in filenames]
+
+    print(f"\nChecking {len(documents)} documents for near-duplicates")
+    report = check_documents(documents, NEAR_DUPLICATES_FILE, on_disk={name for name, _ in documents})
+    print_report(report)
+    if action == 'report':
+        return paragraphs, {}
+
+    kept, replaced = resolve_duplicates(documents, report, action)
+    for name, keep in replaced.items():
+        if action == 'merge':
+            print(f"  Merged {name} into {keep}")
+        else:
+            print(f"  Skipping {name} (near-duplicate of {keep})")
+
+    by_name = {os.path.splitext(filename)[0]: filename for filename in filenames}
+    original = dict(documents)
+    for name, text in kept:
+        if text != original[name]:
+            # A copy's extra paragraphs were appended
+            paragraphs[by_name[name]] = split_paragraphs(text)
+    return paragraphs, {by_name[name]: by_name[keep] for name, keep in replaced.items()}
+
+
+def process_directory(directory: str, registry: NPCRegistry = None,
+                      cache: ExtractionCache = None, fields: list[str] = None,
+                      near_duplicates: str = None) -> list[dict]:
+    """Process all Word documents in a directory.
+
+    With a registry, each character's relationships are registered as they are
+    extracted and tagged with their cross-document 'npc_id'. With a cache,
+    unchanged documents and sections reuse their previous extraction. With
+    `fields`, only those fields are extracted (see extract_character()). With
+    `near_duplicates` ('report', 'skip' or 'merge'), copies and forks are
+    found first (see find_near_duplicates()).
+    """
     characters = []
 
     if not os.path.exists(directory):
         print(f"Error: Directory not found: {directory}")
         return characters
 
-    for filename in sorted(os.listdir(directory)):
-        if not filename.endswith('.docx'):
-            continue
-        if filename.startswith('~'):
-            continue
+    filenames = [filename for filename in sorted(os.listdir(directory))
+                 if filename.endswith('.docx') and not filename.startswith('~')]
 
+    paragraphs = {}
+    if near_duplicates:
+        paragraphs, replaced = find_near_duplicates(directory, filenames, near_duplicates)
+        filenames = [filename for filename in filenames if filename not in replaced]
+
+    for filename in filenames:
         filepath = os.path.join(directory, filename)
 
         # Handle ideas file specially
@@ -2402,6 +2519,8 @@ def process_directory(directory: str) -> list[dict]:
             try:
                 doc = extract_ideas_document(filepath)
                 if doc:
+                    if fields is not None:
+                        doc = {f: doc.get(f) for f in ['name'] + fields if f in doc}
                     characters.append(doc)
             except Exception as e:
                 print(f"  Error: {e}")
@@ -2410,8 +2529,10 @@ def process_directory(directory: str) -> list[dict]:
             continue
 
         try:
-            char = extract_character(filepath)
+            char = extract_character(filepath, cache, fields, paragraphs=paragraphs.get(filename))
             if char:
+                if registry is not None and 'relationships' in char:
+                    registry.update_character(char['name'], char.get('relationships'))
                 characters.append(char)
         except Exception as e:
             print(f"  Error: {e}")
@@ -2423,6 +2544,8 @@ def process_directory(directory: str) -> list[dict]:
 
 def send_to_api(characters: list[dict], api_url: str) -> dict:
     """Send characters to the import API."""
+    import requests
+
     try:
         response = requests.post(
             api_url,
@@ -2439,13 +2562,40 @@ def send_to_api(characters: list[dict], api_url: str) -> dict:
 # MAIN
 # =============================================================================
 
-def main():
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Extract vault characters from Word documents.")
+    parser.add_argument('--fields', type=parse_fields, default=None,
+                        help="comma-separated character fields to extract (e.g. race,class,character_tags); "
+                             f"writes a preview to {PREVIEW_FILE} instead of a full import")
+    parser.add_argument('--near-duplicates', choices=['report', 'skip', 'merge'], default=None,
+                        help="check documents for copies and forks before extracting; skip or merge "
+                             "extracts only the longest of each set of copies (forks are only reported)")
+    args = parser.parse_args(argv)
+
     print("=" * 70)
     print("Vault Character Import - COMPLETE EDITION")
     print("Zero Data Loss • Full Schema Support")
     print("=" * 70)
 
-    characters = process_directory(CHARACTERS_DIR)
+    registry = NPCRegistry.load(NPC_REGISTRY_FILE)
+    cache = ExtractionCache.load(EXTRACTION_CACHE_FILE, EXTRACTOR_VERSION)
+
+    if args.fields is not None:
+        # Partial extraction for previews: the registry, search index, cache
+        # and full import output are left as they are
+        characters = process_directory(CHARACTERS_DIR, cache=cache, fields=args.fields)
+        with open(PREVIEW_FILE, 'w', encoding='utf-8') as f:
+            json.dump({'fields': ['name'] + args.fields, 'characters': characters}, f,
+                      indent=2, ensure_ascii=False)
+        print(f"\nExtracted {', '.join(args.fields)} for {len(characters)} documents -> {PREVIEW_FILE}")
+        return
+
+    characters = process_directory(CHARACTERS_DIR, registry, cache, near_duplicates=args.near_duplicates)
+
+    # Characters whose documents were deleted or renamed keep no postings
+    extracted = {char['name'] for char in characters}
+    for name in registry.characters() - extracted:
+        registry.remove_character(name)
 
     if not characters:
         print("\nNo characters extracted!")
@@ -2465,6 +2615,20 @@ def main():
         json.dump(output_data, f, indent=2, ensure_ascii=False)
     print(f"\nSaved to: {OUTPUT_FILE}")
 
+    cache.save(EXTRACTION_CACHE_FILE)
+    cache_stats = cache.stats()
+    print(f"Extraction cache: {cache_stats['hits']} reused, {cache_stats['misses']} recomputed "
+          f"-> {EXTRACTION_CACHE_FILE}")
+
+    registry.save(NPC_REGISTRY_FILE)
+    registry_stats = registry.stats()
+    print(f"NPC registry: {registry_stats['npcs']} NPCs, {registry_stats['shared_npcs']} shared "
+          f"between characters -> {NPC_REGISTRY_FILE}")
+
+    index_report = update_index(characters, DEFAULT_INDEX_DIR)
+    print(f"Search index: {index_report['documents']} documents ({index_report['added']} added, "
+          f"{index_report['updated']} updated, {index_report['removed']} removed) -> {DEFAULT_INDEX_DIR}")
+
     # Summary
     print("\n" + "=" * 70)
     print("EXTRACTION SUMMARY")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Pack several short documents into one LLM request.
+
+Concept sheets and one-page NPCs are far below the model's context size, yet
+each request pays the full latency plus the large parse prompt preamble.
+Short documents are packed into batches under a token budget, wrapped in
+delimiters, and the model answers with one result per document id. Results
+that fail validation make the caller fall back to single requests.
+"""
+
+from llm_client import estimate_tokens
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_BATCH_TOKENS = 6000
+MAX_DOCUMENTS_PER_BATCH = 8
+
+BATCH_INSTRUCTIONS = """## BATCH MODE
+
+This request contains SEVERAL separate character documents. Each one is wrapped
+in <<<DOCUMENT id="..." name="...">>> and <<<END DOCUMENT id>>> markers.
+Parse every document independently - never mix information between them.
+
+Return ONE JSON object of this form, with one entry per document id:
+
+{
+  "documents": {
+    "<id>": { ...the full structure described above for that document... }
+  }
+}"""
+
+
+def pack_batches(documents: list, max_tokens: int = DEFAULT_BATCH_TOKENS,
+                 max_documents: int = MAX_DOCUMENTS_PER_BATCH) -> list[list]:
+    """Greedily pack (name, text) documents into batches under `max_tokens`.
+
+    Documents that do not fit a batch on their own end up in a batch of one.
+    Input order is kept within and across batches.
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for document in documents:
+        tokens = estimate_tokens(document[1])
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_documents):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(document)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def document_id(index: int) -> str:
+    return f"doc{index + 1}"
+
+
+def build_batch_prompt(template: str, batch: list) -> str:
+    """Build one prompt for all (name, text) documents in a batch."""
+    parts = [template, BATCH_INSTRUCTIONS, "Parse these character documents. Extract EVERY piece "
+             "of information from each, especially NPCs with ALL their details."]
+    for index, (name, text) in enumerate(batch):
+        doc_id = document_id(index)
+        parts.append(f'<<<DOCUMENT id="{doc_id}" name="{name}">>>\n{text}\n<<<END DOCUMENT {doc_id}>>>')
+    return '\n\n'.join(parts)
+
+
+def split_batch_result(parsed: dict, batch: list) -> dict:
+    """Map a batch response back to {name: result}.
+
+    Returns None if the response does not contain a valid result (a dict with
+    a "character" object) for every document in the batch.
+    """
+    if not isinstance(parsed, dict):
+        return None
+    results = parsed.get('documents')
+    if not isinstance(results, dict):
+        return None
+
+    split = {}
+    for index, (name, _) in enumerate(batch):
+        result = results.get(document_id(index))
+        if not isinstance(result, dict) or not isinstance(result.get('character'), dict):
+            return None
+        split[name] = result
+    return split
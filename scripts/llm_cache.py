@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Persistent on-disk cache for LLM parse responses.
+
+Entries are keyed by a hash of (prompt template, document text, model name), so
+unchanged documents are answered instantly and editing the prompt template only
+misses the entries built from the old template. The cache is size-bounded:
+least recently used entries are evicted once it grows past `max_bytes`.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / ".llm_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 hex digest of a string."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def cache_key(template: str, document_text: str, model_name: str) -> str:
+    """Cache key for one (prompt template, document, model) combination."""
+    parts = [content_hash(template), content_hash(document_text), model_name]
+    return content_hash('\0'.join(parts))
+
+
+class ResponseCache:
+    """Size-bounded LRU response cache stored as one JSON file per entry.
+
+    Recency is tracked through file mtimes, so it survives across runs.
+    Safe to share between the parser's worker threads.
+    """
+
+    def __init__(self, directory: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _entries(self) -> list[Path]:
+        if not self.directory.exists():
+            return []
+        return list(self.directory.glob("*/*.json"))
+
+    def get(self, template: str, document_text: str, model_name: str) -> str:
+        """Return the cached response text, or None on a miss."""
+        path = self._path(cache_key(template, document_text, model_name))
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)  # mark as recently used
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return entry['response']
+
+    def put(self, template: str, document_text: str, model_name: str, response: str) -> None:
+        """Store a response and evict old entries if the cache is over budget."""
+        path = self._path(cache_key(template, document_text, model_name))
+        entry = {
+            'template_hash': content_hash(template),
+            'document_hash': content_hash(document_text),
+            'model': model_name,
+            'created_at': time.time(),
+            'response': response,
+        }
+        data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.writes += 1
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self._entries())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until under 90% of the budget."""
+        entries = []
+        for p in self._entries():
+            try:
+                stat = p.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+        entries.sort()
+
+        size = sum(e[1] for e in entries)
+        target = self.max_bytes * 0.9
+        for _, entry_size, p in entries:
+            if size <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            size -= entry_size
+            self.evictions += 1
+        self._size = size
+
+    def prune_template(self, current_template: str) -> int:
+        """Delete entries built from any template other than `current_template`."""
+        current = content_hash(current_template)
+        removed = 0
+        for p in self._entries():
+            try:
+                with open(p, encoding='utf-8') as f:
+                    template_hash = json.load(f).get('template_hash')
+            except (OSError, json.JSONDecodeError):
+                template_hash = None
+            if template_hash != current:
+                p.unlink(missing_ok=True)
+                removed += 1
+        with self._lock:
+            self._size = None
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'writes': self.writes,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Map-reduce helpers for parsing documents that exceed the prompt budget.
+
+Documents are split along the same section boundaries the importer detects
+(is_section_header), packed into token-bounded chunks, parsed independently
+and the partial JSON results merged back into a single parse result with
+NPCs, sessions and writings deduplicated.
+"""
+
+import re
+
+from llm_client import estimate_tokens
+from vault_modules import load_importer
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_MAX_CHUNK_TOKENS = 4000
+
+
+# =============================================================================
+# CHUNKING
+# =============================================================================
+
+def split_sections(document_text: str) -> list[list[str]]:
+    """Split a document into sections (lists of paragraphs) at section headers."""
+    is_section_header = load_importer().is_section_header
+
+    sections = []
+    current = []
+    for para in document_text.split('\n\n'):
+        para = para.strip()
+        if not para:
+            continue
+        if is_section_header(para) and current:
+            sections.append(current)
+            current = []
+        current.append(para)
+    if current:
+        sections.append(current)
+    return sections
+
+
+def _split_oversized(paragraph: str, max_tokens: int) -> list[str]:
+    """Split one paragraph that alone exceeds the budget, at sentence ends."""
+    pieces = []
+    current = ''
+    for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+        candidate = f"{current} {sentence}".strip()
+        if current and estimate_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+
+    # Sentences longer than the budget are cut hard
+    max_chars = max_tokens * 4
+    result = []
+    for piece in pieces:
+        while len(piece) > max_chars:
+            result.append(piece[:max_chars])
+            piece = piece[max_chars:]
+        result.append(piece)
+    return result
+
+
+def chunk_document(document_text: str, max_tokens: int = DEFAULT_MAX_CHUNK_TOKENS) -> list[str]:
+    """Pack whole sections into chunks of at most `max_tokens` estimated tokens.
+
+    A section only gets split (at paragraph, then sentence boundaries) when it
+    does not fit into a chunk on its own.
+    """
+    if estimate_tokens(document_text) <= max_tokens:
+        return [document_text]
+
+    units = []
+    for section in split_sections(document_text):
+        section_text = '\n\n'.join(section)
+        if estimate_tokens(section_text) <= max_tokens:
+            units.append(section_text)
+            continue
+        for para in section:
+            if estimate_tokens(para) <= max_tokens:
+                units.append(para)
+            else:
+                units.extend(_split_oversized(para, max_tokens))
+
+    chunks = []
+    current = []
+    for unit in units:
+        candidate = '\n\n'.join(current + [unit])
+        if current and estimate_tokens(candidate) > max_tokens:
+            chunks.append('\n\n'.join(current))
+            current = [unit]
+        else:
+            current.append(unit)
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+# =============================================================================
+# MERGING
+# =============================================================================
+
+def normalize_key(value) -> str:
+    """Case/whitespace/punctuation-insensitive key for deduplication."""
+    if value is None:
+        return ''
+    text = re.sub(r'[^\w\s]', '', str(value).lower())
+    return ' '.join(text.split())
+
+
+def _merge_text(existing: str, new: str) -> str:
+    """Combine two text fields without repeating content."""
+    if not new:
+        return existing
+    if not existing:
+        return new
+    if normalize_key(new) in normalize_key(existing):
+        return existing
+    if normalize_key(existing) in normalize_key(new):
+        return new
+    return f"{existing}\n\n{new}"
+
+
+def _merge_unique(existing: list, new: list) -> list:
+    """Append items from `new` that are not already present."""
+    merged = list(existing or [])
+    seen = {normalize_key(item) if isinstance(item, str) else repr(item) for item in merged}
+    for item in new or []:
+        key = normalize_key(item) if isinstance(item, str) else repr(item)
+        if key not in seen:
+            merged.append(item)
+            seen.add(key)
+    return merged
+
+
+def _merge_record(existing: dict, new: dict, text_fields: tuple = ()) -> dict:
+    """Merge two dicts describing the same entity.
+
+    Lists are unioned, `text_fields` are concatenated and every other field
+    keeps the first non-empty value.
+    """
+    for field, value in new.items():
+        if field in text_fields:
+            existing[field] = _merge_text(existing.get(field), value)
+        elif isinstance(value, list):
+            existing[field] = _merge_unique(existing.get(field), value)
+        elif existing.get(field) in (None, '', []):
+            existing[field] = value
+    return existing
+
+
+def _merge_entities(partials: list[dict], section: str, key_fn, text_fields: tuple) -> list[dict]:
+    merged = {}
+    for partial in partials:
+        for item in partial.get(section) or []:
+            if not isinstance(item, dict):
+                continue
+            key = key_fn(item)
+            if key in merged:
+                _merge_record(merged[key], item, text_fields)
+            else:
+                merged[key] = dict(item)
+    return list(merged.values())
+
+
+def merge_parse_results(partials: list[dict]) -> dict:
+    """Reduce per-chunk parse results into one result in the parser schema."""
+    character = {}
+    for partial in partials:
+        fields = {k: v for k, v in (partial.get('character') or {}).items() if k != 'backstory_phases'}
+        _merge_record(character, fields, text_fields=('backstory',))
+    character['backstory_phases'] = _merge_entities(
+        [{'phases': (p.get('character') or {}).get('backstory_phases')} for p in partials],
+        'phases', lambda p: normalize_key(p.get('title')), ('content',))
+
+    return {
+        'character': character,
+        'npcs': _merge_entities(
+            partials, 'npcs', lambda n: normalize_key(n.get('name')),
+            ('full_notes', 'needs', 'can_provide', 'goals', 'secrets')),
+        'companions': _merge_entities(
+            partials, 'companions', lambda c: normalize_key(c.get('name')), ()),
+        'session_notes': _merge_entities(
+            partials, 'session_notes',
+            lambda s: (s.get('session_number'), normalize_key(s.get('session_date'))),
+            ('notes', 'loot', 'thoughts_for_next')),
+        'writings': _merge_entities(
+            partials, 'writings',
+            lambda w: (normalize_key(w.get('title')), w.get('writing_type')),
+            ('content',)),
+    }
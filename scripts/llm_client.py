@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+"""
+LLM client plumbing for the character document parser.
+
+Provides a small pluggable backend interface (real Gemini and a deterministic
+local fake), a token-bucket rate limiter and a threaded runner that parses many
+documents concurrently with per-request timeouts.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+ENV_PATH = Path(__file__).parent.parent / ".env.local"
+API_KEY_ENV = 'GOOGLE_GENERATIVE_AI_API_KEY'
+DEFAULT_MODEL = 'gemini-3.0-pro'
+DEFAULT_TIMEOUT = 300.0
+DEFAULT_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 2.0
+
+
+class BackendError(Exception):
+    """Raised when a backend fails to produce a response."""
+
+
+class BackendTimeout(BackendError):
+    """Raised when a single request exceeds its timeout."""
+
+
+class BackendThrottled(BackendError):
+    """Raised when the provider rejects a request for quota / rate reasons (HTTP 429)."""
+
+
+def classify_backend_error(e: Exception) -> Exception:
+    """Map an SDK exception to BackendTimeout / BackendThrottled where possible."""
+    message = str(e).lower()
+    if 'deadline' in message or 'timeout' in message or 'timed out' in message:
+        return BackendTimeout(str(e))
+    if '429' in message or 'quota' in message or 'resource exhausted' in message or 'rate limit' in message:
+        return BackendThrottled(str(e))
+    return e
+
+
+def load_env(env_path: Path = ENV_PATH) -> None:
+    """Load KEY=VALUE pairs from .env.local into os.environ (if present)."""
+    if not env_path.exists():
+        return
+    with open(env_path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                key, value = line.split('=', 1)
+                os.environ.setdefault(key, value)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)."""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+# =============================================================================
+# BACKENDS
+# =============================================================================
+
+class LLMBackend:
+    """Interface every model backend implements.
+
+    `generate()` takes the full prompt and returns the raw response text,
+    raising BackendTimeout if it cannot answer within `timeout` seconds.
+    """
+
+    model_name = 'unknown'
+
+    def generate(self, prompt: str, timeout: float = DEFAULT_TIMEOUT) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, timeout: float = DEFAULT_TIMEOUT):
+        """Yield the response text in pieces as it arrives.
+
+        Backends without native streaming yield the whole response at once.
+        """
+        yield self.generate(prompt, timeout=timeout)
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini backend. The SDK is imported and configured on first use."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, api_key: str = None):
+        self.model_name = model_name
+        self.api_key = api_key
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+
+                load_env()
+                api_key = self.api_key or os.environ.get(API_KEY_ENV)
+                if not api_key:
+                    raise BackendError(f"{API_KEY_ENV} not found in .env.local")
+                genai.configure(api_key=api_key)
+                self._model = genai.GenerativeModel(self.model_name)
+            return self._model
+
+    def generate(self, prompt: str, timeout: float = DEFAULT_TIMEOUT) -> str:
+        model = self._get_model()
+        try:
+            response = model.generate_content(prompt, request_options={'timeout': timeout})
+        except Exception as e:
+            error = classify_backend_error(e)
+            if error is e:
+                raise
+            raise error from e
+        return response.text
+
+    def stream(self, prompt: str, timeout: float = DEFAULT_TIMEOUT):
+        model = self._get_model()
+        try:
+            response = model.generate_content(prompt, stream=True, request_options={'timeout': timeout})
+            for chunk in response:
+                yield chunk.text
+        except Exception as e:
+            error = classify_backend_error(e)
+            if error is e:
+                raise
+            raise error from e
+
+
+class FakeBackend(LLMBackend):
+    """Deterministic offline backend for tests and benchmarks.
+
+    Latency is `latency + latency_per_1k_tokens * prompt_tokens / 1000` seconds,
+    so long documents are slower just like with the real API. The response is
+    valid parser JSON derived from the document itself: the same prompt always
+    yields the same answer.
+
+    With `quota_concurrency`, requests beyond that many in flight are rejected
+    with BackendThrottled, simulating provider quota responses. With
+    `max_reliable_tokens`, prompts longer than that get a response without the
+    "character" object, standing in for a cheap model that loses the structure.
+    """
+
+    def __init__(self, latency: float = 0.05, latency_per_1k_tokens: float = 0.0,
+                 model_name: str = 'fake-parser', quota_concurrency: int = None,
+                 max_reliable_tokens: int = None):
+        self.model_name = model_name
+        self.latency = latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+        self.quota_concurrency = quota_concurrency
+        self.max_reliable_tokens = max_reliable_tokens
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def response_delay(self, prompt: str) -> float:
+        return self.latency + self.latency_per_1k_tokens * estimate_tokens(prompt) / 1000
+
+    def response(self, prompt: str) -> dict:
+        result = fake_parse_result(prompt)
+        if self.max_reliable_tokens and estimate_tokens(prompt) > self.max_reliable_tokens:
+            result.pop('character', None)
+        return result
+
+    def _enter(self) -> None:
+        with self._lock:
+            if self.quota_concurrency and self._in_flight >= self.quota_concurrency:
+                raise BackendThrottled(f"429 fake quota exceeded ({self.quota_concurrency} in flight)")
+            self._in_flight += 1
+
+    def _exit(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def generate(self, prompt: str, timeout: float = DEFAULT_TIMEOUT) -> str:
+        self._enter()
+        try:
+            delay = self.response_delay(prompt)
+            if delay > timeout:
+                time.sleep(timeout)
+                raise BackendTimeout(f"fake backend needed {delay:.2f}s (timeout {timeout:.2f}s)")
+            time.sleep(delay)
+        finally:
+            self._exit()
+        return json.dumps(self.response(prompt), ensure_ascii=False)
+
+    def stream(self, prompt: str, timeout: float = DEFAULT_TIMEOUT, piece_chars: int = 200):
+        """Yield the fake response in pieces, spreading the latency across them."""
+        text = json.dumps(self.response(prompt), ensure_ascii=False, indent=2)
+        pieces = [text[i:i + piece_chars] for i in range(0, len(text), piece_chars)]
+        delay = self.response_delay(prompt) / max(len(pieces), 1)
+        elapsed = 0.0
+        self._enter()
+        try:
+            for piece in pieces:
+                if elapsed + delay > timeout:
+                    raise BackendTimeout(f"fake stream exceeded timeout {timeout:.2f}s")
+                time.sleep(delay)
+                elapsed += delay
+                yield piece
+        finally:
+            self._exit()
+
+
+def fake_parse_result(prompt: str) -> dict:
+    """Build a plausible parse result from the document embedded in a prompt.
+
+    Batch prompts (see llm_batching) get one result per delimited document.
+    """
+    batch = re.findall(r'<<<DOCUMENT id="([^"]+)" name="([^"]*)">>>\n(.*?)\n<<<END DOCUMENT \1>>>',
+                       prompt, re.DOTALL)
+    if batch:
+        return {'documents': {
+            doc_id: fake_parse_result(f"Character Name: {name}\n\nDOCUMENT:\n\n{text}")
+            for doc_id, name, text in batch
+        }}
+
+    name_match = re.search(r'^Character Name:\s*(.+)$', prompt, re.MULTILINE)
+    name = name_match.group(1).strip() if name_match else 'Unknown'
+    document = prompt.split('DOCUMENT:', 1)[-1].strip()
+    paragraphs = [p.strip() for p in document.split('\n\n') if p.strip()]
+
+    npcs = []
+    sessions = []
+    prose = []
+    for i, para in enumerate(paragraphs):
+        session_match = re.match(r'^#*\s*session\s*#?(\d+)', para, re.IGNORECASE)
+        if session_match:
+            sessions.append({
+                'session_number': int(session_match.group(1)),
+                'session_date': None,
+                'notes': paragraphs[i + 1] if i + 1 < len(paragraphs) else '',
+                'kill_count': None,
+                'loot': None,
+                'thoughts_for_next': None,
+            })
+        elif re.match(r'^[A-Z][a-z]+(\s+[A-Z][a-z]+){0,3}$', para) and para != name:
+            npcs.append({
+                'name': para,
+                'nickname': None,
+                'relationship_type': 'other',
+                'relationship_label': 'Other',
+                'faction_affiliations': [],
+                'location': None,
+                'needs': None,
+                'can_provide': None,
+                'goals': None,
+                'secrets': None,
+                'full_notes': paragraphs[i + 1] if i + 1 < len(paragraphs) else '',
+            })
+        elif len(para) > 80:
+            prose.append(para)
+
+    digest = hashlib.sha256(document.encode('utf-8')).hexdigest()[:8]
+    return {
+        'character': {
+            'name': name,
+            'race': None,
+            'class': None,
+            'backstory': '\n\n'.join(prose),
+            'backstory_phases': [],
+            'tldr': f"fake parse {digest}",
+            'quotes': [],
+            'plot_hooks': [],
+            'theme_music_url': None,
+            'character_sheet_url': None,
+            'player_discord': None,
+            'player_timezone': None,
+        },
+        'npcs': npcs,
+        'companions': [],
+        'session_notes': sessions,
+        'writings': [],
+    }
+
+
+class DryRunBackend(FakeBackend):
+    """Answers instantly with a fake parse so a run can be sized without the API.
+
+    Keeps the real model name so token counts are priced for that model.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL):
+        super().__init__(latency=0.0, model_name=model_name)
+
+
+def make_backend(name: str, model_name: str = None, fake_latency: float = 0.05,
+                 fake_quota: int = None) -> LLMBackend:
+    """Create a backend by name ('gemini', 'fake' or 'dry-run')."""
+    if name == 'gemini':
+        return GeminiBackend(model_name or DEFAULT_MODEL)
+    if name == 'fake':
+        return FakeBackend(latency=fake_latency, model_name=model_name or 'fake-parser',
+                           quota_concurrency=fake_quota)
+    if name == 'dry-run':
+        return DryRunBackend(model_name or DEFAULT_MODEL)
+    raise ValueError(f"Unknown backend: {name}")
+
+
+def call_with_retries(fn, retries: int = DEFAULT_RETRIES, backoff: float = RETRY_BACKOFF_SECONDS):
+    """Call `fn()`, retrying BackendErrors with exponential backoff.
+
+    Returns (result, retries_used). The exception that finally escapes carries
+    the number of retries made as `.retries`.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn(), attempt
+        except BackendError as e:
+            if attempt == retries:
+                e.retries = attempt
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+# =============================================================================
+# RATE LIMITING
+# =============================================================================
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Holds up to `capacity` tokens and refills at `rate` tokens per second.
+    `acquire(n)` blocks until n tokens are available (requests larger than the
+    capacity are clamped so they can never deadlock).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, amount: float, burst: float = None) -> 'TokenBucket':
+        return cls(amount / 60.0, burst if burst is not None else max(amount / 60.0, 1.0))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Block until `amount` tokens are taken. Returns seconds spent waiting."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+# =============================================================================
+# ADAPTIVE CONCURRENCY
+# =============================================================================
+
+class AdaptiveConcurrency:
+    """AIMD controller for the number of model requests in flight.
+
+    Each healthy response (no error, latency within `latency_tolerance` times
+    the smoothed baseline) adds 1/limit to the limit, so the limit grows by one
+    per round trip. A throttle or timeout multiplies it by `decrease_factor`,
+    at most once per round trip so a burst of 429s counts as one signal.
+    Every change is kept in `decisions` and printed.
+    """
+
+    def __init__(self, initial: int = DEFAULT_CONCURRENCY, min_limit: int = 1, max_limit: int = 32,
+                 decrease_factor: float = 0.5, latency_tolerance: float = 2.0, verbose: bool = True):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.verbose = verbose
+        self.decisions = []
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self._in_flight = 0
+        self._baseline = None
+        self._last_decrease = 0.0
+        self._started = time.monotonic()
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self) -> float:
+        """Block until a request slot is free. Returns the request start time."""
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+            return time.monotonic()
+
+    def _decide(self, new_limit: float, reason: str) -> None:
+        old = int(self._limit)
+        self._limit = new_limit
+        if int(new_limit) != old:
+            decision = {
+                'at_seconds': round(time.monotonic() - self._started, 3),
+                'from': old,
+                'to': int(new_limit),
+                'reason': reason,
+            }
+            self.decisions.append(decision)
+            if self.verbose:
+                print(f"  [concurrency] {old} -> {int(new_limit)} ({reason})")
+
+    def release(self, started: float, outcome: str) -> None:
+        """Report how a request ended: 'ok', 'throttled', 'timeout', 'error' or 'cancelled'."""
+        now = time.monotonic()
+        latency = now - started
+        with self._condition:
+            self._in_flight -= 1
+            if outcome in ('throttled', 'timeout'):
+                # Only react once per round trip: requests started before the
+                # last decrease were already in flight when it happened
+                if started >= self._last_decrease:
+                    self._last_decrease = now
+                    self._decide(max(self.min_limit, self._limit * self.decrease_factor), outcome)
+            elif outcome == 'ok':
+                if self._baseline is None:
+                    self._baseline = latency
+                if latency <= self._baseline * self.latency_tolerance:
+                    self._decide(min(self.max_limit, self._limit + 1 / self._limit), 'healthy')
+                self._baseline = 0.9 * self._baseline + 0.1 * latency
+            self._condition.notify_all()
+
+
+class AdaptiveBackend(LLMBackend):
+    """Wraps a backend so every request goes through an AdaptiveConcurrency slot."""
+
+    def __init__(self, backend: LLMBackend, controller: AdaptiveConcurrency):
+        self.backend = backend
+        self.controller = controller
+        self.model_name = backend.model_name
+
+    @staticmethod
+    def _outcome(e: Exception) -> str:
+        if isinstance(e, BackendThrottled):
+            return 'throttled'
+        if isinstance(e, BackendTimeout):
+            return 'timeout'
+        return 'error'
+
+    def generate(self, prompt: str, timeout: float = DEFAULT_TIMEOUT) -> str:
+        started = self.controller.acquire()
+        try:
+            text = self.backend.generate(prompt, timeout=timeout)
+        except Exception as e:
+            self.controller.release(started, self._outcome(e))
+            raise
+        self.controller.release(started, 'ok')
+        return text
+
+    def stream(self, prompt: str, timeout: float = DEFAULT_TIMEOUT):
+        started = self.controller.acquire()
+        # A consumer that stops early closes the generator (GeneratorExit),
+        # which must free the slot without counting as a success or a failure
+        outcome = 'cancelled'
+        try:
+            for piece in self.backend.stream(prompt, timeout=timeout):
+                yield piece
+            outcome = 'ok'
+        except Exception as e:
+            outcome = self._outcome(e)
+            raise
+        finally:
+            self.controller.release(started, outcome)
+
+
+# =============================================================================
+# CONCURRENT RUNNER
+# =============================================================================
+
+def run_concurrent(items: list, worker, concurrency: int = DEFAULT_CONCURRENCY,
+                   limiter: TokenBucket = None) -> list:
+    """Run `worker(item)` over items on a thread pool, preserving input order.
+
+    Each call first takes one token from `limiter` (if given). Exceptions are
+    returned in place of the result so one failed document never aborts a run.
+    """
+    def call(item):
+        if limiter:
+            limiter.acquire()
+        try:
+            return worker(item)
+        except Exception as e:
+            return e
+
+    if concurrency <= 1:
+        return [call(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(call, items))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Prompt compaction for character documents.
+
+Shrinks a document before it is embedded in the parse prompt: whitespace is
+collapsed, paragraphs pasted more than once are dropped, table rows are
+tightened and URLs are swapped for short placeholders that are restored in the
+parse result afterwards.
+"""
+
+import re
+
+from llm_client import estimate_tokens
+
+
+# Paragraphs shorter than this may legitimately repeat (e.g. "Dont trust him"
+# under two different NPCs), so only longer ones are deduplicated
+MIN_DEDUPE_CHARS = 60
+
+URL_PATTERN = re.compile(r'https?://[^\s<>"\']+[^\s<>"\',.\)]')
+PLACEHOLDER_PATTERN = re.compile(r'\[URL(\d+)\]')
+
+
+def _compact_table_row(para: str) -> str:
+    """Drop empty cells and padding from a ' | ' separated table row."""
+    cells = [c.strip() for c in para.split('|')]
+    return ' | '.join(c for c in cells if c)
+
+
+def compact_document(document_text: str) -> tuple:
+    """Compact a document for prompting.
+
+    Returns (compacted_text, url_map, report). `url_map` maps placeholders like
+    "[URL1]" back to the original URLs for restore_placeholders().
+    """
+    text = document_text.replace('\r\n', '\n').replace('\r', '\n')
+
+    url_map = {}
+    url_ids = {}
+
+    def replace_url(match):
+        url = match.group(0)
+        if url not in url_ids:
+            url_ids[url] = f"[URL{len(url_ids) + 1}]"
+            url_map[url_ids[url]] = url
+        return url_ids[url]
+
+    text = URL_PATTERN.sub(replace_url, text)
+
+    paragraphs = []
+    seen = set()
+    duplicates = 0
+    for para in re.split(r'\n\s*\n', text):
+        para = '\n'.join(re.sub(r'[ \t\u00a0]+', ' ', line).strip() for line in para.split('\n'))
+        para = para.strip()
+        if not para:
+            continue
+        if ' | ' in para or para.count('|') >= 2:
+            para = _compact_table_row(para)
+        if len(para) >= MIN_DEDUPE_CHARS:
+            key = para.lower()
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+        paragraphs.append(para)
+
+    compacted = '\n\n'.join(paragraphs)
+    tokens_before = estimate_tokens(document_text)
+    tokens_after = estimate_tokens(compacted)
+    report = {
+        'tokens_before': tokens_before,
+        'tokens_after': tokens_after,
+        'tokens_saved': tokens_before - tokens_after,
+        'duplicate_paragraphs': duplicates,
+        'urls_replaced': len(url_map),
+    }
+    return compacted, url_map, report
+
+
+def restore_placeholders(value, url_map: dict):
+    """Put the original URLs back into every string of a parse result."""
+    if not url_map:
+        return value
+    if isinstance(value, str):
+        return PLACEHOLDER_PATTERN.sub(lambda m: url_map.get(m.group(0), m.group(0)), value)
+    if isinstance(value, list):
+        return [restore_placeholders(v, url_map) for v in value]
+    if isinstance(value, dict):
+        return {k: restore_placeholders(v, url_map) for k, v in value.items()}
+    return value
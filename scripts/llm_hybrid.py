@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Hybrid parsing: run the importer's deterministic extractors first and only
+send the sections they could not handle to the model.
+
+Sessions, letters, campfire stories, rumors, DM Q&A, possessions and player
+info are recovered locally by import-vault-characters.py. Sections of those
+kinds are dropped from the prompt one at a time, only when the section's own
+text appears in the local results; everything else (typically backstory,
+free-form NPC prose and sections the extractors skipped) still goes to the LLM.
+"""
+
+import re
+
+from llm_chunking import split_sections
+from llm_client import estimate_tokens
+from vault_modules import load_importer
+
+
+# Section categories (keys of the importer's SECTION_HEADERS) the local
+# extractors handle well enough to skip the model
+LOCAL_CATEGORIES = ('session', 'letters', 'campfire', 'rumors', 'dm_qa', 'possessions', 'player_info')
+
+_NON_WORD = re.compile(r'\W+')
+
+
+def section_category(header: str) -> str:
+    """Map a section header paragraph to its SECTION_HEADERS category (or None)."""
+    importer = load_importer()
+    lower = header.lstrip('#').strip().lower().rstrip(':')
+    for category, headers in importer.SECTION_HEADERS.items():
+        for h in headers:
+            if lower == h or lower.startswith(h + ' ') or lower.startswith(h + ':'):
+                return category
+    return None
+
+
+def extract_locally(document_text: str) -> dict:
+    """Run the local extractors and convert their output to the parser schema."""
+    importer = load_importer()
+    paragraphs = [importer.normalize_text(p) for p in document_text.split('\n\n') if p.strip()]
+    full_text = importer.extract_full_text(paragraphs)
+
+    sessions = importer.extract_session_journal(paragraphs)
+    letters = importer.extract_letters(paragraphs)
+    stories = importer.extract_campfire_stories(paragraphs)
+    player_meta = importer.extract_player_meta(paragraphs)
+    media_links = importer.extract_media_links(full_text)
+
+    character = {
+        'player_discord': player_meta.get('player_discord'),
+        'player_timezone': player_meta.get('player_timezone'),
+        'theme_music_url': media_links.get('theme_music_url'),
+        'character_sheet_url': media_links.get('character_sheet_url'),
+    }
+
+    return {
+        'character': {k: v for k, v in character.items() if v},
+        'npcs': [],
+        'companions': [],
+        'session_notes': [
+            {
+                'session_number': s['session_number'],
+                'session_date': s.get('date'),
+                'notes': s['summary'],
+                'kill_count': None,
+                'loot': None,
+                'thoughts_for_next': None,
+            }
+            for s in sessions
+        ],
+        'writings': [
+            {
+                'title': w['title'],
+                'writing_type': 'letter' if w['type'] == 'letter' else 'campfire_story',
+                'content': w['content'],
+                'recipient': w.get('recipient'),
+            }
+            for w in letters + stories
+        ],
+        'rumors': importer.extract_rumors(paragraphs),
+        'dm_qa': importer.extract_dm_qa(paragraphs),
+        'possessions': importer.extract_possessions(paragraphs),
+    }
+
+
+def _fingerprint(text: str) -> str:
+    """Lowercased words of a text, ignoring punctuation and spacing."""
+    return _NON_WORD.sub(' ', text.casefold()).strip()
+
+
+def _local_strings(value):
+    """Every string in a local result, recursively."""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _local_strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _local_strings(item)
+
+
+def _section_resolved(section: list[str], local_text: str) -> bool:
+    """Whether the text of one section was captured by the local extractors.
+
+    Every body paragraph (or, for a header-only section, the text after the
+    header's colon) must appear in `local_text`, the fingerprinted local
+    results. A section the extractors skipped, merged away as a duplicate or
+    only partly captured goes to the model.
+    """
+    body = section[1:]
+    if not body and ':' in section[0]:
+        body = [section[0].split(':', 1)[1]]
+    fingerprints = [_fingerprint(p) for p in body]
+    fingerprints = [f for f in fingerprints if f]
+    return bool(fingerprints) and all(f in local_text for f in fingerprints)
+
+
+def split_for_hybrid(document_text: str) -> tuple:
+    """Split a document into locally resolved results and the text left for the model.
+
+    Returns (local_result, unresolved_text, report) where report counts the
+    sections and estimated tokens on each side.
+    """
+    local = extract_locally(document_text)
+    local_text = '\n'.join(_fingerprint(text) for text in _local_strings(local))
+
+    unresolved = []
+    resolved_count = 0
+    for section in split_sections(document_text):
+        category = section_category(section[0])
+        if category in LOCAL_CATEGORIES and _section_resolved(section, local_text):
+            resolved_count += 1
+        else:
+            unresolved.append('\n\n'.join(section))
+
+    unresolved_text = '\n\n'.join(unresolved)
+    report = {
+        'local_sections': resolved_count,
+        'llm_sections': len(unresolved),
+        'document_tokens': estimate_tokens(document_text),
+        'llm_tokens': estimate_tokens(unresolved_text),
+    }
+    return local, unresolved_text, report
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Recover JSON objects from LLM responses.
+
+Models wrap their JSON in prose or code fences, add trailing commas and
+sometimes stop mid-output. Instead of a greedy regex, a single linear scan
+finds the outermost object while respecting strings and escapes, and a repair
+pass fixes the common defects so the response does not need to be re-requested.
+Every repair applied is reported.
+"""
+
+import json
+import re
+
+
+PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_WORD = re.compile(r'\w+')
+# An opening fence line at the start and a closing fence line at the end;
+# backticks inside the JSON (e.g. in a string value) are left alone
+_OPENING_FENCE = re.compile(r'^\s*```[\w-]*[ \t]*\n')
+_CLOSING_FENCE = re.compile(r'\n[ \t]*```\s*$')
+
+
+def scan_object(text: str, start: int) -> int:
+    """Return the index just past the object opening at `start`, or -1 if it never closes."""
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == '\\':
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in '{[':
+            depth += 1
+        elif c in '}]':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+
+def find_json_candidates(text: str) -> list:
+    """Locate top-level {...} spans in a response, in order.
+
+    Returns a list of (candidate_text, complete) pairs. Scanning resumes after
+    each balanced span, so the whole response is read once. If an object never
+    closes, its truncated tail is the last candidate with complete=False.
+    """
+    candidates = []
+    start = text.find('{')
+    while start != -1:
+        end = scan_object(text, start)
+        if end == -1:
+            candidates.append((text[start:], False))
+            break
+        candidates.append((text[start:end], True))
+        start = text.find('{', end)
+    return candidates
+
+
+def repair_json(fragment: str) -> tuple:
+    """Fix trailing commas, Python literals and truncation in a JSON fragment.
+
+    Returns (repaired_text, repairs) where repairs lists what was changed.
+    A truncated fragment is cut back to the last complete value and every
+    open string, array and object is closed.
+    """
+    repairs = []
+    out = []
+    stack = []
+    in_string = False
+    escaped = False
+    # (length of out, stack depth) after the last complete value at each point
+    safe_point = None
+
+    i = 0
+    n = len(fragment)
+    while i < n:
+        c = fragment[i]
+        if in_string:
+            out.append(c)
+            if escaped:
+                escaped = False
+            elif c == '\\':
+                escaped = True
+            elif c == '"':
+                in_string = False
+            elif c == '\n':
+                out[-1] = '\\n'
+                if 'escaped newline in string' not in repairs:
+                    repairs.append('escaped newline in string')
+            i += 1
+            continue
+
+        if c == '"':
+            in_string = True
+            out.append(c)
+        elif c in '{[':
+            stack.append('}' if c == '{' else ']')
+            out.append(c)
+        elif c in '}]':
+            # Drop a trailing comma before the closing bracket
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ',':
+                del out[j]
+                if 'trailing comma' not in repairs:
+                    repairs.append('trailing comma')
+            if stack:
+                expected = stack.pop()
+                if c != expected:
+                    if 'mismatched bracket' not in repairs:
+                        repairs.append('mismatched bracket')
+                    c = expected
+            out.append(c)
+            safe_point = (len(out), len(stack))
+        elif c == ',':
+            safe_point = (len(out), len(stack))
+            out.append(c)
+        elif c.isalpha():
+            match = _WORD.match(fragment, i)
+            word = match.group()
+            if word in PYTHON_LITERALS:
+                out.append(PYTHON_LITERALS[word])
+                if 'python literal' not in repairs:
+                    repairs.append('python literal')
+            else:
+                out.append(word)
+            i += len(word)
+            continue
+        else:
+            out.append(c)
+        i += 1
+
+    if stack or in_string:
+        repairs.append('truncated output')
+        if safe_point is not None:
+            length, depth = safe_point
+            del out[length:]
+            stack = stack[:depth]
+        elif in_string:
+            out.append('"')
+        text = ''.join(out).rstrip()
+        while text.endswith(','):
+            text = text[:-1].rstrip()
+        if text.endswith(':'):
+            # Dangling key with no value
+            text = re.sub(r',?\s*"[^"]*"\s*:$', '', text).rstrip()
+        return text + ''.join(reversed(stack)), repairs
+
+    return ''.join(out), repairs
+
+
+def strip_code_fences(text: str) -> str:
+    """Remove a ```json ... ``` fence around a response."""
+    return _CLOSING_FENCE.sub('', _OPENING_FENCE.sub('', text, count=1), count=1)
+
+
+def recover_json(text: str) -> tuple:
+    """Extract and, if needed, repair the JSON object in a model response.
+
+    Candidates are tried in order; prose like "{like this}" before the real
+    object fails both parsing and repair and is skipped.
+    Returns (parsed_object_or_None, repairs, error_message_or_None).
+    """
+    if not text:
+        return None, [], "Empty response"
+
+    candidates = find_json_candidates(strip_code_fences(text))
+    if not candidates:
+        return None, [], "No JSON found"
+
+    last_error = None
+    for candidate, complete in candidates:
+        if complete:
+            try:
+                return json.loads(candidate), [], None
+            except json.JSONDecodeError:
+                pass
+
+        repaired, repairs = repair_json(candidate)
+        try:
+            parsed = json.loads(repaired)
+        except json.JSONDecodeError as e:
+            last_error = str(e)
+            continue
+        if isinstance(parsed, dict) and parsed:
+            return parsed, repairs, None
+
+    return None, [], last_error or "No JSON object found"
+
+
+# =============================================================================
+# INCREMENTAL PARSING
+# =============================================================================
+
+class IncrementalJSONParser:
+    """Parse a streamed JSON object and emit top-level items as soon as they close.
+
+    Feed response text as it arrives. Every element of a top-level array
+    (each NPC, session, writing, ...) and every other top-level value (the
+    "character" object) is decoded the moment its closing bracket arrives and
+    passed to `on_item(key, value)`. Only the text of the value currently being
+    received is buffered. If the stream stops early, finish() still returns
+    everything completed so far plus a best-effort repair of the partial item.
+    """
+
+    def __init__(self, on_item=None):
+        self.on_item = on_item
+        self.result = {}
+        self.repairs = []
+        self.complete = False
+        self._buf = ''
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escaped = False
+        self._state = 'key'        # at depth 1: 'key', 'colon', 'value' or 'after_value'
+        self._key = None
+        self._key_start = None
+        self._in_array = False
+        self._capture = None       # buffer index where the current value starts
+
+    def _emit(self, text: str, partial: bool = False) -> None:
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            repaired, repairs = repair_json(text)
+            try:
+                value = json.loads(repaired)
+            except json.JSONDecodeError:
+                return
+            self.repairs.extend(r for r in repairs if r not in self.repairs)
+        if partial and value in ({}, [], '', None):
+            return
+
+        if self._in_array:
+            self.result[self._key].append(value)
+        else:
+            self.result[self._key] = value
+        if self.on_item:
+            self.on_item(self._key, value)
+
+    def _begin_value(self, i: int) -> None:
+        """Start capturing a value at the current level if it is a streamed level."""
+        if self._capture is None and (
+                (self._depth == 1 and self._state == 'value') or (self._depth == 2 and self._in_array)):
+            self._capture = i
+
+    def feed(self, text: str) -> None:
+        """Consume the next piece of the response."""
+        if self.complete:
+            return
+        self._buf += text
+        buf = self._buf
+        i = self._pos
+        while i < len(buf):
+            c = buf[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == '\\':
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = json.loads(buf[self._key_start:i + 1])
+                        self._key_start = None
+                        self._state = 'colon'
+                i += 1
+                continue
+
+            if not self._started:
+                if c == '{':
+                    self._started = True
+                    self._depth = 1
+                i += 1
+                continue
+
+            if c == '"':
+                if self._depth == 1 and self._state == 'key':
+                    self._key_start = i
+                else:
+                    self._begin_value(i)
+                self._in_string = True
+            elif c in '{[':
+                if self._depth == 1 and self._state == 'value' and c == '[':
+                    self._in_array = True
+                    self.result[self._key] = []
+                else:
+                    self._begin_value(i)
+                self._depth += 1
+            elif c in '}]':
+                if self._capture is not None and self._depth in (1, 2) and self._capture < i:
+                    # A primitive value ends at its container's closing bracket
+                    self._emit(buf[self._capture:i].strip())
+                    self._capture = None
+                self._depth -= 1
+                if self._depth == 0:
+                    self.complete = True
+                    break
+                if self._depth == 1 and self._in_array:
+                    self._in_array = False
+                    self._state = 'after_value'
+                elif self._capture is not None and (
+                        (self._depth == 2 and self._in_array) or self._depth == 1):
+                    self._emit(buf[self._capture:i + 1])
+                    self._capture = None
+                    if self._depth == 1:
+                        self._state = 'after_value'
+            elif c == ',':
+                if self._capture is not None and (
+                        (self._depth == 1) or (self._depth == 2 and self._in_array)):
+                    self._emit(buf[self._capture:i].strip())
+                    self._capture = None
+                if self._depth == 1:
+                    self._state = 'key'
+            elif c == ':':
+                if self._depth == 1:
+                    self._state = 'value'
+            elif not c.isspace():
+                self._begin_value(i)
+            i += 1
+
+        # Drop text that no pending value needs any more
+        keep_from = i
+        for start in (self._capture, self._key_start):
+            if start is not None:
+                keep_from = min(keep_from, start)
+        self._buf = buf[keep_from:]
+        self._pos = i - keep_from
+        if self._capture is not None:
+            self._capture -= keep_from
+        if self._key_start is not None:
+            self._key_start -= keep_from
+
+    def finish(self) -> dict:
+        """Return everything parsed so far, salvaging a partially received item."""
+        if not self.complete:
+            if 'truncated output' not in self.repairs:
+                self.repairs.append('truncated output')
+            if self._capture is not None:
+                self._emit(self._buf[self._capture:], partial=True)
+                self._capture = None
+        return self.result
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Token, latency and cost instrumentation for LLM parse runs.
+
+Every model call (and every cache hit standing in for one) is recorded with
+estimated input/output tokens, queue time, request latency and retries.
+RunMetrics aggregates them into totals, percentiles and a per-document
+breakdown for the run summary.
+"""
+
+import math
+import threading
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# USD per 1M tokens (input, output). Approximate list prices - pass
+# --input-price/--output-price to test_parser.py to override.
+MODEL_PRICING = {
+    'gemini-3.0-pro': (2.00, 12.00),
+    'gemini-2.5-pro': (1.25, 10.00),
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemini-2.5-flash-lite': (0.10, 0.40),
+}
+DEFAULT_PRICING = (2.00, 12.00)
+
+
+def model_pricing(model_name: str) -> tuple:
+    return MODEL_PRICING.get(model_name, DEFAULT_PRICING)
+
+
+def estimate_cost(input_tokens: int, output_tokens: int, pricing: tuple) -> float:
+    """Cost in USD for the given token counts at (input, output) per-1M prices."""
+    return (input_tokens * pricing[0] + output_tokens * pricing[1]) / 1_000_000
+
+
+def percentiles(values: list, points: tuple = (50, 90, 99)) -> dict:
+    """Nearest-rank percentiles plus max, rounded to milliseconds."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        rank = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+        result[f"p{p}"] = round(ordered[rank], 3)
+    result['max'] = round(ordered[-1], 3)
+    return result
+
+
+class RunMetrics:
+    """Thread-safe collector of per-call records for one parse run."""
+
+    def __init__(self, pricing: dict = None):
+        self.pricing = pricing or {}
+        self.calls = []
+        self.queue = {}
+        self._lock = threading.Lock()
+
+    def record_call(self, document: str, model: str, input_tokens: int = 0, output_tokens: int = 0,
+                    latency: float = 0.0, retries: int = 0, cache_hit: bool = False,
+                    error: str = None, part: str = None) -> None:
+        record = {
+            'document': document,
+            'part': part,
+            'model': model,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'latency_seconds': round(latency, 4),
+            'retries': retries,
+            'cache_hit': cache_hit,
+            'error': error,
+        }
+        with self._lock:
+            self.calls.append(record)
+
+    def record_queue(self, document: str, seconds: float) -> None:
+        """Time a document waited for a worker slot and rate limit tokens."""
+        with self._lock:
+            self.queue[document] = round(seconds, 4)
+
+    def _cost(self, record: dict) -> float:
+        if record['cache_hit']:
+            return 0.0
+        pricing = self.pricing.get(record['model']) or model_pricing(record['model'])
+        return estimate_cost(record['input_tokens'], record['output_tokens'], pricing)
+
+    def document_breakdown(self, document: str) -> dict:
+        with self._lock:
+            calls = [c for c in self.calls if c['document'] == document]
+        model_calls = [c for c in calls if not c['cache_hit']]
+        return {
+            'model_calls': len(model_calls),
+            'cache_hits': len(calls) - len(model_calls),
+            'input_tokens': sum(c['input_tokens'] for c in model_calls),
+            'output_tokens': sum(c['output_tokens'] for c in model_calls),
+            'latency_seconds': round(sum(c['latency_seconds'] for c in model_calls), 3),
+            'retries': sum(c['retries'] for c in calls),
+            'queue_seconds': self.queue.get(document),
+            'estimated_cost_usd': round(sum(self._cost(c) for c in calls), 6),
+        }
+
+    def summary(self) -> dict:
+        with self._lock:
+            calls = list(self.calls)
+            queue = dict(self.queue)
+        model_calls = [c for c in calls if not c['cache_hit']]
+        documents = sorted({c['document'] for c in calls})
+        return {
+            'model_calls': len(model_calls),
+            'cache_hits': len(calls) - len(model_calls),
+            'errors': sum(1 for c in calls if c['error']),
+            'retries': sum(c['retries'] for c in calls),
+            'input_tokens': sum(c['input_tokens'] for c in model_calls),
+            'output_tokens': sum(c['output_tokens'] for c in model_calls),
+            'estimated_cost_usd': round(sum(self._cost(c) for c in calls), 6),
+            'latency_seconds': percentiles([c['latency_seconds'] for c in model_calls]),
+            'queue_seconds': percentiles(list(queue.values())),
+            'input_tokens_per_call': percentiles([c['input_tokens'] for c in model_calls]),
+            'documents': {d: self.document_breakdown(d) for d in documents},
+        }
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Route documents between a fast, cheap model and the strong model.
+
+Most vault documents are short concept sheets or prose without NPC sections;
+the strong model is only needed for long, NPC-dense documents. Routing rules
+look at the document's size and section mix and pick a tier. A fast-tier
+result that fails validation is re-parsed on the strong tier.
+"""
+
+import json
+from pathlib import Path
+
+from llm_chunking import split_sections
+from llm_client import DEFAULT_MODEL, FakeBackend, LLMBackend, estimate_tokens, make_backend
+from llm_hybrid import section_category
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_FAST_MODEL = 'gemini-2.5-flash'
+FAST = 'fast'
+STRONG = 'strong'
+
+# Evaluated in order; the first rule whose limits all hold picks the tier.
+# Documents matching no rule go to the strong model. Supported limits:
+# max_tokens, max_sections, max_npc_sections.
+DEFAULT_ROUTING_RULES = [
+    {'tier': FAST, 'max_tokens': 1500, 'reason': 'short document'},
+    {'tier': FAST, 'max_tokens': 6000, 'max_npc_sections': 0, 'reason': 'no NPC sections'},
+]
+
+RULE_LIMITS = {
+    'max_tokens': 'tokens',
+    'max_sections': 'sections',
+    'max_npc_sections': 'npc_sections',
+}
+
+
+def load_routing_rules(path: Path) -> list[dict]:
+    """Read routing rules from a JSON file (a list shaped like DEFAULT_ROUTING_RULES)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        rules = json.load(f)
+    if not isinstance(rules, list):
+        raise ValueError(f"{path}: routing rules must be a JSON list")
+    for rule in rules:
+        if rule.get('tier') not in (FAST, STRONG):
+            raise ValueError(f"{path}: rule {rule} needs a tier of '{FAST}' or '{STRONG}'")
+        unknown = set(rule) - set(RULE_LIMITS) - {'tier', 'reason'}
+        if unknown:
+            raise ValueError(f"{path}: unknown rule keys {sorted(unknown)}")
+    return rules
+
+
+def document_features(document_text: str) -> dict:
+    """Size and section mix of a document, as used by the routing rules."""
+    tokens = estimate_tokens(document_text)
+    sections = split_sections(document_text)
+    npc_sections = sum(1 for s in sections if section_category(s[0]) == 'npcs')
+    return {
+        'tokens': tokens,
+        'sections': len(sections),
+        'npc_sections': npc_sections,
+    }
+
+
+def validate_parse_result(parsed: dict) -> list[str]:
+    """List what is wrong with a parse result (empty if it looks usable)."""
+    if not isinstance(parsed, dict):
+        return ["result is not an object"]
+    problems = []
+    if parsed.get('error'):
+        problems.append(f"error: {parsed['error']}")
+    if parsed.get('chunk_errors'):
+        problems.append(f"{len(parsed['chunk_errors'])} chunks failed")
+    if not isinstance(parsed.get('character'), dict):
+        problems.append("missing character object")
+    for key in ('npcs', 'companions', 'session_notes', 'writings'):
+        value = parsed.get(key, [])
+        if not isinstance(value, list):
+            problems.append(f"{key} is not a list")
+        elif key == 'npcs' and any(not isinstance(n, dict) or not n.get('name') for n in value):
+            problems.append("NPC without a name")
+    return problems
+
+
+class ModelRouter:
+    """Picks a backend tier per document from `rules`."""
+
+    def __init__(self, backends: dict, rules: list[dict] = None):
+        self.backends = backends
+        self.rules = DEFAULT_ROUTING_RULES if rules is None else rules
+
+    def route(self, document_text: str) -> tuple:
+        """Returns (tier, reason, features) for a document."""
+        features = document_features(document_text)
+        for rule in self.rules:
+            if all(features[feature] <= rule[limit]
+                   for limit, feature in RULE_LIMITS.items() if limit in rule):
+                return rule['tier'], rule.get('reason', 'rule matched'), features
+        return STRONG, 'no fast rule matched', features
+
+    def backend(self, tier: str) -> LLMBackend:
+        return self.backends[tier]
+
+
+def make_tier_backends(backend_name: str, strong_model: str = None, fast_model: str = None,
+                       fake_latency: float = 0.05, fake_quota: int = None,
+                       fake_fast_reliable_tokens: int = None) -> dict:
+    """Create the {'fast': ..., 'strong': ...} backends for a router.
+
+    For the fake backend the fast tier answers four times quicker and, with
+    `fake_fast_reliable_tokens`, drops structure on longer prompts so
+    escalation can be exercised offline.
+    """
+    if backend_name == 'fake':
+        return {
+            FAST: FakeBackend(latency=fake_latency / 4, model_name=fast_model or 'fake-fast',
+                              quota_concurrency=fake_quota,
+                              max_reliable_tokens=fake_fast_reliable_tokens),
+            STRONG: FakeBackend(latency=fake_latency, model_name=strong_model or 'fake-parser',
+                                quota_concurrency=fake_quota),
+        }
+    return {
+        FAST: make_backend(backend_name, fast_model or DEFAULT_FAST_MODEL),
+        STRONG: make_backend(backend_name, strong_model or DEFAULT_MODEL),
+    }
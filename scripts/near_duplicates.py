@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection for extracted documents.
+
+Copies and forks of a character document (an old export next to the current
+one, a one-page version of a long backstory) are otherwise extracted,
+uploaded and sent to the LLM once each. Documents and their paragraphs are
+reduced to MinHash signatures over word shingles; locality-sensitive hashing
+on signature bands finds candidate pairs without comparing everything with
+everything. Two kinds of document matches are reported:
+
+- copy: the documents' shingle sets are mostly the same (estimated Jaccard)
+- fork: most paragraphs of the smaller document reappear in the larger one
+
+Signatures are cached per document content hash, so later runs only hash new
+or changed documents; documents left out of a run keep their signatures until
+they are deleted. Only copies are resolved automatically (skip/merge); a fork
+may be a different character that reuses another's text, so forks are
+reported for review.
+
+Usage:
+    python near_duplicates.py
+    python near_duplicates.py --dir extracted_documents --report duplicates.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+from collections import defaultdict
+from pathlib import Path
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_DOCUMENTS_DIR = Path(__file__).parent / "extracted_documents"
+DEFAULT_INDEX_FILE = Path(__file__).parent / ".near_duplicates.json"
+INDEX_VERSION = 1
+
+DOCUMENT_SHINGLE_WORDS = 5
+DOCUMENT_PERMUTATIONS = 128
+DOCUMENT_BANDS = 32              # 4 rows per band
+
+PARAGRAPH_SHINGLE_WORDS = 3
+PARAGRAPH_PERMUTATIONS = 32
+PARAGRAPH_BANDS = 8              # 4 rows per band
+MIN_PARAGRAPH_CHARS = 60         # shorter paragraphs (headers, one-liners) are not compared
+
+DEFAULT_THRESHOLD = 0.8          # estimated Jaccard for copies
+PARAGRAPH_THRESHOLD = 0.6        # estimated Jaccard for edited paragraphs to still match
+DEFAULT_CONTAINMENT = 0.7        # share of the smaller document's paragraphs found in the larger
+
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def _permutations(count: int, seed: int) -> list[tuple]:
+    rng = random.Random(seed)
+    return [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(MERSENNE_PRIME)) for _ in range(count)]
+
+
+DOCUMENT_HASHES = _permutations(DOCUMENT_PERMUTATIONS, 1)
+PARAGRAPH_HASHES = _permutations(PARAGRAPH_PERMUTATIONS, 2)
+
+
+def split_paragraphs(text: str) -> list[str]:
+    return [p.strip() for p in text.split('\n\n') if p.strip()]
+
+
+def shingles(text: str, words: int) -> set:
+    """64-bit hashes of the overlapping `words`-word shingles of a text."""
+    tokens = re.findall(r'\w+', text.lower())
+    if len(tokens) < words:
+        grams = [' '.join(tokens)] if tokens else []
+    else:
+        grams = (' '.join(tokens[i:i + words]) for i in range(len(tokens) - words + 1))
+    return {int.from_bytes(hashlib.blake2b(g.encode('utf-8'), digest_size=8).digest(), 'little')
+            for g in grams}
+
+
+def minhash(hashed: set, permutations: list[tuple]) -> list[int]:
+    if not hashed:
+        return [MERSENNE_PRIME] * len(permutations)
+    return [min((a * x + b) % MERSENNE_PRIME for x in hashed) for a, b in permutations]
+
+
+def estimate_jaccard(a: list[int], b: list[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def lsh_candidates(signatures: dict, bands: int) -> set:
+    """Pairs of keys whose signatures agree on at least one whole band."""
+    buckets = defaultdict(list)
+    for key, signature in signatures.items():
+        rows = len(signature) // bands
+        for band in range(bands):
+            buckets[(band, tuple(signature[band * rows:(band + 1) * rows]))].append(key)
+    pairs = set()
+    for keys in buckets.values():
+        for i in range(len(keys)):
+            for j in range(i + 1, len(keys)):
+                pairs.add((keys[i], keys[j]) if keys[i] < keys[j] else (keys[j], keys[i]))
+    return pairs
+
+
+class NearDuplicateIndex:
+    """MinHash signatures of documents and their paragraphs, cached by content hash."""
+
+    def __init__(self):
+        self.entries = {}
+
+    @classmethod
+    def load(cls, path: Path) -> 'NearDuplicateIndex':
+        index = cls()
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                index.entries = data['documents']
+        except (OSError, json.JSONDecodeError, KeyError):
+            pass
+        return index
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'documents': self.entries}, f)
+        os.replace(tmp_path, path)
+
+    def update(self, documents: list[tuple], on_disk=None) -> dict:
+        """Sign new or changed (name, text) documents.
+
+        Documents not in this run keep their entries while their name is in
+        `on_disk` (every document that still exists); the rest are forgotten.
+        Without `on_disk` nothing is forgotten.
+        """
+        counts = {'reused': 0, 'hashed': 0, 'removed': 0}
+        current = {}
+        for name, text in documents:
+            digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            entry = self.entries.get(name)
+            if entry and entry['hash'] == digest:
+                counts['reused'] += 1
+            else:
+                counts['hashed'] += 1
+                paragraphs = split_paragraphs(text)
+                entry = {
+                    'hash': digest,
+                    'paragraph_count': len(paragraphs),
+                    'signature': minhash(shingles(text, DOCUMENT_SHINGLE_WORDS), DOCUMENT_HASHES),
+                    'paragraphs': {
+                        str(i): minhash(shingles(p, PARAGRAPH_SHINGLE_WORDS), PARAGRAPH_HASHES)
+                        for i, p in enumerate(paragraphs) if len(p) >= MIN_PARAGRAPH_CHARS
+                    },
+                }
+            current[name] = entry
+        for name, entry in self.entries.items():
+            if name not in current:
+                if on_disk is None or name in on_disk:
+                    current[name] = entry
+                else:
+                    counts['removed'] += 1
+        self.entries = current
+        return counts
+
+    def find(self, threshold: float = DEFAULT_THRESHOLD,
+             containment: float = DEFAULT_CONTAINMENT, names=None) -> dict:
+        """Near-duplicate paragraphs (across documents) and documents.
+
+        `threshold` is the estimated Jaccard similarity for copies,
+        `containment` the share of paragraphs for forks. With `names`, only
+        those documents are compared.
+        """
+        entries = self.entries if names is None else {n: self.entries[n] for n in names if n in self.entries}
+        paragraph_signatures = {
+            (name, int(i)): signature
+            for name, entry in entries.items()
+            for i, signature in entry['paragraphs'].items()
+        }
+        paragraph_pairs = []
+        for a, b in lsh_candidates(paragraph_signatures, PARAGRAPH_BANDS):
+            if a[0] == b[0]:
+                continue
+            similarity = estimate_jaccard(paragraph_signatures[a], paragraph_signatures[b])
+            if similarity >= PARAGRAPH_THRESHOLD:
+                paragraph_pairs.append((a, b, similarity))
+
+        # Paragraphs of each document that reappear in each other document
+        shared = defaultdict(set)
+        for a, b, _ in paragraph_pairs:
+            shared[(a[0], b[0])].add(a[1])
+            shared[(b[0], a[0])].add(b[1])
+
+        document_signatures = {name: entry['signature'] for name, entry in entries.items()}
+        candidates = lsh_candidates(document_signatures, DOCUMENT_BANDS)
+        candidates |= {tuple(sorted(pair)) for pair in shared}
+
+        documents = []
+        for a, b in sorted(candidates):
+            jaccard = estimate_jaccard(document_signatures[a], document_signatures[b])
+            contained = []
+            for small, large in ((a, b), (b, a)):
+                compared = len(entries[small]['paragraphs'])
+                if compared >= 2:
+                    contained.append((len(shared[(small, large)]) / compared, small, large))
+            best = max(contained, default=(0.0, None, None))
+            if jaccard >= threshold:
+                kind = 'copy'
+            elif best[0] >= containment:
+                kind = 'fork'
+            else:
+                continue
+            documents.append({
+                'documents': [a, b],
+                'kind': kind,
+                'jaccard': round(jaccard, 3),
+                'containment': round(best[0], 3),
+                'contained': best[1] if kind == 'fork' else None,
+            })
+
+        return {
+            'documents': documents,
+            'paragraphs': [
+                {'a': {'document': a[0], 'paragraph': a[1]},
+                 'b': {'document': b[0], 'paragraph': b[1]},
+                 'similarity': round(similarity, 3)}
+                for a, b, similarity in sorted(paragraph_pairs)
+            ],
+        }
+
+
+def duplicate_clusters(report: dict, kinds=('copy',)) -> list[list[str]]:
+    """Group documents linked by matches of the given kinds (union-find)."""
+    parent = {}
+
+    def root(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for match in report['documents']:
+        if match['kind'] not in kinds:
+            continue
+        a, b = match['documents']
+        parent[root(a)] = root(b)
+
+    clusters = defaultdict(list)
+    for name in parent:
+        clusters[root(name)].append(name)
+    return [sorted(c) for c in clusters.values() if len(c) > 1]
+
+
+def resolve_duplicates(documents: list[tuple], report: dict, action: str) -> tuple:
+    """Apply 'skip' or 'merge' to (name, text) documents that are copies.
+
+    Forks are left alone: a separate character that shares text with another
+    is not a duplicate, so they are only reported for review. The longest
+    document of each cluster of copies is kept. With 'skip' the others are
+    dropped; with 'merge' their paragraphs that do not already appear in the
+    kept document are appended to it. Returns (documents, {dropped: kept}).
+    """
+    texts = dict(documents)
+    near = defaultdict(set)
+    for pair in report['paragraphs']:
+        a, b = pair['a'], pair['b']
+        near[(a['document'], a['paragraph'])].add(b['document'])
+        near[(b['document'], b['paragraph'])].add(a['document'])
+
+    replaced = {}
+    for cluster in duplicate_clusters(report):
+        cluster = [name for name in cluster if name in texts]
+        if len(cluster) < 2:
+            continue
+        keep = max(cluster, key=lambda name: len(texts[name]))
+        for name in cluster:
+            if name == keep:
+                continue
+            replaced[name] = keep
+            if action == 'merge':
+                existing = set(split_paragraphs(texts[keep]))
+                extra = [p for i, p in enumerate(split_paragraphs(texts[name]))
+                         if p not in existing and keep not in near[(name, i)]]
+                if extra:
+                    texts[keep] = texts[keep] + '\n\n' + '\n\n'.join(extra)
+
+    kept = [(name, texts[name]) for name, _ in documents if name not in replaced]
+    return kept, replaced
+
+
+def check_documents(documents: list[tuple], index_file: Path = DEFAULT_INDEX_FILE,
+                    threshold: float = DEFAULT_THRESHOLD,
+                    containment: float = DEFAULT_CONTAINMENT, on_disk=None) -> dict:
+    """Update the cached index with (name, text) documents and report near-duplicates among them.
+
+    `on_disk` names every document that still exists (see NearDuplicateIndex.update()).
+    """
+    index = NearDuplicateIndex.load(index_file)
+    counts = index.update(documents, on_disk)
+    index.save(index_file)
+    report = index.find(threshold, containment, [name for name, _ in documents])
+    report['index'] = counts
+    return report
+
+
+def print_report(report: dict) -> None:
+    for match in report['documents']:
+        a, b = match['documents']
+        if match['kind'] == 'fork':
+            other = b if match['contained'] == a else a
+            detail = f"{match['containment']:.0%} of {match['contained']} appears in {other} (review)"
+        else:
+            detail = f"~{match['jaccard']:.0%} similar"
+        print(f"  Near-duplicate ({match['kind']}): {a} <-> {b}: {detail}")
+    print(f"  {len(report['documents'])} near-duplicate documents, "
+          f"{len(report['paragraphs'])} shared paragraphs "
+          f"({report['index']['hashed']} documents hashed, {report['index']['reused']} reused)")
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Find near-duplicate extracted documents.")
+    parser.add_argument('--dir', type=Path, default=DEFAULT_DOCUMENTS_DIR)
+    parser.add_argument('--index-file', type=Path, default=DEFAULT_INDEX_FILE)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--containment', type=float, default=DEFAULT_CONTAINMENT)
+    parser.add_argument('--report', type=Path, default=None, help="write the full report as JSON")
+    args = parser.parse_args(argv)
+
+    documents = []
+    for path in sorted(args.dir.glob('*.txt')):
+        if not path.name.startswith('_'):
+            documents.append((path.stem, path.read_text(encoding='utf-8')))
+
+    report = check_documents(documents, args.index_file, args.threshold, args.containment,
+                             on_disk={name for name, _ in documents})
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Saved to: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
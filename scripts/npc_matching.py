@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Fuzzy NPC name matching across the vault.
+
+deduplicate_relationships() only merges names when one contains the other, so
+spelling variants ("Giselbert Almayda" / "Giselbert Almaida") and short forms
+("Gisel") survive as separate NPCs. Comparing every pair of names would be
+quadratic, so names are first blocked by shared character trigrams and only
+pairs inside a block are scored with edit distance. The result is a list of
+merge suggestions for review, not an automatic merge.
+
+Usage:
+    python npc_matching.py vault_characters_import.json --scope all -o npc_merge_suggestions.json
+"""
+
+import argparse
+import json
+import time
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from npc_registry import RELATIVE_NAMES, normalize_npc_name
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_THRESHOLD = 0.8
+# Share of the smaller name's trigrams two names must have in common to be compared
+MIN_TRIGRAM_OVERLAP = 0.4
+# Trigrams shared by more than this share of all names (and more than
+# MIN_COMMON_TRIGRAM_POSTINGS of them) are too common to block on
+MAX_TRIGRAM_SHARE = 0.05
+MIN_COMMON_TRIGRAM_POSTINGS = 100
+# Shortest token accepted as an abbreviation of a longer one ("Gisel" -> "Giselbert")
+MIN_PREFIX_LENGTH = 4
+
+
+def trigrams(key: str) -> set:
+    """Character trigrams of each word of a normalised name, padded at word edges."""
+    grams = set()
+    for token in key.split():
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def levenshtein(a: str, b: str, max_distance: int = None) -> int:
+    """Edit distance between two strings, or max_distance + 1 once it is exceeded."""
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def _similarity(a: str, b: str, threshold: float = 0.0) -> float:
+    """1 - normalised edit distance; 0 when it is certainly below `threshold`."""
+    longest = max(len(a), len(b)) or 1
+    max_distance = int((1 - threshold) * longest + 1e-9)
+    distance = levenshtein(a, b, max_distance)
+    return 0.0 if distance > max_distance else 1 - distance / longest
+
+
+def name_similarity(a: str, b: str, threshold: float = 0.0) -> tuple:
+    """Score two normalised names between 0 and 1. Returns (score, reason).
+
+    Whole names are compared by edit distance. Names with a different number
+    of words are also compared word by word, so a first name or an abbreviated
+    first name matches the full name at a slightly lower score. Scores that
+    cannot reach `threshold` are cut short and reported as 0.
+    """
+    whole = _similarity(a, b, threshold)
+    best = (whole, 'spelling variant')
+
+    shorter, longer = sorted((a.split(), b.split()), key=len)
+    if shorter and len(shorter) < len(longer):
+        scores = []
+        for token in shorter:
+            token_best = 0.0
+            for other in longer:
+                if token == other:
+                    token_best = 1.0
+                elif len(token) >= MIN_PREFIX_LENGTH and other.startswith(token):
+                    token_best = max(token_best, 0.9)
+                else:
+                    token_best = max(token_best, _similarity(token, other))
+            scores.append(token_best)
+        partial = 0.95 * sum(scores) / len(scores)
+        if partial > best[0]:
+            best = (partial, 'short form')
+    return round(best[0], 3), best[1]
+
+
+def collect_mentions(characters: list[dict]) -> list[dict]:
+    """One entry per (character, NPC name) from importer output."""
+    mentions = []
+    for character in characters:
+        for rel in character.get('relationships') or []:
+            name = rel.get('related_name')
+            if name:
+                mentions.append({'character': character.get('name'), 'name': name,
+                                 'npc_id': rel.get('npc_id')})
+    return mentions
+
+
+def find_merge_suggestions(mentions: list[dict], scope: str = 'all',
+                           threshold: float = DEFAULT_THRESHOLD) -> list[dict]:
+    """Pairs of distinct NPC names that probably refer to the same NPC.
+
+    `scope` is 'character' to only pair names within one character's document,
+    or 'all' to pair across the whole vault. Relative names ("Dad") are never
+    paired. Suggestions are sorted best first.
+    """
+    names = {}
+    for mention in mentions:
+        key = normalize_npc_name(mention['name'])
+        if not key or key in RELATIVE_NAMES:
+            continue
+        entry = names.setdefault(key, {'key': key, 'names': set(), 'characters': set()})
+        entry['names'].add(mention['name'])
+        entry['characters'].add(mention['character'])
+    entries = list(names.values())
+
+    grams = [trigrams(e['key']) for e in entries]
+    postings = defaultdict(list)
+    for i, entry_grams in enumerate(grams):
+        for gram in entry_grams:
+            postings[gram].append(i)
+
+    max_postings = max(MIN_COMMON_TRIGRAM_POSTINGS, MAX_TRIGRAM_SHARE * len(entries))
+    common_grams = {gram for gram, block in postings.items() if len(block) > max_postings}
+    needed = [MIN_TRIGRAM_OVERLAP * len(g - common_grams) for g in grams]
+
+    suggestions = []
+    for i, entry in enumerate(entries):
+        shared = Counter()
+        for gram in grams[i]:
+            if gram in common_grams:
+                continue
+            block = postings[gram]
+            # Postings are in ascending order; only pair with later names
+            shared.update(block[bisect_right(block, i):])
+
+        for j, count in shared.items():
+            if count < needed[i] and count < needed[j]:
+                continue
+            other = entries[j]
+            common = entry['characters'] & other['characters']
+            if scope == 'character' and not common:
+                continue
+            score, reason = name_similarity(entry['key'], other['key'], threshold)
+            if score < threshold:
+                continue
+            suggestions.append({
+                'names': sorted(entry['names']) + sorted(other['names']),
+                'keep': max(sorted(entry['names']) + sorted(other['names']), key=len),
+                'score': score,
+                'reason': reason,
+                'same_character': bool(common),
+                'characters': sorted(entry['characters'] | other['characters']),
+            })
+
+    suggestions.sort(key=lambda s: (-s['score'], s['keep']))
+    return suggestions
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Suggest NPC merges from fuzzy name matches.")
+    parser.add_argument('input', type=Path, help="importer output JSON")
+    parser.add_argument('--scope', choices=['character', 'all'], default='all',
+                        help="match names within each character only, or across the vault")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="minimum similarity (0-1) for a suggestion")
+    parser.add_argument('-o', '--output', type=Path, default=None,
+                        help="write suggestions as JSON for review")
+    args = parser.parse_args(argv)
+
+    with open(args.input, encoding='utf-8') as f:
+        data = json.load(f)
+    characters = data['characters'] if isinstance(data, dict) else data
+
+    started = time.perf_counter()
+    mentions = collect_mentions(characters)
+    suggestions = find_merge_suggestions(mentions, args.scope, args.threshold)
+    elapsed = time.perf_counter() - started
+
+    for s in suggestions:
+        where = 'same character' if s['same_character'] else f"{len(s['characters'])} characters"
+        print(f"{s['score']:.2f}  {' / '.join(s['names'])}  -> {s['keep']}  ({s['reason']}, {where})")
+    print(f"\n{len(suggestions)} merge suggestions from {len(mentions)} NPC mentions in {elapsed:.2f}s")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'scope': args.scope, 'threshold': args.threshold, 'suggestions': suggestions},
+                      f, indent=2, ensure_ascii=False)
+        print(f"Saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Cross-document NPC registry.
+
+The same NPC (a shared patron, a guild master, a villain) appears in many
+characters' documents. The registry maps normalised NPC names and aliases to
+stable IDs derived from the name itself, and keeps a postings list of which
+characters mention each NPC. It is saved as JSON next to the import output,
+and every extracted relationship is tagged with its NPC's 'npc_id'. The import
+API does not use the IDs yet: it still creates story_characters by name.
+"""
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+REGISTRY_VERSION = 1
+
+# Titles dropped before matching, so "Captain Vex" and "Vex" are one NPC
+NAME_TITLES = {
+    'lord', 'lady', 'sir', 'dame', 'captain', 'capt', 'baron', 'baroness', 'count', 'countess',
+    'duke', 'duchess', 'king', 'queen', 'prince', 'princess', 'master', 'mistress', 'father',
+    'mother', 'brother', 'sister', 'uncle', 'aunt', 'doctor', 'dr', 'professor', 'the',
+}
+
+# Names that mean a different person in every document ("Dad" in one backstory
+# is not "Dad" in another); they are registered per character
+RELATIVE_NAMES = {
+    'father', 'mother', 'dad', 'mom', 'mum', 'papa', 'mama', 'brother', 'sister', 'twin',
+    'grandmother', 'grandfather', 'grandma', 'grandpa', 'nana', 'uncle', 'aunt', 'son',
+    'daughter', 'husband', 'wife', 'sis', 'bro',
+}
+
+NICKNAME_PATTERN = re.compile(r'["“”„«»]([^"“”„«»]+)["“”„«»]'
+                              r'|\(([^)]+)\)')
+
+
+def normalize_npc_name(name: str) -> str:
+    """Lowercase, accent-free, punctuation-free form of a name without titles."""
+    text = unicodedata.normalize('NFKD', name)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    words = re.findall(r"\w+", text.replace("'", '').replace('’', ''))
+    stripped = [w for w in words if w not in NAME_TITLES]
+    return ' '.join(stripped or words)
+
+
+def split_nicknames(name: str) -> tuple:
+    """Split 'Cornelia "Lia" O'Nest' into ('Cornelia O'Nest', ['Lia'])."""
+    nicknames = [(m.group(1) or m.group(2)).strip() for m in NICKNAME_PATTERN.finditer(name)]
+    base = re.sub(r'\s+', ' ', NICKNAME_PATTERN.sub(' ', name)).strip()
+    return base or name, [n for n in nicknames if n]
+
+
+def npc_id(key: str) -> str:
+    """Stable ID for a normalised NPC key."""
+    return 'npc_' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+
+class NPCRegistry:
+    """Alias table plus postings list of NPCs across all characters.
+
+    `npcs` maps ID -> {'id', 'name', 'aliases', 'characters'}, where
+    'characters' maps each mentioning character to its relationship type.
+    `aliases` maps every normalised name or nickname to an ID. Two reverse
+    indexes (character -> NPC IDs, NPC ID -> alias keys) keep updating one
+    character proportional to its own relationships.
+    """
+
+    def __init__(self):
+        self.npcs = {}
+        self.aliases = {}
+        self._by_character = defaultdict(set)
+        self._alias_keys = defaultdict(set)
+
+    def _reindex(self) -> None:
+        """Rebuild the reverse indexes from `npcs` and `aliases`."""
+        self._by_character = defaultdict(set)
+        self._alias_keys = defaultdict(set)
+        for npc, record in self.npcs.items():
+            for character in record['characters']:
+                self._by_character[character].add(npc)
+        for key, npc in self.aliases.items():
+            self._alias_keys[npc].add(key)
+
+    # ---------------------------------------------------------------- lookup
+
+    @staticmethod
+    def _key(name: str, character: str = None) -> str:
+        key = normalize_npc_name(name)
+        if key in RELATIVE_NAMES and character:
+            return f"{normalize_npc_name(character)}/{key}"
+        return key
+
+    def resolve(self, name: str, character: str = None) -> str:
+        """ID registered for a name or nickname, or None."""
+        base, nicknames = split_nicknames(name)
+        for candidate in [base] + nicknames:
+            key = self._key(candidate, character)
+            if key in self.aliases:
+                return self.aliases[key]
+        return None
+
+    # ---------------------------------------------------------------- updates
+
+    def add_alias(self, alias: str, npc: str, character: str = None) -> None:
+        """Point another name at an existing NPC ID."""
+        key = self._key(alias, character)
+        if not key or key in RELATIVE_NAMES:
+            return
+        if key not in self.aliases:
+            self.aliases[key] = npc
+            self._alias_keys[npc].add(key)
+        aliases = self.npcs[npc]['aliases']
+        if alias not in aliases and alias != self.npcs[npc]['name']:
+            aliases.append(alias)
+
+    def register(self, name: str, character: str, relationship_type: str = None) -> str:
+        """Add one mention of an NPC by a character. Returns the NPC's ID."""
+        base, nicknames = split_nicknames(name)
+        npc = self.resolve(name, character)
+        if npc is None:
+            key = self._key(base, character)
+            npc = npc_id(key)
+            self.npcs.setdefault(npc, {'id': npc, 'name': base, 'aliases': [], 'characters': {}})
+            self.aliases[key] = npc
+            self._alias_keys[npc].add(key)
+        else:
+            current = self.npcs[npc]['name']
+            if len(base) > len(current) and self._key(base, character) == self._key(current, character):
+                # Prefer the fullest spelling ("Captain Vex" over "Vex") as display name
+                self.npcs[npc]['name'] = base
+                self.add_alias(current, npc, character)
+
+        if base != self.npcs[npc]['name']:
+            self.add_alias(base, npc, character)
+        for nickname in nicknames:
+            self.add_alias(nickname, npc, character)
+        self.npcs[npc]['characters'][character] = relationship_type or 'other'
+        self._by_character[character].add(npc)
+        return npc
+
+    def _drop_postings(self, character: str) -> set:
+        """Remove a character's postings; returns the NPC IDs it mentioned."""
+        mentioned = self._by_character.pop(character, set())
+        for npc in mentioned:
+            self.npcs[npc]['characters'].pop(character, None)
+        return mentioned
+
+    def _drop_unmentioned(self, npcs) -> None:
+        """Delete NPCs (and their aliases) that no character mentions any more."""
+        for npc in npcs:
+            record = self.npcs.get(npc)
+            if record is None or record['characters']:
+                continue
+            del self.npcs[npc]
+            for key in self._alias_keys.pop(npc, ()):
+                if self.aliases.get(key) == npc:
+                    del self.aliases[key]
+
+    def remove_character(self, character: str) -> None:
+        """Drop a character's postings, and any NPC only that character mentioned."""
+        self._drop_unmentioned(self._drop_postings(character))
+
+    def update_character(self, character: str, relationships: list[dict]) -> list[str]:
+        """Replace a character's postings with its current relationships.
+
+        Each relationship dict gets an 'npc_id' key. Returns the IDs in order.
+        NPCs are only dropped after the new relationships are registered, so an
+        NPC the character still mentions keeps its ID and aliases.
+        """
+        previous = self._drop_postings(character)
+        ids = []
+        for rel in relationships or []:
+            name = rel.get('related_name')
+            if not name:
+                continue
+            rel['npc_id'] = self.register(name, character, rel.get('relationship_type'))
+            ids.append(rel['npc_id'])
+        self._drop_unmentioned(previous)
+        return ids
+
+    # ---------------------------------------------------------------- queries
+
+    def characters(self) -> set:
+        """Names of all characters with postings."""
+        return set(self._by_character)
+
+    def shared_npcs(self, min_characters: int = 2) -> list[dict]:
+        """NPCs mentioned by at least `min_characters` characters, most shared first."""
+        shared = [r for r in self.npcs.values() if len(r['characters']) >= min_characters]
+        return sorted(shared, key=lambda r: (-len(r['characters']), r['name']))
+
+    def stats(self) -> dict:
+        return {
+            'npcs': len(self.npcs),
+            'aliases': len(self.aliases),
+            'postings': sum(len(r['characters']) for r in self.npcs.values()),
+            'shared_npcs': len(self.shared_npcs()),
+        }
+
+    # ---------------------------------------------------------------- persistence
+
+    def to_dict(self) -> dict:
+        return {
+            'version': REGISTRY_VERSION,
+            'npcs': {npc: self.npcs[npc] for npc in sorted(self.npcs)},
+            'aliases': dict(sorted(self.aliases.items())),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'NPCRegistry':
+        registry = cls()
+        if data.get('version') == REGISTRY_VERSION:
+            registry.npcs = data.get('npcs', {})
+            registry.aliases = data.get('aliases', {})
+            registry._reindex()
+        return registry
+
+    @classmethod
+    def load(cls, path: Path) -> 'NPCRegistry':
+        """Load a saved registry; a missing or unreadable file gives an empty one."""
+        try:
+            with open(path, encoding='utf-8') as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            return cls()
+
+    def save(self, path: Path) -> None:
+        """Write the registry atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
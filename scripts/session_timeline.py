@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Session timeline across all characters.
+
+Every character's session_journal is collected into one index so what each
+player wrote about the same night can be read side by side. Dates are
+normalised from the many formats in the documents ("21/03/2021", "15.04.21",
+"3 May 2021") by a memoised parser. A numeric date that reads both ways
+("03/05/21") is resolved per entry by which reading fits the character's
+other session dates (or the campaign cadence) and is marked with
+'date_order'. Numbered sessions without a date are dated from the campaign:
+either an explicit session list or start date plus cadence in a campaigns
+file, or the dates other players in the same campaign wrote for that session
+number.
+
+Usage:
+    python session_timeline.py vault_characters_import.json session 3
+    python session_timeline.py vault_characters_import.json range 2021-02-01 2021-03-31
+    python session_timeline.py vault_characters_import.json --campaigns campaigns.json timeline
+
+A campaigns file looks like:
+    {"Rambler crew": {"characters": ["Lyra Forglemmigej", "Shae Nadine Flint"],
+                      "start_date": "2021-02-19", "cadence_days": 7,
+                      "sessions": {"4": "2021-03-19"}}}
+"""
+
+import argparse
+import json
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+MONTH_NAMES = ('january', 'february', 'march', 'april', 'may', 'june', 'july',
+               'august', 'september', 'october', 'november', 'december')
+# Full names and abbreviations ("Mar", "Sept") -> month number
+MONTHS = {**{name: i for i, name in enumerate(MONTH_NAMES, 1)},
+          **{name[:3]: i for i, name in enumerate(MONTH_NAMES, 1)}, 'sept': 9}
+# Whole words only, so "Marcus" or "Mayhem" are not months
+MONTH = r'\b(' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\b'
+
+NUMERIC_DATE = re.compile(r'(?<!\d)(\d{1,4})[/.\-](\d{1,2})[/.\-](\d{2,4})(?!\d)')
+DAY_MONTH_NAME = re.compile(r'(?<!\d)(\d{1,2})(?:st|nd|rd|th)?\.?\s+' + MONTH + r'\.?,?\s+(\d{4})',
+                            re.IGNORECASE)
+MONTH_NAME_DAY = re.compile(MONTH + r'\.?\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})', re.IGNORECASE)
+# "Session 21/03/2021" split by the numbered-session extractor into number 21
+# and a summary starting with "/03/2021"
+DATE_REMAINDER = re.compile(r'^\s*([/.\-]\d{1,2}[/.\-]\d{2,4})')
+
+# Only look this far into a summary for a date written under the header
+SUMMARY_DATE_CHARS = 40
+# Days between sessions when neither the campaign nor the dates say otherwise
+DEFAULT_CADENCE_DAYS = 7
+
+
+def _make_date(year: int, month: int, day: int):
+    if year < 100:
+        year += 2000
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def parse_session_date(text: str):
+    """First date in a string, as a datetime.date (day-first), or None.
+
+    Memoised: the same few date strings repeat across every character.
+    """
+    match = NUMERIC_DATE.search(text)
+    if match:
+        first, second, third = (int(g) for g in match.groups())
+        if len(match.group(1)) == 4:
+            return _make_date(first, second, third)
+        # Day first, unless that is impossible and month first is not
+        return _make_date(third, second, first) or _make_date(third, first, second)
+    match = DAY_MONTH_NAME.search(text)
+    if match:
+        return _make_date(int(match.group(3)), MONTHS[match.group(2).lower()], int(match.group(1)))
+    match = MONTH_NAME_DAY.search(text)
+    if match:
+        return _make_date(int(match.group(3)), MONTHS[match.group(1).lower()], int(match.group(2)))
+    return None
+
+
+@lru_cache(maxsize=4096)
+def session_date_candidates(text: str) -> tuple:
+    """Possible readings of the first date in a string.
+
+    Two dates (day-first, month-first) when a numeric date is valid both ways
+    ("03/05/21"), otherwise the one date parse_session_date() finds, or none.
+    """
+    match = NUMERIC_DATE.search(text)
+    if match and len(match.group(1)) != 4:
+        first, second, third = (int(g) for g in match.groups())
+        day_first, month_first = _make_date(third, second, first), _make_date(third, first, second)
+        if day_first and month_first and day_first != month_first:
+            return day_first, month_first
+    found = parse_session_date(text)
+    return (found,) if found else ()
+
+
+def _resolve_ambiguous(entries: list[dict], candidates: list[tuple], cadence_days: int = None) -> None:
+    """Pick day-first or month-first for each ambiguous date of one character, in place.
+
+    Each numbered session is compared with the date expected from the
+    nearest unambiguous numbered session at the campaign cadence (or the
+    cadence of the character's own unambiguous dates). Without a numbered
+    anchor, the reading closest after the previous dated entry wins; failing
+    that, day-first.
+    """
+    anchors = sorted((e['session_number'], c[0]) for e, c in zip(entries, candidates)
+                     if len(c) == 1 and e['session_number'] is not None)
+    if not cadence_days:
+        gaps = sorted((b[1] - a[1]).days / (b[0] - a[0]) for a, b in zip(anchors, anchors[1:])
+                      if b[0] > a[0] and b[1] > a[1])
+        cadence_days = gaps[len(gaps) // 2] if gaps else DEFAULT_CADENCE_DAYS
+
+    previous = None
+    for entry, options in zip(entries, candidates):
+        if len(options) == 2:
+            number = entry['session_number']
+            if number is not None and anchors:
+                anchor_number, anchor_date = min(anchors, key=lambda a: abs(a[0] - number))
+                expected = anchor_date + timedelta(days=cadence_days * (number - anchor_number))
+                chosen = min(options, key=lambda d: abs((d - expected).days))
+            elif previous is not None and any(d >= previous for d in options):
+                chosen = min((d for d in options if d >= previous), key=lambda d: d - previous)
+            else:
+                chosen = options[0]
+            entry['date'] = chosen
+            entry['date_order'] = 'day-first' if chosen == options[0] else 'month-first'
+        if entry['date']:
+            previous = entry['date']
+
+
+def session_entries(character: dict, campaign: str, cadence_days: int = None) -> list[dict]:
+    """Timeline entries for one character's session_journal, dated where possible.
+
+    Ambiguous numeric dates are resolved with _resolve_ambiguous().
+    """
+    entries = []
+    candidates = []
+    for session in character.get('session_journal') or []:
+        number = session.get('session_number')
+        summary = session.get('summary') or ''
+        # Date-based sessions are numbered by the extractor in document order
+        numbered = not session.get('date')
+        found, source = (), None
+
+        remainder = DATE_REMAINDER.match(summary)
+        if remainder and number is not None:
+            found, source = session_date_candidates(f"{number}{remainder.group(1)}"), 'title'
+            if found:
+                number, numbered = None, False
+                summary = summary[remainder.end():].lstrip(':- \n')
+        for text, text_source in ((session.get('date'), 'entry'), (session.get('title'), 'title'),
+                                  (summary[:SUMMARY_DATE_CHARS], 'summary')):
+            if not found and text:
+                found, source = session_date_candidates(text), text_source
+        candidates.append(found)
+
+        entries.append({
+            'character': character.get('name'),
+            'campaign': campaign,
+            'session_number': number if numbered else None,
+            'title': session.get('title'),
+            'date': found[0] if found else None,
+            'date_source': source if found else None,
+            'date_order': None,
+            'summary': summary,
+        })
+    _resolve_ambiguous(entries, candidates, cadence_days)
+    return entries
+
+
+class SessionTimeline:
+    """Sessions of every character, indexed by (campaign, number) and by date."""
+
+    def __init__(self, entries: list[dict]):
+        self.entries = entries
+        self.by_number = defaultdict(list)
+        for entry in entries:
+            if entry['session_number'] is not None:
+                self.by_number[(entry['campaign'], entry['session_number'])].append(entry)
+        # Sorted interval index: sessions are single evenings, so each interval
+        # is one day and a range query is two binary searches
+        dated = sorted((e for e in entries if e['date']), key=lambda e: (e['date'], e['character']))
+        self._dated = dated
+        self._starts = [e['date'].toordinal() for e in dated]
+
+    @classmethod
+    def from_characters(cls, characters: list[dict], campaigns: dict = None) -> 'SessionTimeline':
+        """Build the timeline, dating numbered sessions from `campaigns` where possible."""
+        campaigns = campaigns or {}
+        campaign_of = {}
+        for campaign, meta in campaigns.items():
+            for name in meta.get('characters', []):
+                campaign_of[name] = campaign
+
+        entries = []
+        for character in characters:
+            name = character.get('name')
+            campaign = campaign_of.get(name, name)
+            cadence = campaigns.get(campaign, {}).get('cadence_days')
+            entries.extend(session_entries(character, campaign, cadence))
+        align_numbered_sessions(entries, campaigns)
+        return cls(entries)
+
+    def session(self, number: int, campaign: str = None) -> list[dict]:
+        """Session `number` across all players (of one campaign, or of every campaign)."""
+        if campaign is not None:
+            return list(self.by_number.get((campaign, number), []))
+        return [e for (c, n), group in sorted(self.by_number.items(), key=lambda item: str(item[0][0]))
+                if n == number for e in group]
+
+    def between(self, start: date, end: date) -> list[dict]:
+        """Dated sessions from `start` to `end` inclusive, in date order."""
+        lo = bisect_left(self._starts, start.toordinal())
+        hi = bisect_right(self._starts, end.toordinal())
+        return self._dated[lo:hi]
+
+    def on(self, day: date) -> list[dict]:
+        """Everything written about one night."""
+        return self.between(day, day)
+
+    def undated(self) -> list[dict]:
+        return [e for e in self.entries if not e['date']]
+
+
+def align_numbered_sessions(entries: list[dict], campaigns: dict) -> None:
+    """Date undated numbered sessions in place.
+
+    In order of preference: the campaign's explicit session list, a date
+    another player in the same campaign gave that session number, then the
+    campaign's start date plus (number - 1) * cadence_days.
+    """
+    known = defaultdict(dict)
+    for entry in entries:
+        if entry['date'] and entry['session_number'] is not None:
+            known[entry['campaign']].setdefault(entry['session_number'], entry['date'])
+
+    for entry in entries:
+        number = entry['session_number']
+        if entry['date'] or number is None:
+            continue
+        meta = campaigns.get(entry['campaign'], {})
+        explicit = meta.get('sessions', {}).get(str(number))
+        if explicit and parse_session_date(explicit):
+            entry['date'], entry['date_source'] = parse_session_date(explicit), 'campaign'
+        elif number in known[entry['campaign']]:
+            entry['date'], entry['date_source'] = known[entry['campaign']][number], 'campaign'
+        elif meta.get('start_date') and meta.get('cadence_days'):
+            start = date.fromisoformat(meta['start_date'])
+            entry['date'] = start + timedelta(days=meta['cadence_days'] * (number - 1))
+            entry['date_source'] = 'estimated'
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def _print_entries(entries: list[dict]) -> None:
+    for entry in entries:
+        when = entry['date'].isoformat() if entry['date'] else 'undated'
+        if entry['date_source'] == 'estimated':
+            when += ' (est.)'
+        elif entry['date_order']:
+            # Ambiguous numeric date, read as shown
+            when += ' (m/d)' if entry['date_order'] == 'month-first' else ' (d/m)'
+        number = f"#{entry['session_number']}" if entry['session_number'] is not None else ''
+        preview = re.sub(r'\s+', ' ', entry['summary'])[:90]
+        print(f"  {when:<18} {entry['character']} {number}: {preview}")
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Line up session notes from every character.")
+    parser.add_argument('input', type=Path, help="importer output JSON")
+    parser.add_argument('--campaigns', type=Path, help="campaign metadata JSON")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    session = commands.add_parser('session', help="one session number across all players")
+    session.add_argument('number', type=int)
+    session.add_argument('--campaign')
+
+    between = commands.add_parser('range', help="sessions between two dates")
+    between.add_argument('start', type=date.fromisoformat)
+    between.add_argument('end', type=date.fromisoformat)
+
+    commands.add_parser('timeline', help="every session in date order")
+
+    args = parser.parse_args(argv)
+    with open(args.input, encoding='utf-8') as f:
+        data = json.load(f)
+    characters = data['characters'] if isinstance(data, dict) else data
+    campaigns = {}
+    if args.campaigns:
+        with open(args.campaigns, encoding='utf-8') as f:
+            campaigns = json.load(f)
+
+    timeline = SessionTimeline.from_characters(characters, campaigns)
+
+    if args.command == 'session':
+        found = timeline.session(args.number, args.campaign)
+        _print_entries(found)
+        print(f"{len(found)} notes for session {args.number}")
+    elif args.command == 'range':
+        found = timeline.between(args.start, args.end)
+        _print_entries(found)
+        print(f"{len(found)} sessions from {args.start} to {args.end}")
+    else:
+        _print_entries(timeline.between(date.min, date.max))
+        undated = timeline.undated()
+        if undated:
+            print(f"\nUndated ({len(undated)}):")
+            _print_entries(undated)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,35 +2,51 @@
 """
 Test the character document parser by sending extracted text to Google Gemini API.
 This script validates that the parsing prompt correctly extracts all data.
+
+Documents are parsed concurrently through a pluggable backend (see llm_client),
+so the whole corpus can also be parsed offline with the fake backend:
+
+    python test_parser.py --all --backend fake --concurrency 16
 """
 
-import os
+import argparse
 import json
-import sys
+import time
 from pathlib import Path
 
-# Load environment variables from .env.local
-env_path = Path(__file__).parent.parent / ".env.local"
-if env_path.exists():
-    with open(env_path) as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#') and '=' in line:
-                key, value = line.split('=', 1)
-                os.environ[key] = value
-
-import google.generativeai as genai
-
-# Configure the API
-api_key = os.environ.get('GOOGLE_GENERATIVE_AI_API_KEY')
-if not api_key:
-    print("ERROR: GOOGLE_GENERATIVE_AI_API_KEY not found in .env.local")
-    sys.exit(1)
-
-genai.configure(api_key=api_key)
-
-# Use Gemini 3 Pro
-model = genai.GenerativeModel('gemini-3.0-pro')
+from llm_client import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MODEL,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_RETRIES,
+    DEFAULT_TIMEOUT,
+    AdaptiveBackend,
+    AdaptiveConcurrency,
+    BackendError,
+    LLMBackend,
+    TokenBucket,
+    call_with_retries,
+    estimate_tokens,
+    make_backend,
+    run_concurrent,
+)
+from llm_batching import build_batch_prompt, pack_batches, split_batch_result
+from llm_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, ResponseCache
+from llm_chunking import DEFAULT_MAX_CHUNK_TOKENS, chunk_document, merge_parse_results
+from llm_compact import compact_document, restore_placeholders
+from llm_hybrid import split_for_hybrid
+from llm_json import IncrementalJSONParser, recover_json
+from llm_metrics import RunMetrics, model_pricing
+from llm_routing import (
+    DEFAULT_FAST_MODEL,
+    FAST,
+    STRONG,
+    ModelRouter,
+    load_routing_rules,
+    make_tier_backends,
+    validate_parse_result,
+)
+from near_duplicates import check_documents, print_report, resolve_duplicates
 
 # Source directory for extracted documents
 EXTRACTED_DIR = Path(__file__).parent / "extracted_documents"
@@ -110,42 +126,366 @@ Return valid JSON with this structure:
 Extract EVERY NPC with ALL their bullet points. Nothing should be lost."""
 
 
-def parse_document(document_text: str, character_name: str) -> dict:
-    """Send document to Gemini API for parsing."""
-    print(f"  Parsing {character_name}...")
+_default_backend = None
+
+
+def get_default_backend() -> LLMBackend:
+    """Lazily create the Gemini backend used when no backend is passed in."""
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = make_backend('gemini', DEFAULT_MODEL)
+    return _default_backend
+
 
-    prompt = f"""{VAULT_CHARACTER_PARSE_PROMPT}
+def build_prompt(document_text: str, character_name: str, part: tuple = None) -> str:
+    """Build the full parse prompt for one document (or one `(index, total)` part of it)."""
+    part_note = ""
+    if part:
+        part_note = (f"\nThis is part {part[0]} of {part[1]} of the document. "
+                     "Extract only what appears in this part.\n")
+    return f"""{VAULT_CHARACTER_PARSE_PROMPT}
 
 Parse this character document. Extract EVERY piece of information, especially NPCs with ALL their details.
 
 Character Name: {character_name}
-
+{part_note}
 DOCUMENT:
 
 {document_text}"""
 
-    response = model.generate_content(prompt)
 
-    # Extract JSON from response
-    text = response.text
+def extract_json(text: str) -> dict:
+    """Pull the parse result JSON out of a model response.
+
+    Uses llm_json's brace-matching scanner and repair pass, so trailing prose,
+    trailing commas and truncated output do not force a re-request. Repairs
+    that were needed are listed under "json_repairs".
+    """
+    parsed, repairs, error = recover_json(text)
+    if parsed is None:
+        return {"error": error, "raw_response": text[:500]}
+    if not isinstance(parsed, dict):
+        return {"error": "Response JSON is not an object", "raw_response": text[:500]}
+    if repairs:
+        parsed["json_repairs"] = repairs
+    return parsed
+
+
+def stream_parse(prompt: str, backend: LLMBackend, timeout: float = DEFAULT_TIMEOUT,
+                 on_item=None) -> tuple:
+    """Stream a response and parse it incrementally.
+
+    `on_item(key, value)` is called for every top-level item (each NPC,
+    session, writing, the character object) as soon as it closes.
+    BackendErrors propagate so call_with_retries can retry the stream.
+    Returns (parsed, complete).
+    """
+    parser = IncrementalJSONParser(on_item)
+    for piece in backend.stream(prompt, timeout=timeout):
+        parser.feed(piece)
+
+    parsed = parser.finish()
+    if not parsed:
+        return {"error": "No JSON found in stream"}, False
+    if parser.repairs:
+        parsed["json_repairs"] = list(parser.repairs)
+    return parsed, parser.complete
+
+
+def request_parse(document_text: str, character_name: str, backend: LLMBackend,
+                  timeout: float = DEFAULT_TIMEOUT, cache: ResponseCache = None,
+                  part: tuple = None, stream: bool = False, on_item=None,
+                  metrics: RunMetrics = None, retries: int = DEFAULT_RETRIES) -> dict:
+    """Parse one prompt's worth of text, answering from the cache when possible.
+
+    Failed requests are retried `retries` times; every call (or cache hit) is
+    recorded in `metrics`.
+    """
+    label = f"{character_name} [{part[0]}/{part[1]}]" if part else character_name
+    part_label = f"{part[0]}/{part[1]}" if part else None
+
+    if cache:
+        cached = cache.get(VAULT_CHARACTER_PARSE_PROMPT, document_text, backend.model_name)
+        if cached is not None:
+            print(f"  Parsing {label}... (cached)")
+            if metrics:
+                metrics.record_call(character_name, backend.model_name, cache_hit=True, part=part_label)
+            parsed = extract_json(cached)
+            if on_item:
+                for key, value in parsed.items():
+                    for item in (value if isinstance(value, list) else [value]):
+                        on_item(key, item)
+            return parsed
+
+    print(f"  Parsing {label}...")
+    prompt = build_prompt(document_text, character_name, part)
+    started = time.monotonic()
+
     try:
-        import re
-        json_match = re.search(r'\{[\s\S]*\}', text)
-        if json_match:
-            return json.loads(json_match.group())
+        if stream:
+            (parsed, complete), retries_used = call_with_retries(
+                lambda: stream_parse(prompt, backend, timeout, on_item), retries)
+            text = json.dumps(parsed, ensure_ascii=False)
         else:
-            return {"error": "No JSON found", "raw_response": text[:500]}
-    except json.JSONDecodeError as e:
-        return {"error": str(e), "raw_response": text[:500]}
-
+            text, retries_used = call_with_retries(lambda: backend.generate(prompt, timeout=timeout), retries)
+            parsed = extract_json(text)
+            complete = "error" not in parsed
+    except BackendError as e:
+        if metrics:
+            metrics.record_call(character_name, backend.model_name, estimate_tokens(prompt), 0,
+                                time.monotonic() - started, getattr(e, 'retries', 0),
+                                error=str(e), part=part_label)
+        raise
+
+    if metrics:
+        metrics.record_call(character_name, backend.model_name, estimate_tokens(prompt),
+                            estimate_tokens(text), time.monotonic() - started, retries_used,
+                            error=parsed.get("error"), part=part_label)
+
+    if cache and complete:
+        cache.put(VAULT_CHARACTER_PARSE_PROMPT, document_text, backend.model_name, text)
+    return parsed
+
+
+def parse_document(document_text: str, character_name: str, backend: LLMBackend = None,
+                   timeout: float = DEFAULT_TIMEOUT, cache: ResponseCache = None,
+                   max_chunk_tokens: int = DEFAULT_MAX_CHUNK_TOKENS,
+                   limiter: TokenBucket = None, compact: bool = False,
+                   stream: bool = False, on_item=None, metrics: RunMetrics = None,
+                   retries: int = DEFAULT_RETRIES) -> dict:
+    """Send document to the model backend (Gemini by default) for parsing.
+
+    With a cache, a document already parsed with the same prompt template and
+    model is answered from disk without calling the model. Documents longer
+    than `max_chunk_tokens` are split at section headers, the chunks parsed in
+    parallel and the partial results merged (0 disables chunking). With
+    `compact`, the document is compacted first (see llm_compact) and URL
+    placeholders are restored in the result. With `stream`, responses are
+    parsed while they arrive and `on_item(key, value)` sees each completed item.
+    """
+    backend = backend or get_default_backend()
+
+    if compact:
+        compacted, url_map, report = compact_document(document_text)
+        print(f"  Compacted {character_name}: {report['tokens_saved']} tokens saved "
+              f"({report['duplicate_paragraphs']} duplicate paragraphs, {report['urls_replaced']} URLs)")
+        parsed = parse_document(compacted, character_name, backend=backend, timeout=timeout, cache=cache,
+                                max_chunk_tokens=max_chunk_tokens, limiter=limiter,
+                                stream=stream, on_item=on_item, metrics=metrics, retries=retries)
+        parsed = restore_placeholders(parsed, url_map)
+        parsed["compaction"] = report
+        return parsed
+
+    chunks = chunk_document(document_text, max_chunk_tokens) if max_chunk_tokens else [document_text]
+    if len(chunks) == 1:
+        return request_parse(document_text, character_name, backend, timeout, cache,
+                             stream=stream, on_item=on_item, metrics=metrics, retries=retries)
+
+    print(f"  Splitting {character_name} into {len(chunks)} chunks")
+
+    def worker(indexed_chunk):
+        index, chunk = indexed_chunk
+        return request_parse(chunk, character_name, backend, timeout, cache,
+                             part=(index + 1, len(chunks)), stream=stream, on_item=on_item,
+                             metrics=metrics, retries=retries)
+
+    partials = run_concurrent(list(enumerate(chunks)), worker, concurrency=len(chunks), limiter=limiter)
+
+    chunk_errors = []
+    parsed_chunks = []
+    for index, partial in enumerate(partials, 1):
+        if isinstance(partial, Exception):
+            chunk_errors.append({"chunk": index, "error": str(partial)})
+        elif "error" in partial:
+            chunk_errors.append({"chunk": index, "error": partial["error"]})
+        else:
+            parsed_chunks.append(partial)
+
+    if not parsed_chunks:
+        return {"error": "All chunks failed", "chunk_errors": chunk_errors}
+
+    merged = merge_parse_results(parsed_chunks)
+    repairs = sorted({r for p in parsed_chunks for r in p.get("json_repairs", [])})
+    if repairs:
+        merged["json_repairs"] = repairs
+    if chunk_errors:
+        merged["chunk_errors"] = chunk_errors
+    return merged
+
+
+def parse_document_hybrid(document_text: str, character_name: str, backend: LLMBackend = None,
+                          timeout: float = DEFAULT_TIMEOUT, cache: ResponseCache = None,
+                          max_chunk_tokens: int = DEFAULT_MAX_CHUNK_TOKENS,
+                          limiter: TokenBucket = None, compact: bool = False,
+                          stream: bool = False, on_item=None, metrics: RunMetrics = None,
+                          retries: int = DEFAULT_RETRIES) -> dict:
+    """Parse with the importer's local extractors first, the model only for the rest.
+
+    Sections the local extractors resolved (sessions, letters, rumors, ...) are
+    left out of the prompt; the model's answer for the remaining sections is
+    merged with the local results into the same output schema. The model's
+    answer is validated before the merge (which always yields a character
+    object) and its problems are kept under "hybrid" -> "model_problems".
+    """
+    local, unresolved_text, report = split_for_hybrid(document_text)
+    print(f"  Hybrid {character_name}: {report['local_sections']} sections local, "
+          f"{report['llm_tokens']}/{report['document_tokens']} tokens to the model")
+
+    partials = []
+    if unresolved_text.strip():
+        parsed = parse_document(unresolved_text, character_name, backend=backend, timeout=timeout,
+                                cache=cache, max_chunk_tokens=max_chunk_tokens, limiter=limiter,
+                                compact=compact, stream=stream, on_item=on_item,
+                                metrics=metrics, retries=retries)
+        if "error" in parsed:
+            return parsed
+        problems = validate_parse_result(parsed)
+        if problems:
+            print(f"  Model answer for {character_name} is unusable: {'; '.join(problems)}")
+            report["model_problems"] = problems
+        partials.append(parsed)
+    partials.append(local)
+
+    merged = merge_parse_results(partials)
+    merged["character"].setdefault("name", character_name)
+    for field in ("rumors", "dm_qa", "possessions"):
+        merged[field] = local[field]
+    for field in ("json_repairs", "chunk_errors", "compaction"):
+        if partials[0].get(field):
+            merged[field] = partials[0][field]
+    merged["hybrid"] = report
+    return merged
+
+
+def parse_document_routed(document_text: str, character_name: str, router: ModelRouter,
+                          parse=parse_document, **kwargs) -> dict:
+    """Parse with the model tier the router picks, escalating failed fast results.
+
+    `parse` is parse_document or parse_document_hybrid; `kwargs` are passed
+    through to it. A hybrid result is judged by the model's part alone, since
+    the local results fill in a usable-looking object either way. The routing
+    decision is recorded under "routing".
+    """
+    tier, reason, features = router.route(document_text)
+    print(f"  Routing {character_name} to {router.backend(tier).model_name} ({reason})")
+    parsed = parse(document_text, character_name, backend=router.backend(tier), **kwargs)
+    routing = {"tier": tier, "model": router.backend(tier).model_name, "reason": reason, **features}
+
+    problems = []
+    if tier == FAST:
+        problems = validate_parse_result(parsed) or parsed.get("hybrid", {}).get("model_problems", [])
+    if problems:
+        print(f"  Escalating {character_name} to {router.backend(STRONG).model_name}: {'; '.join(problems)}")
+        parsed = parse(document_text, character_name, backend=router.backend(STRONG), **kwargs)
+        routing.update({"tier": STRONG, "model": router.backend(STRONG).model_name,
+                        "escalated_from": router.backend(FAST).model_name, "escalation_problems": problems})
+    parsed["routing"] = routing
+    return parsed
+
+
+def parse_batch(batch: list, backend: LLMBackend = None, timeout: float = DEFAULT_TIMEOUT,
+                cache: ResponseCache = None, max_chunk_tokens: int = DEFAULT_MAX_CHUNK_TOKENS,
+                limiter: TokenBucket = None, compact: bool = False,
+                metrics: RunMetrics = None, retries: int = DEFAULT_RETRIES) -> dict:
+    """Parse several short (name, text) documents with a single request.
+
+    Cached documents are answered from disk and left out of the request. If the
+    batch response fails validation every document falls back to its own
+    parse_document() call. Returns {name: parsed}.
+    """
+    backend = backend or get_default_backend()
+    results = {}
+
+    pending = []
+    url_maps = {}
+    for name, text in batch:
+        if compact:
+            text, url_maps[name], _ = compact_document(text)
+        cached = cache.get(VAULT_CHARACTER_PARSE_PROMPT, text, backend.model_name) if cache else None
+        if cached is not None:
+            print(f"  Parsing {name}... (cached)")
+            if metrics:
+                metrics.record_call(name, backend.model_name, cache_hit=True)
+            results[name] = extract_json(cached)
+        else:
+            pending.append((name, text))
+
+    if len(pending) == 1:
+        name, text = pending[0]
+        results[name] = parse_document(text, name, backend=backend, timeout=timeout, cache=cache,
+                                       max_chunk_tokens=max_chunk_tokens, limiter=limiter,
+                                       metrics=metrics, retries=retries)
+    elif pending:
+        names = ', '.join(name for name, _ in pending)
+        print(f"  Parsing batch of {len(pending)}: {names}...")
+        split = None
+        prompt = build_batch_prompt(VAULT_CHARACTER_PARSE_PROMPT, pending)
+        started = time.monotonic()
+        retries_used = 0
+        try:
+            text, retries_used = call_with_retries(lambda: backend.generate(prompt, timeout=timeout), retries)
+            split = split_batch_result(extract_json(text), pending)
+        except BackendError as e:
+            print(f"  Batch failed ({e})")
+            retries_used = getattr(e, 'retries', 0)
+        latency = time.monotonic() - started
+
+        if metrics:
+            # Attribute the shared request to its documents by their share of the prompt
+            preamble = estimate_tokens(prompt) - sum(estimate_tokens(t) for _, t in pending)
+            for name, text in pending:
+                output = json.dumps(split[name], ensure_ascii=False) if split else ""
+                metrics.record_call(name, backend.model_name,
+                                    estimate_tokens(text) + preamble // len(pending),
+                                    estimate_tokens(output), latency, retries_used,
+                                    error=None if split else "invalid batch response",
+                                    part="batch")
+
+        if split is None:
+            print(f"  Batch response invalid, parsing {len(pending)} documents individually")
+            for name, text in pending:
+                if limiter:
+                    limiter.acquire()
+                results[name] = parse_document(text, name, backend=backend, timeout=timeout, cache=cache,
+                                               max_chunk_tokens=max_chunk_tokens, limiter=limiter,
+                                               metrics=metrics, retries=retries)
+        else:
+            for name, text in pending:
+                results[name] = split[name]
+                if cache:
+                    cache.put(VAULT_CHARACTER_PARSE_PROMPT, text, backend.model_name,
+                              json.dumps(split[name], ensure_ascii=False))
+
+    for name, url_map in url_maps.items():
+        results[name] = restore_placeholders(results[name], url_map)
+    return results
+
+
+def document_stats(character_name: str, document_text: str, parsed: dict) -> dict:
+    """Entity counts for one parsed document."""
+    return {
+        "character_name": character_name,
+        "input_length": len(document_text),
+        "npc_count": len(parsed.get("npcs", [])),
+        "companion_count": len(parsed.get("companions", [])),
+        "session_count": len(parsed.get("session_notes", [])),
+        "writing_count": len(parsed.get("writings", [])),
+        "quote_count": len(parsed.get("character", {}).get("quotes", [])),
+        "plot_hook_count": len(parsed.get("character", {}).get("plot_hooks", [])),
+        "has_backstory": bool(parsed.get("character", {}).get("backstory")),
+        "json_repairs": parsed.get("json_repairs", []),
+        "tokens_saved": parsed.get("compaction", {}).get("tokens_saved", 0),
+    }
 
-def main():
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    # Get list of text files
-    txt_files = sorted(EXTRACTED_DIR.glob("*.txt"))
+def select_documents(all_documents: bool) -> list[Path]:
+    """Pick the documents to parse: the key test files, or the whole corpus."""
+    txt_files = sorted(p for p in EXTRACTED_DIR.glob("*.txt") if not p.name.startswith('_'))
     print(f"Found {len(txt_files)} documents to parse\n")
 
+    if all_documents:
+        return txt_files
+
     # Filter to key test files first
     test_files = [f for f in txt_files if f.stem in [
         "Anastasia Callahan",  # Has rich NPC data
@@ -157,64 +497,266 @@ def main():
         print("No test files found, using first 3 files")
         test_files = txt_files[:3]
 
-    results = []
-
-    for txt_file in test_files:
+    return test_files
+
+
+def parse_arguments(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Parse extracted character documents with an LLM.")
+    parser.add_argument('--all', action='store_true', help="parse every document in extracted_documents")
+    parser.add_argument('--backend', choices=['gemini', 'fake'], default='gemini')
+    parser.add_argument('--dry-run', action='store_true',
+                        help="estimate tokens and cost for the run without calling the model")
+    parser.add_argument('--model', default=None, help=f"model name (default: {DEFAULT_MODEL})")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="documents parsed in parallel")
+    parser.add_argument('--route', action='store_true',
+                        help="send short/simple documents to a fast model, escalating invalid results")
+    parser.add_argument('--fast-model', default=None,
+                        help=f"fast tier model for --route (default: {DEFAULT_FAST_MODEL})")
+    parser.add_argument('--routing-rules', type=Path, default=None,
+                        help="JSON file with routing rules (default: built-in rules)")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="adjust requests in flight with AIMD, starting at --concurrency")
+    parser.add_argument('--max-concurrency', type=int, default=16,
+                        help="upper bound for --adaptive")
+    parser.add_argument('--rpm', type=float, default=None,
+                        help="request rate limit (requests per minute; default: "
+                             f"{DEFAULT_REQUESTS_PER_MINUTE:g} for gemini, none for the fake backend)")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help="per-request timeout in seconds")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help="retries per failed request")
+    parser.add_argument('--input-price', type=float, default=None,
+                        help="USD per 1M input tokens (default: built-in price for the model)")
+    parser.add_argument('--output-price', type=float, default=None,
+                        help="USD per 1M output tokens (default: built-in price for the model)")
+    parser.add_argument('--fake-latency', type=float, default=0.05,
+                        help="seconds per request for the fake backend")
+    parser.add_argument('--fake-quota', type=int, default=None,
+                        help="fake backend rejects requests beyond this many in flight (HTTP 429)")
+    parser.add_argument('--fake-fast-reliable-tokens', type=int, default=None,
+                        help="fake fast tier returns invalid results for prompts longer than this")
+    parser.add_argument('--max-chunk-tokens', type=int, default=DEFAULT_MAX_CHUNK_TOKENS,
+                        help="split longer documents at section headers (0 disables)")
+    parser.add_argument('--hybrid', action='store_true',
+                        help="run the local extractors first and send only unresolved sections")
+    parser.add_argument('--compact', action='store_true',
+                        help="dedupe paragraphs, collapse whitespace and shorten URLs before prompting")
+    parser.add_argument('--stream', action='store_true',
+                        help="stream responses and parse them incrementally")
+    parser.add_argument('--batch-tokens', type=int, default=0,
+                        help="pack short documents into shared requests up to this many tokens (0 disables)")
+    parser.add_argument('--near-duplicates', choices=['report', 'skip', 'merge'], default=None,
+                        help="check for copied/forked documents first; skip copies or merge them "
+                             "into the longest copy (forks are only reported for review)")
+    parser.add_argument('--output-dir', type=Path, default=OUTPUT_DIR)
+    parser.add_argument('--cache-dir', type=Path, default=DEFAULT_CACHE_DIR,
+                        help="on-disk response cache location")
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="evict least recently used responses beyond this size")
+    parser.add_argument('--no-cache', action='store_true', help="always call the model")
+    parser.add_argument('--prune-cache', action='store_true',
+                        help="drop cached responses from older prompt templates")
+    args = parser.parse_args(argv)
+    if args.batch_tokens and (args.hybrid or args.stream):
+        parser.error("--batch-tokens cannot be combined with --hybrid or --stream")
+    if args.batch_tokens and args.route:
+        parser.error("--batch-tokens cannot be combined with --route")
+    return args
+
+
+def main(argv: list[str] = None):
+    args = parse_arguments(argv)
+    output_dir = args.output_dir
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    backend_name = 'dry-run' if args.dry_run else args.backend
+    # The API quota only applies to Gemini; the offline backend runs unthrottled
+    # unless --rpm is given
+    rpm = args.rpm if args.rpm is not None else (DEFAULT_REQUESTS_PER_MINUTE if backend_name == 'gemini' else None)
+    limiter = TokenBucket.per_minute(rpm, burst=max(args.concurrency, 1)) if rpm else None
+    if args.route:
+        tiers = make_tier_backends(backend_name, args.model, args.fast_model,
+                                   fake_latency=args.fake_latency, fake_quota=args.fake_quota,
+                                   fake_fast_reliable_tokens=args.fake_fast_reliable_tokens)
+    else:
+        tiers = {STRONG: make_backend(backend_name, args.model, fake_latency=args.fake_latency,
+                                      fake_quota=args.fake_quota)}
+
+    controller = None
+    workers = args.concurrency
+    if args.adaptive and not args.dry_run:
+        controller = AdaptiveConcurrency(initial=args.concurrency,
+                                         max_limit=max(args.max_concurrency, args.concurrency))
+        tiers = {tier: AdaptiveBackend(b, controller) for tier, b in tiers.items()}
+        workers = controller.max_limit
+
+    backend = tiers[STRONG]
+    router = None
+    if args.route:
+        rules = load_routing_rules(args.routing_rules) if args.routing_rules else None
+        router = ModelRouter(tiers, rules)
+
+    pricing = model_pricing(backend.model_name)
+    pricing = (args.input_price if args.input_price is not None else pricing[0],
+               args.output_price if args.output_price is not None else pricing[1])
+    metrics = RunMetrics({backend.model_name: pricing})
+
+    cache = None
+    if not args.no_cache and not args.dry_run:
+        cache = ResponseCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 * 1024))
+        if args.prune_cache:
+            removed = cache.prune_template(VAULT_CHARACTER_PARSE_PROMPT)
+            print(f"Pruned {removed} cached responses from older prompt templates")
+
+    documents = []
+    for txt_file in select_documents(args.all):
         character_name = txt_file.stem
-        print(f"Processing: {character_name}")
-
         with open(txt_file, "r", encoding="utf-8") as f:
             document_text = f.read()
 
         if len(document_text) < 50:
-            print(f"  Skipping - too short ({len(document_text)} chars)")
+            print(f"Skipping {character_name} - too short ({len(document_text)} chars)")
             continue
+        documents.append((character_name, document_text))
+
+    if args.near_duplicates:
+        on_disk = {p.stem for p in EXTRACTED_DIR.glob("*.txt")}
+        report = check_documents(documents, on_disk=on_disk)
+        print_report(report)
+        if args.near_duplicates != 'report':
+            documents, replaced = resolve_duplicates(documents, report, args.near_duplicates)
+            for name, kept in replaced.items():
+                if args.near_duplicates == 'merge':
+                    print(f"  Merged {name} into {kept}")
+                else:
+                    print(f"  Skipping {name} (near-duplicate of {kept})")
+
+    mode = "Estimating" if args.dry_run else "Parsing"
+    concurrency = f"adaptive {args.concurrency}-{workers}" if controller else args.concurrency
+    models = f"{tiers[FAST].model_name}/{backend.model_name}" if router else backend.model_name
+    print(f"{mode} {len(documents)} documents with {models} "
+          f"(concurrency {concurrency}, {f'{rpm:g} rpm' if rpm else 'no rate limit'})")
+    started = time.monotonic()
+
+    first_item_seconds = {}
+
+    def worker(document):
+        character_name, document_text = document
+        parse = parse_document_hybrid if args.hybrid else parse_document
+        request_started = time.monotonic()
+        metrics.record_queue(character_name, request_started - started)
+
+        def on_item(key, value):
+            if character_name not in first_item_seconds:
+                first_item_seconds[character_name] = round(time.monotonic() - request_started, 3)
+                print(f"  First result for {character_name} ({key}) after "
+                      f"{first_item_seconds[character_name]:.2f}s")
+
+        options = dict(timeout=args.timeout, cache=cache, max_chunk_tokens=args.max_chunk_tokens,
+                       limiter=limiter, compact=args.compact,
+                       stream=args.stream, on_item=on_item if args.stream else None,
+                       metrics=metrics, retries=args.retries)
+        if router:
+            return parse_document_routed(document_text, character_name, router, parse=parse, **options)
+        return parse(document_text, character_name, backend=backend, **options)
+
+    if args.batch_tokens:
+        batches = pack_batches(documents, args.batch_tokens)
+        print(f"Packed {len(documents)} documents into {len(batches)} requests")
+
+        def batch_worker(batch):
+            for name, _ in batch:
+                metrics.record_queue(name, time.monotonic() - started)
+            return parse_batch(batch, backend=backend, timeout=args.timeout, cache=cache,
+                               max_chunk_tokens=args.max_chunk_tokens, limiter=limiter,
+                               compact=args.compact, metrics=metrics, retries=args.retries)
+
+        batch_outcomes = run_concurrent(batches, batch_worker, concurrency=workers, limiter=limiter)
+        parsed_by_name = {}
+        for batch, outcome in zip(batches, batch_outcomes):
+            for name, _ in batch:
+                parsed_by_name[name] = outcome if isinstance(outcome, Exception) else outcome[name]
+        outcomes = [parsed_by_name[name] for name, _ in documents]
+    else:
+        outcomes = run_concurrent(documents, worker, concurrency=workers, limiter=limiter)
 
-        try:
-            parsed = parse_document(document_text, character_name)
+    results = []
 
-            # Save parsed output
-            output_file = OUTPUT_DIR / f"{character_name}_parsed.json"
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(parsed, f, indent=2, ensure_ascii=False)
+    for (character_name, document_text), parsed in zip(documents, outcomes):
+        print(f"Processing: {character_name}")
 
-            # Calculate stats
-            stats = {
-                "character_name": character_name,
-                "input_length": len(document_text),
-                "npc_count": len(parsed.get("npcs", [])),
-                "companion_count": len(parsed.get("companions", [])),
-                "session_count": len(parsed.get("session_notes", [])),
-                "writing_count": len(parsed.get("writings", [])),
-                "quote_count": len(parsed.get("character", {}).get("quotes", [])),
-                "plot_hook_count": len(parsed.get("character", {}).get("plot_hooks", [])),
-                "has_backstory": bool(parsed.get("character", {}).get("backstory")),
-            }
-
-            results.append(stats)
-
-            # Show NPC names found
-            npc_names = [npc.get("name", "?") for npc in parsed.get("npcs", [])]
-            print(f"  NPCs found: {npc_names}")
-            print(f"  Sessions: {stats['session_count']}, Writings: {stats['writing_count']}")
-
-        except Exception as e:
-            print(f"  ERROR: {e}")
-            import traceback
-            traceback.print_exc()
+        if isinstance(parsed, Exception):
+            print(f"  ERROR: {parsed}")
             results.append({
                 "character_name": character_name,
-                "error": str(e)
+                "error": str(parsed)
             })
+            continue
+
+        # Save parsed output
+        if not args.dry_run:
+            output_file = output_dir / f"{character_name}_parsed.json"
+            with open(output_file, "w", encoding="utf-8") as f:
+                json.dump(parsed, f, indent=2, ensure_ascii=False)
+
+        stats = document_stats(character_name, document_text, parsed)
+        stats["metrics"] = metrics.document_breakdown(character_name)
+        if character_name in first_item_seconds:
+            stats["first_item_seconds"] = first_item_seconds[character_name]
+        if "routing" in parsed:
+            stats["routing"] = parsed["routing"]
+        results.append(stats)
+
+        # Show NPC names found
+        npc_names = [npc.get("name", "?") for npc in parsed.get("npcs", [])]
+        print(f"  NPCs found: {npc_names}")
+        print(f"  Sessions: {stats['session_count']}, Writings: {stats['writing_count']}")
+        if parsed.get("json_repairs"):
+            print(f"  JSON repaired: {', '.join(parsed['json_repairs'])}")
+
+    elapsed = time.monotonic() - started
+    run_metrics = metrics.summary()
 
     # Save summary
-    summary_file = OUTPUT_DIR / "_test_summary.json"
+    summary_name = "_dry_run_summary.json" if args.dry_run else "_test_summary.json"
+    summary_file = output_dir / summary_name
     with open(summary_file, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2)
+        json.dump({
+            "wall_seconds": round(elapsed, 3),
+            "model": backend.model_name,
+            "dry_run": args.dry_run,
+            "metrics": {k: v for k, v in run_metrics.items() if k != "documents"},
+            "adaptive_concurrency": {
+                "final_limit": controller.limit,
+                "decisions": controller.decisions,
+            } if controller else None,
+            "documents": results,
+        }, f, indent=2, ensure_ascii=False)
 
     print(f"\n{'='*60}")
-    print("Test complete!")
-    print(f"Output directory: {OUTPUT_DIR}")
+    print("Dry run complete (no model calls made)" if args.dry_run else "Test complete!")
+    print(f"Output directory: {output_dir}")
+    print(f"Wall time: {elapsed:.1f}s")
+    print(f"Model calls: {run_metrics['model_calls']}, cache hits: {run_metrics['cache_hits']}, "
+          f"retries: {run_metrics['retries']}")
+    print(f"Tokens: ~{run_metrics['input_tokens']} in, ~{run_metrics['output_tokens']} out, "
+          f"estimated cost ${run_metrics['estimated_cost_usd']:.4f}")
+    if run_metrics['latency_seconds'] and not args.dry_run:
+        latency = run_metrics['latency_seconds']
+        print(f"Latency: p50 {latency['p50']}s, p90 {latency['p90']}s, max {latency['max']}s")
+    if router:
+        routed = [r["routing"] for r in results if "routing" in r]
+        print(f"Routing: {sum(1 for r in routed if r['tier'] == FAST)} fast, "
+              f"{sum(1 for r in routed if r['tier'] == STRONG)} strong, "
+              f"{sum(1 for r in routed if 'escalated_from' in r)} escalated")
+    if controller:
+        throttles = sum(1 for d in controller.decisions if d['reason'] != 'healthy')
+        print(f"Concurrency: final limit {controller.limit}, {len(controller.decisions)} changes "
+              f"({throttles} cut backs)")
+    if cache:
+        stats = cache.stats()
+        print(f"Cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions")
 
     # Print summary
     if results:
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+One command line for the vault scripts.
+
+    python vault.py extract        export each document's text for review
+    python vault.py images         export text and embedded images
+    python vault.py import         extract characters into the import JSON
+    python vault.py parse          parse extracted documents with the LLM parser
+    python vault.py edit           apply character patches
+    python vault.py upload         send an import file to the web app
+    python vault.py serve          run the local extraction service
+    python vault.py watch          re-extract documents as they change
+    python vault.py startup        measure startup time against the budget
+
+Options after the command go to that command (`vault import --help`).
+
+Only the module a command needs is imported, and none of them install
+packages, read credentials or touch the network when imported, so `--help`
+costs little more than starting Python. `vault startup` checks this against
+STARTUP_BUDGET.
+"""
+
+import argparse
+import importlib
+import sys
+
+
+# Command -> (module or hyphen-named script, summary)
+COMMANDS = {
+    'extract': ('extract_characters', "export each document's text for review"),
+    'images': ('extract_all_documents', "export text and embedded images"),
+    'import': ('import-vault-characters.py', "extract characters into the import JSON"),
+    'parse': ('test_parser', "parse extracted documents with the LLM parser"),
+    'edit': ('edit-vault-characters.py', "apply character patches"),
+    'upload': (None, "send an import file to the web app"),
+    'serve': ('vault_service', "run the local extraction service"),
+    'watch': ('vault_watch', "re-extract documents as they change"),
+    'startup': (None, "measure startup time against the budget"),
+}
+
+# Seconds a fresh process may spend above bare interpreter startup: for
+# `vault --help`, and for a command that only loads its module (`vault import
+# --help`, or an import where every document is a cache hit)
+STARTUP_BUDGET = {'help': 0.05, 'command': 0.25}
+UPLOAD_BATCH_SIZE = 50
+
+
+def load_command(name: str):
+    """The module implementing a command (imported on first use)."""
+    target = COMMANDS[name][0]
+    if target.endswith('.py'):
+        from vault_modules import load_script_module
+        return load_script_module(target, target[:-3].replace('-', '_'))
+    return importlib.import_module(target)
+
+
+def upload(argv: list[str] = None):
+    """Send an import file to the import API in batches."""
+    from character_stream import detect_format, iter_characters
+    from vault_modules import load_importer
+
+    importer = load_importer()
+    parser = argparse.ArgumentParser(description="Send an import file to the web app's import API.")
+    parser.add_argument('input', nargs='?', default=importer.OUTPUT_FILE, help="import JSON or NDJSON")
+    parser.add_argument('--url', default=importer.API_URL)
+    parser.add_argument('--batch-size', type=int, default=UPLOAD_BATCH_SIZE,
+                        help="characters per request")
+    args = parser.parse_args(argv)
+
+    totals = {'imported': 0, 'updated': 0, 'errors': []}
+
+    def send(batch):
+        result = importer.send_to_api(batch, args.url)
+        if 'error' in result:
+            totals['errors'].append(result['error'])
+            return
+        totals['imported'] += result.get('imported', 0)
+        totals['updated'] += result.get('updated', 0)
+        totals['errors'].extend(result.get('errors', []))
+
+    batch = []
+    with open(args.input, encoding='utf-8') as f:
+        for character in iter_characters(f, detect_format(args.input)):
+            batch.append(character)
+            if len(batch) >= args.batch_size:
+                send(batch)
+                batch = []
+    if batch:
+        send(batch)
+
+    print(f"Uploaded to {args.url}: {totals['imported']} imported, {totals['updated']} updated")
+    for error in totals['errors']:
+        print(f"  Error: {error}")
+    if totals['errors']:
+        sys.exit(1)
+
+
+def startup(argv: list[str] = None):
+    """Time fresh `vault` processes against STARTUP_BUDGET."""
+    import statistics
+    import subprocess
+    import time
+
+    parser = argparse.ArgumentParser(description="Measure vault startup time against the budget.")
+    parser.add_argument('--runs', type=int, default=5, help="runs per measurement (the median is used)")
+    parser.add_argument('--run', action='append', default=[], metavar='ARGS',
+                        help="also time `vault ARGS` (e.g. \"import --fields race\" on a warm cache) "
+                             "against the command budget")
+    args = parser.parse_args(argv)
+
+    def timed(command: list[str]) -> float:
+        times = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, *command], stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, check=False)
+            times.append(time.perf_counter() - started)
+        return statistics.median(times)
+
+    baseline = timed(['-c', 'pass'])
+    print(f"Python startup: {baseline * 1000:.0f} ms (not counted)\n")
+
+    checks = [('vault --help', [__file__, '--help'], 'help')]
+    checks += [(f"vault {name} --help", [__file__, name, '--help'], 'command')
+               for name in COMMANDS if name != 'startup']
+    checks += [(f"vault {run}", [__file__, *run.split()], 'command') for run in args.run]
+
+    over = 0
+    for label, command, budget in checks:
+        cost = timed(command) - baseline
+        ok = cost <= STARTUP_BUDGET[budget]
+        over += not ok
+        print(f"  {label:<28} {cost * 1000:6.0f} ms  (budget {STARTUP_BUDGET[budget] * 1000:.0f} ms)"
+              f"{'' if ok else '  OVER'}")
+    if over:
+        sys.exit(1)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    commands = '\n'.join(f"  {name:<10} {summary}" for name, (_, summary) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        prog='vault', formatter_class=argparse.RawDescriptionHelpFormatter,
+        description="Vault character tools.\n\ncommands:\n" + commands,
+        epilog="Run 'vault <command> --help' for a command's options.")
+    parser.add_argument('command', choices=COMMANDS, metavar='command', help="one of the commands above")
+    parser.add_argument('args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv: list[str] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    if not argv:
+        parser.error("give a command (see 'vault --help')")
+    args = parser.parse_args(argv)
+    if args.command == 'upload':
+        run = upload
+    elif args.command == 'startup':
+        run = startup
+    else:
+        run = load_command(args.command).main
+    # Usage lines read "vault <command>" rather than the script's file name
+    sys.argv[0] = f"vault {args.command}"
+    run(args.args)
+
+
+if __name__ == "__main__":
+    main()
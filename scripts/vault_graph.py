@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Relationship graph across the whole vault.
+
+Characters and NPCs are nodes; relationships from extract_relationships() and
+party relations from extract_party_relations() are typed edges. Adjacency is
+kept in CSR form (one offsets array plus flat target and edge type arrays), so
+a node's neighbours are a contiguous slice and the whole graph is a handful
+of arrays that save to a compact binary file.
+
+NPC nodes use the registry's IDs: the 'npc_id' the importer writes on each
+relationship, otherwise the saved registry (--registry), otherwise IDs
+assigned the same way by a fresh one. So "Captain Vex" and "Vex" are one
+node, each character's "Dad" stays separate, and exported target IDs match
+the registry's.
+
+Usage:
+    python vault_graph.py vault_characters_import.json neighbours "Baron Rainer Feuerbach" --hops 2
+    python vault_graph.py vault_characters_import.json shared
+    python vault_graph.py vault_characters_import.json path "Anastasia Callahan" "Egon"
+    python vault_graph.py vault_characters_import.json export --binary vault.vgraph --csv edges.csv
+    python vault_graph.py vault_characters_import.json --registry vault_npc_registry.json shared
+"""
+
+import argparse
+import csv
+import json
+import struct
+import sys
+from array import array
+from collections import deque
+from pathlib import Path
+
+from npc_registry import NPCRegistry, normalize_npc_name
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+GRAPH_MAGIC = b'VGRF'
+GRAPH_VERSION = 1
+# magic, version, nodes, adjacency entries, edge types, then byte lengths of
+# the node name, node key and edge type string tables
+HEADER = struct.Struct('<4sIIIIIII')
+
+CHARACTER = 0
+NPC = 1
+NODE_KINDS = ('character', 'npc')
+
+PARTY_EDGE = 'party'
+# Set on the second adjacency entry of every edge (target -> source)
+REVERSE = 0x80
+
+
+class RelationshipGraph:
+    """Undirected view of typed character -> NPC / character -> character edges.
+
+    Every edge is stored twice in the adjacency arrays, once per endpoint;
+    the copy at the target has the REVERSE bit set in its type byte.
+    """
+
+    def __init__(self, names: list[str], keys: list[str], kinds: array, edge_types: list[str],
+                 offsets: array, targets: array, types: array):
+        self.names = names
+        self.keys = keys
+        self.kinds = kinds
+        self.edge_types = edge_types
+        self.offsets = offsets
+        self.targets = targets
+        self.types = types
+        self._by_key = {key: i for i, key in enumerate(keys)}
+        self._by_name = {}
+        for i, name in enumerate(names):
+            self._by_name.setdefault(normalize_npc_name(name), []).append(i)
+
+    # ---------------------------------------------------------------- building
+
+    @classmethod
+    def from_characters(cls, characters: list[dict], registry: NPCRegistry = None) -> 'RelationshipGraph':
+        """Build the graph from importer output characters.
+
+        NPCs take the relationship's 'npc_id' when it has one, else their ID
+        in `registry` (the saved registry, or a fresh one when not given).
+        """
+        registry = registry if registry is not None else NPCRegistry()
+        names, keys, kinds = [], [], array('B')
+        node_ids = {}
+
+        def node(key: str, name: str, kind: int) -> int:
+            if key not in node_ids:
+                node_ids[key] = len(names)
+                names.append(name)
+                keys.append(key)
+                kinds.append(kind)
+            return node_ids[key]
+
+        character_keys = {}
+        for character in characters:
+            if character.get('name'):
+                character_keys[normalize_npc_name(character['name'])] = character['name']
+                node(f"character:{character['name']}", character['name'], CHARACTER)
+
+        def other(name: str, owner: str, relationship_type: str, npc: str = None) -> int:
+            # Another player character named in this one's relationships
+            character = character_keys.get(normalize_npc_name(name))
+            if character and character != owner:
+                return node_ids[f"character:{character}"]
+            if npc:
+                return node(npc, registry.npcs[npc]['name'] if npc in registry.npcs else name, NPC)
+            npc = registry.register(name, owner, relationship_type)
+            return node(npc, registry.npcs[npc]['name'], NPC)
+
+        edge_types = []
+        type_ids = {}
+        edges = {}
+        for character in characters:
+            owner = character.get('name')
+            if not owner:
+                continue
+            source = node_ids[f"character:{owner}"]
+            links = [(rel.get('related_name'), rel.get('relationship_type') or 'other', rel.get('npc_id'))
+                     for rel in character.get('relationships') or []]
+            links += [(rel.get('name'), PARTY_EDGE, None) for rel in character.get('party_relations') or []]
+            for name, edge_type, npc in links:
+                if not name:
+                    continue
+                target = other(name, owner, edge_type, npc)
+                if target == source:
+                    continue
+                if edge_type not in type_ids:
+                    type_ids[edge_type] = len(edge_types)
+                    edge_types.append(edge_type)
+                edges[(source, target, type_ids[edge_type])] = None
+
+        # Names may have been upgraded to fuller spellings while registering
+        for key, i in node_ids.items():
+            if key in registry.npcs:
+                names[i] = registry.npcs[key]['name']
+
+        adjacency = [[] for _ in names]
+        for source, target, edge_type in edges:
+            adjacency[source].append((target, edge_type))
+            adjacency[target].append((source, edge_type | REVERSE))
+        offsets, targets, types = array('I', [0]), array('I'), array('B')
+        for entries in adjacency:
+            for target, edge_type in entries:
+                targets.append(target)
+                types.append(edge_type)
+            offsets.append(len(targets))
+        return cls(names, keys, kinds, edge_types, offsets, targets, types)
+
+    # ---------------------------------------------------------------- persistence
+
+    def save(self, path: Path) -> None:
+        """Write the graph as a compact binary file."""
+        tables = [('\0'.join(values)).encode('utf-8') for values in (self.names, self.keys, self.edge_types)]
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(GRAPH_MAGIC, GRAPH_VERSION, len(self.names), len(self.targets),
+                                len(self.edge_types), *(len(t) for t in tables)))
+            for values in (self.kinds, self.offsets, self.targets, self.types):
+                if sys.byteorder == 'big':
+                    # The header declares little-endian arrays
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                values.tofile(f)
+            for table in tables:
+                f.write(table)
+
+    @classmethod
+    def load(cls, path: Path) -> 'RelationshipGraph':
+        with open(path, 'rb') as f:
+            magic, version, nodes, entries, type_count, *table_sizes = HEADER.unpack(f.read(HEADER.size))
+            if magic != GRAPH_MAGIC or version != GRAPH_VERSION:
+                raise ValueError(f"{path}: not a version {GRAPH_VERSION} vault graph")
+            arrays = []
+            for typecode, count in (('B', nodes), ('I', nodes + 1), ('I', entries), ('B', entries)):
+                values = array(typecode)
+                values.fromfile(f, count)
+                if sys.byteorder == 'big':
+                    values.byteswap()
+                arrays.append(values)
+            tables = [f.read(size).decode('utf-8').split('\0') if size else [] for size in table_sizes]
+        names, keys, edge_types = tables
+        kinds, offsets, targets, types = arrays
+        return cls(names, keys, kinds, edge_types[:type_count], offsets, targets, types)
+
+    def edges(self):
+        """Yield (source, target, edge type) once per edge, in source order."""
+        for source in range(len(self.names)):
+            for j in range(self.offsets[source], self.offsets[source + 1]):
+                if not self.types[j] & REVERSE:
+                    yield source, self.targets[j], self.edge_types[self.types[j]]
+
+    def to_csv(self, path: Path) -> None:
+        """Write an edge list the app can import."""
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['source', 'source_kind', 'target', 'target_kind', 'target_id', 'relationship_type'])
+            for source, target, edge_type in self.edges():
+                target_id = self.keys[target] if self.kinds[target] == NPC else ''
+                writer.writerow([self.names[source], NODE_KINDS[self.kinds[source]], self.names[target],
+                                 NODE_KINDS[self.kinds[target]], target_id, edge_type])
+
+    # ---------------------------------------------------------------- queries
+
+    def find(self, name: str) -> int:
+        """Node for a character or NPC name (or NPC ID). Raises KeyError."""
+        if name in self._by_key:
+            return self._by_key[name]
+        if f"character:{name}" in self._by_key:
+            return self._by_key[f"character:{name}"]
+        wanted = normalize_npc_name(name)
+        matches = self._by_name.get(wanted, [])
+        if not matches:
+            # Fall back to names containing every word ("Rainer" -> "Baron Rainer Feuerbach")
+            words = set(wanted.split())
+            matches = [i for key, nodes in self._by_name.items() if words <= set(key.split()) for i in nodes]
+        if not matches:
+            raise KeyError(f"No character or NPC named {name!r}")
+        # Prefer characters, then the best connected node
+        return min(matches, key=lambda i: (self.kinds[i], -self.degree(i)))
+
+    def degree(self, node: int) -> int:
+        return self.offsets[node + 1] - self.offsets[node]
+
+    def neighbours(self, node: int, edge_types: set = None):
+        """Yield (neighbour, edge type name, reverse) for a node."""
+        for j in range(self.offsets[node], self.offsets[node + 1]):
+            edge_type = self.edge_types[self.types[j] & ~REVERSE]
+            if edge_types is None or edge_type in edge_types:
+                yield self.targets[j], edge_type, bool(self.types[j] & REVERSE)
+
+    def neighbourhood(self, node: int, hops: int = 1, edge_types: set = None) -> dict:
+        """Nodes within `hops` edges of `node`, mapped to their distance."""
+        distances = {node: 0}
+        frontier = [node]
+        for distance in range(1, hops + 1):
+            next_frontier = []
+            for current in frontier:
+                for neighbour, _, _ in self.neighbours(current, edge_types):
+                    if neighbour not in distances:
+                        distances[neighbour] = distance
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        del distances[node]
+        return distances
+
+    def shared_npcs(self, min_characters: int = 2, character: int = None) -> list[tuple]:
+        """(NPC node, [character nodes]) for NPCs linked to several characters.
+
+        With `character`, only NPCs that character is linked to are listed.
+        """
+        candidates = range(len(self.names))
+        if character is not None:
+            candidates = [n for n, _, _ in self.neighbours(character)]
+        shared = []
+        for npc in candidates:
+            if self.kinds[npc] != NPC:
+                continue
+            characters = sorted({n for n, _, _ in self.neighbours(npc) if self.kinds[n] == CHARACTER})
+            if len(characters) >= min_characters:
+                shared.append((npc, characters))
+        return sorted(shared, key=lambda item: (-len(item[1]), self.names[item[0]]))
+
+    def path(self, start: int, goal: int, edge_types: set = None, max_hops: int = None) -> list:
+        """Shortest path as [(node, edge type used to reach it)], or None."""
+        if start == goal:
+            return [(start, None)]
+        parents = {start: None}
+        queue = deque([(start, 0)])
+        while queue:
+            current, depth = queue.popleft()
+            if max_hops is not None and depth >= max_hops:
+                continue
+            for neighbour, edge_type, _ in self.neighbours(current, edge_types):
+                if neighbour in parents:
+                    continue
+                parents[neighbour] = (current, edge_type)
+                if neighbour == goal:
+                    path = []
+                    node = goal
+                    while parents[node] is not None:
+                        previous, used = parents[node]
+                        path.append((node, used))
+                        node = previous
+                    path.append((start, None))
+                    return path[::-1]
+                queue.append((neighbour, depth + 1))
+        return None
+
+    def label(self, node: int) -> str:
+        return f"{self.names[node]} ({NODE_KINDS[self.kinds[node]]})"
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def load_graph(path: Path, registry_path: Path = None) -> RelationshipGraph:
+    """Load a saved binary graph, or build one from importer output JSON."""
+    if path.suffix != '.json':
+        return RelationshipGraph.load(path)
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    registry = NPCRegistry.load(registry_path) if registry_path else None
+    return RelationshipGraph.from_characters(data['characters'] if isinstance(data, dict) else data, registry)
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Query the vault relationship graph.")
+    parser.add_argument('input', type=Path, help="importer output JSON or a saved .vgraph file")
+    parser.add_argument('--registry', type=Path, default=None,
+                        help="saved NPC registry for NPCs without an npc_id")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    neighbours = commands.add_parser('neighbours', help="characters and NPCs near a node")
+    neighbours.add_argument('name')
+    neighbours.add_argument('--hops', type=int, default=1)
+    neighbours.add_argument('--type', action='append', dest='types', help="only follow these edge types")
+
+    shared = commands.add_parser('shared', help="NPCs linked to several characters")
+    shared.add_argument('--character', help="only NPCs of this character")
+    shared.add_argument('--min', type=int, default=2, help="minimum number of characters")
+
+    path = commands.add_parser('path', help="shortest path between two nodes")
+    path.add_argument('start')
+    path.add_argument('goal')
+    path.add_argument('--type', action='append', dest='types', help="only follow these edge types")
+
+    export = commands.add_parser('export', help="write the graph to disk")
+    export.add_argument('--binary', type=Path, help="compact binary graph file")
+    export.add_argument('--csv', type=Path, help="edge list CSV")
+
+    args = parser.parse_args(argv)
+    graph = load_graph(args.input, args.registry)
+    types = set(args.types) if getattr(args, 'types', None) else None
+
+    try:
+        if args.command == 'neighbours':
+            node = graph.find(args.name)
+            found = graph.neighbourhood(node, args.hops, types)
+            for other, distance in sorted(found.items(), key=lambda item: (item[1], graph.names[item[0]])):
+                print(f"  {distance}  {graph.label(other)}")
+            print(f"{len(found)} nodes within {args.hops} hops of {graph.label(node)}")
+
+        elif args.command == 'shared':
+            character = graph.find(args.character) if args.character else None
+            results = graph.shared_npcs(args.min, character)
+            for npc, characters in results:
+                print(f"  {graph.names[npc]}: {', '.join(graph.names[c] for c in characters)}")
+            print(f"{len(results)} shared NPCs")
+
+        elif args.command == 'path':
+            found = graph.path(graph.find(args.start), graph.find(args.goal), types)
+            if found is None:
+                print("No path")
+            else:
+                print(' -> '.join(graph.label(node) + (f" [{edge_type}]" if edge_type else '')
+                                  for node, edge_type in found))
+
+        elif args.command == 'export':
+            if args.binary:
+                graph.save(args.binary)
+                print(f"Saved {len(graph.names)} nodes, {len(graph.targets) // 2} edges to {args.binary}")
+            if args.csv:
+                graph.to_csv(args.csv)
+                print(f"Saved edge list to {args.csv}")
+    except KeyError as e:
+        sys.exit(str(e.args[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Load the hyphen-named vault scripts (import-vault-characters.py, ...) as modules.
+
+Their file names are not valid Python identifiers, so they cannot be imported
+with a plain `import`. Modules are loaded once and shared.
+"""
+
+import importlib.util
+import sys
+import threading
+from pathlib import Path
+
+
+SCRIPTS_DIR = Path(__file__).parent
+
+_lock = threading.Lock()
+
+
+def load_script_module(filename: str, module_name: str):
+    """Import scripts/<filename> under `module_name` (cached in sys.modules)."""
+    with _lock:
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        spec = importlib.util.spec_from_file_location(module_name, SCRIPTS_DIR / filename)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+        return module
+
+
+def load_importer():
+    """The import-vault-characters.py module (extractors, section detection)."""
+    return load_script_module('import-vault-characters.py', 'import_vault_characters')
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Full-text search over the extracted vault.
+
+Builds a BM25-ranked inverted index from the importer's output (characters,
+backstory phases, session journal entries, writings and NPC notes). Each
+character is tracked by its source document (two players may give their
+characters the same name) and its content is hashed, so re-imports only
+re-tokenize characters that changed. The index is stored as a binary file that is memory-mapped for
+queries: looking up a term is a binary search over the on-disk term table,
+so nothing has to be loaded up front.
+
+Usage:
+    python vault_search.py build vault_characters_import.json
+    python vault_search.py query "silver dragon" --kind session -k 5
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_INDEX_DIR = Path(__file__).parent / ".vault_index"
+INDEX_FILE = "index.bin"
+DOCS_FILE = "docs.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+INDEX_MAGIC = b'VSIX'
+INDEX_VERSION = 2
+# magic, version, term count, document count, average document length, then
+# byte offsets of the term table, term text, postings, lengths, doc offsets
+HEADER = struct.Struct('<4sIIId5Q')
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'from', 'had', 'has', 'have',
+    'he', 'her', 'him', 'his', 'i', 'in', 'is', 'it', 'its', 'me', 'my', 'of', 'on', 'or', 's',
+    'she', 'so', 'that', 'the', 'their', 'them', 'they', 'this', 'to', 'was', 'were', 'with', 'you',
+}
+
+DOCUMENT_KINDS = ('character', 'backstory_phase', 'session', 'writing', 'npc')
+
+CHARACTER_TEXT_FIELDS = ('name', 'race', 'class', 'subclass', 'summary', 'tldr', 'personality',
+                         'goals', 'secrets', 'notes', 'quotes', 'plot_hooks', 'character_tags')
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase, accent-free word tokens without stopwords."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return [t for t in re.findall(r'\w+', text) if t not in STOPWORDS and len(t) > 1]
+
+
+def _join(value) -> str:
+    if not value:
+        return ''
+    if isinstance(value, list):
+        return '\n'.join(_join(v) for v in value)
+    if isinstance(value, dict):
+        return '\n'.join(_join(v) for v in value.values())
+    return str(value)
+
+
+def character_documents(character: dict) -> list[dict]:
+    """Split one importer character into the units that are indexed and ranked."""
+    name = character.get('name') or '?'
+    documents = [{
+        'kind': 'character',
+        'title': name,
+        'text': '\n'.join(_join(character.get(f)) for f in CHARACTER_TEXT_FIELDS),
+    }]
+    for phase in character.get('backstory_phases') or []:
+        documents.append({'kind': 'backstory_phase', 'title': phase.get('title') or '',
+                          'text': phase.get('content') or ''})
+    for session in character.get('session_journal') or []:
+        title = session.get('title') or f"Session {session.get('session_number', '?')}"
+        documents.append({'kind': 'session', 'title': title,
+                          'text': f"{title}\n{session.get('date') or ''}\n{session.get('summary') or ''}"})
+    for writing in character.get('character_writings') or []:
+        documents.append({'kind': 'writing', 'title': writing.get('title') or '',
+                          'text': f"{writing.get('title') or ''}\n{writing.get('content') or ''}"})
+    for rel in character.get('relationships') or []:
+        documents.append({'kind': 'npc', 'title': rel.get('related_name') or '',
+                          'text': '\n'.join(_join(rel.get(f)) for f in
+                                            ('related_name', 'relationship_label', 'description'))})
+    for document in documents:
+        document['character'] = name
+    return documents
+
+
+def character_key(character: dict):
+    """The document a character was extracted from (its name for older imports)."""
+    return character.get('source_file') or character.get('name')
+
+
+def character_hash(character: dict) -> str:
+    """Hash of the indexed content of one character."""
+    data = json.dumps(character_documents(character), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+# =============================================================================
+# READING
+# =============================================================================
+
+def _little_endian(view: memoryview, typecode: str) -> memoryview:
+    """A little-endian array stored in the index, as native integers.
+
+    On little-endian hosts this is the mapped memory itself; big-endian hosts
+    get a byteswapped copy.
+    """
+    if sys.byteorder == 'little':
+        return view.cast(typecode)
+    values = array(typecode, view.cast(typecode))
+    values.byteswap()
+    return memoryview(values)
+
+
+class SearchIndex:
+    """Read-only, memory-mapped view of an index directory."""
+
+    def __init__(self, directory: Path = DEFAULT_INDEX_DIR):
+        self.directory = Path(directory)
+        self._index_file = open(self.directory / INDEX_FILE, 'rb')
+        self._docs_file = open(self.directory / DOCS_FILE, 'rb')
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._docs = mmap.mmap(self._docs_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.term_count, self.document_count, self.average_length,
+         terms_at, text_at, postings_at, lengths_at, offsets_at) = HEADER.unpack_from(self._index, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.close()
+            raise ValueError(f"{self.directory}: not a version {INDEX_VERSION} search index")
+
+        view = memoryview(self._index)
+        self._terms = _little_endian(view[terms_at:terms_at + self.term_count * 16], 'I')
+        self._text = view[text_at:postings_at]
+        self._postings = _little_endian(view[postings_at:lengths_at], 'I')
+        self._lengths = _little_endian(view[lengths_at:lengths_at + self.document_count * 4], 'I')
+        self._offsets = _little_endian(view[offsets_at:offsets_at + (self.document_count + 1) * 8], 'Q')
+
+    def close(self) -> None:
+        for name in ('_terms', '_text', '_postings', '_lengths', '_offsets'):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        self._index.close()
+        self._docs.close()
+        self._index_file.close()
+        self._docs_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def term(self, i: int) -> str:
+        start, length = self._terms[i * 4], self._terms[i * 4 + 1]
+        return bytes(self._text[start:start + length]).decode('utf-8')
+
+    def _find(self, term: str) -> int:
+        """Binary search the term table. Returns the term number or -1."""
+        target = term.encode('utf-8')
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, length = self._terms[mid * 4], self._terms[mid * 4 + 1]
+            current = bytes(self._text[start:start + length])
+            if current < target:
+                lo = mid + 1
+            elif current > target:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def _postings_at(self, i: int):
+        start, count = self._terms[i * 4 + 2], self._terms[i * 4 + 3]
+        return self._postings[start:start + count * 2]
+
+    def postings(self, term: str) -> list[tuple]:
+        """(document number, term frequency) pairs for a term."""
+        i = self._find(term)
+        if i < 0:
+            return []
+        with self._postings_at(i) as flat:
+            return list(zip(flat[0::2], flat[1::2]))
+
+    def document(self, number: int) -> dict:
+        start, end = self._offsets[number], self._offsets[number + 1]
+        return json.loads(self._docs[start:end])
+
+    def document_length(self, number: int) -> int:
+        return self._lengths[number]
+
+    def search(self, query: str, limit: int = 10, kind: str = None, character: str = None) -> list[dict]:
+        """BM25-ranked documents for a query, best first."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            i = self._find(term)
+            if i < 0:
+                continue
+            with self._postings_at(i) as flat:
+                frequency = len(flat) // 2
+                idf = math.log(1 + (self.document_count - frequency + 0.5) / (frequency + 0.5))
+                norm = BM25_K1 * (1 - BM25_B)
+                scale = BM25_K1 * BM25_B / (self.average_length or 1)
+                lengths = self._lengths
+                for j in range(0, len(flat), 2):
+                    doc, tf = flat[j], flat[j + 1]
+                    scores[doc] += idf * tf * (BM25_K1 + 1) / (tf + norm + scale * lengths[doc])
+
+        if not kind and not character:
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [{**self.document(doc), 'score': round(score, 4)} for doc, score in best]
+
+        results = []
+        for doc, score in sorted(scores.items(), key=lambda item: -item[1]):
+            document = self.document(doc)
+            if kind and document['kind'] != kind:
+                continue
+            if character and document['character'].lower() != character.lower():
+                continue
+            results.append({**document, 'score': round(score, 4)})
+            if len(results) >= limit:
+                break
+        return results
+
+
+# =============================================================================
+# BUILDING
+# =============================================================================
+
+def _le_bytes(values: array) -> bytes:
+    """The array's bytes in little-endian order, as the header declares."""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _align(buffer: bytearray, boundary: int = 8) -> int:
+    buffer.extend(b'\0' * (-len(buffer) % boundary))
+    return len(buffer)
+
+
+def _write_index(directory: Path, documents: list[bytes], lengths: list[int],
+                 postings: dict) -> None:
+    """Write index.bin and docs.jsonl (via temp files, replaced atomically)."""
+    terms = sorted(postings, key=lambda t: t.encode('utf-8'))
+    term_table = array('I')
+    term_text = bytearray()
+    flat = array('I')
+    for term in terms:
+        encoded = term.encode('utf-8')
+        entries = postings[term]
+        term_table.extend((len(term_text), len(encoded), len(flat), len(entries) // 2))
+        term_text.extend(encoded)
+        flat.extend(entries)
+
+    offsets = array('Q', [0])
+    for line in documents:
+        offsets.append(offsets[-1] + len(line))
+
+    body = bytearray(HEADER.size)
+    terms_at = _align(body)
+    body.extend(_le_bytes(term_table))
+    text_at = _align(body)
+    body.extend(term_text)
+    postings_at = _align(body)
+    body.extend(_le_bytes(flat))
+    lengths_at = _align(body)
+    body.extend(_le_bytes(array('I', lengths)))
+    offsets_at = _align(body)
+    body.extend(_le_bytes(offsets))
+    average = sum(lengths) / len(lengths) if lengths else 0.0
+    HEADER.pack_into(body, 0, INDEX_MAGIC, INDEX_VERSION, len(terms), len(lengths), average,
+                     terms_at, text_at, postings_at, lengths_at, offsets_at)
+
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, data in ((DOCS_FILE, b''.join(documents)), (INDEX_FILE, bytes(body))):
+        tmp_path = directory / f"{name}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, directory / name)
+
+
+def load_manifest(directory: Path) -> dict:
+    """Indexed characters by source document: content hash and document number range."""
+    try:
+        with open(Path(directory) / MANIFEST_FILE, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {'version': INDEX_VERSION, 'characters': {}}
+    if manifest.get('version') != INDEX_VERSION:
+        return {'version': INDEX_VERSION, 'characters': {}}
+    return manifest
+
+
+def update_index(characters: list[dict], directory: Path = DEFAULT_INDEX_DIR,
+                 remove_missing: bool = True) -> dict:
+    """Bring the index in line with the importer's character list.
+
+    Unchanged characters keep their postings (copied from the existing index,
+    not re-tokenized); changed and new characters are tokenized; characters no
+    longer in the list are dropped unless `remove_missing` is False.
+    Returns counts of what happened.
+    """
+    directory = Path(directory)
+    manifest = load_manifest(directory)
+    old_entries = manifest['characters']
+    report = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0}
+
+    incoming = {}
+    for character in characters:
+        key = character_key(character)
+        if key:
+            incoming[key] = (character, character_hash(character))
+
+    existing = None
+    if old_entries and (directory / INDEX_FILE).exists():
+        existing = SearchIndex(directory)
+    else:
+        old_entries = {}
+
+    order = list(incoming) + ([k for k in old_entries if k not in incoming] if not remove_missing else [])
+    remap = {}
+    documents = []
+    lengths = []
+    new_postings = defaultdict(lambda: array('I'))
+    new_entries = {}
+
+    try:
+        for key in order:
+            entry = old_entries.get(key)
+            character, digest = incoming.get(key, (None, entry and entry['hash']))
+            first = len(lengths)
+            if entry and entry['hash'] == digest:
+                report['unchanged'] += 1
+                for old in range(entry['first'], entry['first'] + entry['count']):
+                    remap[old] = len(lengths)
+                    start, end = existing._offsets[old], existing._offsets[old + 1]
+                    documents.append(bytes(existing._docs[start:end]))
+                    lengths.append(existing.document_length(old))
+            else:
+                report['updated' if entry else 'added'] += 1
+                for document in character_documents(character):
+                    counts = Counter(tokenize(document['text']))
+                    number = len(lengths)
+                    for term, tf in counts.items():
+                        new_postings[term].extend((number, tf))
+                    preview = re.sub(r'\s+', ' ', document['text']).strip()[:200]
+                    meta = {'id': f"{key}#{document['kind']}:{number - first}",
+                            'character': document['character'], 'source': key,
+                            'kind': document['kind'], 'title': document['title'], 'preview': preview}
+                    documents.append(json.dumps(meta, ensure_ascii=False).encode('utf-8') + b'\n')
+                    lengths.append(sum(counts.values()))
+            new_entries[key] = {'hash': digest, 'first': first, 'count': len(lengths) - first}
+        report['removed'] = len([k for k in old_entries if k not in new_entries])
+
+        if report['added'] == report['updated'] == report['removed'] == 0 and existing:
+            report.update(documents=existing.document_count, terms=existing.term_count)
+            return report
+
+        # Carry over postings of unchanged characters under their new numbers
+        merged = {}
+        if existing:
+            for i in range(existing.term_count):
+                kept = array('I')
+                with existing._postings_at(i) as flat:
+                    for j in range(0, len(flat), 2):
+                        number = remap.get(flat[j])
+                        if number is not None:
+                            kept.extend((number, flat[j + 1]))
+                if kept:
+                    merged[existing.term(i)] = kept
+    finally:
+        if existing:
+            existing.close()
+
+    for term, entries in new_postings.items():
+        if term in merged:
+            merged[term].extend(entries)
+        else:
+            merged[term] = entries
+
+    # The old manifest's document numbers are wrong for the new index files:
+    # remove it first and write the new one last (atomically), so a crash in
+    # between leaves no manifest and the next run rebuilds from scratch
+    (directory / MANIFEST_FILE).unlink(missing_ok=True)
+    _write_index(directory, documents, lengths, merged)
+    tmp_path = directory / f"{MANIFEST_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': INDEX_VERSION, 'characters': new_entries}, f, ensure_ascii=False)
+    os.replace(tmp_path, directory / MANIFEST_FILE)
+
+    report.update(documents=len(lengths), terms=len(merged))
+    return report
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def load_characters(path: Path) -> list[dict]:
+    """Characters from an importer output file ({'characters': [...]}) or a plain list."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return data['characters'] if isinstance(data, dict) else data
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Search the extracted vault.")
+    parser.add_argument('--index-dir', type=Path, default=DEFAULT_INDEX_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="create or update the index from importer output")
+    build.add_argument('input', type=Path, help="importer output JSON")
+    build.add_argument('--keep-missing', action='store_true',
+                       help="keep characters that are not in the input")
+
+    query = commands.add_parser('query', help="search the index")
+    query.add_argument('text')
+    query.add_argument('-k', '--limit', type=int, default=10)
+    query.add_argument('--kind', choices=DOCUMENT_KINDS)
+    query.add_argument('--character')
+    query.add_argument('--json', action='store_true', help="print results as JSON")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        report = update_index(load_characters(args.input), args.index_dir,
+                              remove_missing=not args.keep_missing)
+        print(f"Indexed {report['documents']} documents, {report['terms']} terms in "
+              f"{time.perf_counter() - started:.2f}s ({report['added']} added, {report['updated']} updated, "
+              f"{report['unchanged']} unchanged, {report['removed']} removed)")
+        return
+
+    if not (args.index_dir / INDEX_FILE).exists():
+        sys.exit(f"No index in {args.index_dir} - run 'build' first")
+    started = time.perf_counter()
+    with SearchIndex(args.index_dir) as index:
+        results = index.search(args.text, args.limit, args.kind, args.character)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    for result in results:
+        print(f"{result['score']:7.3f}  {result['character']} / {result['kind']}: {result['title']}")
+        print(f"         {result['preview'][:120]}")
+    print(f"{len(results)} results in {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
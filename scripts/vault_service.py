@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+Local extraction service for the web app.
+
+Running import-vault-characters.py by hand pays Python startup, the
+python-docx import and a full re-parse of every document each time. This
+daemon loads the importer once and keeps its warm state between requests:
+compiled matchers and memoised section classifiers, the paragraphs of every
+document it has read (until the file changes) and the per-document
+extraction cache. The LLM parse path keeps its backend and response cache.
+
+Concurrent requests are batched: extraction runs on one worker that
+coalesces identical requests arriving within a short window, and parse
+requests arriving together are packed into shared LLM calls. Results are
+streamed back as NDJSON, one line per document as soon as it is ready.
+
+Endpoints (JSON bodies):
+    GET  /health                       -> status and cache statistics
+    POST /extract {"paths": [...], "fields": [...]}
+                                       -> NDJSON {"path", "character"} per document
+    POST /parse   {"name", "text"}     -> parse result
+    POST /parse   {"name", "text", "stream": true}
+                                       -> NDJSON {"key", "item"} per item, then {"result"}
+
+Usage:
+    python vault_service.py --port 8765
+    python vault_service.py --socket /tmp/vault.sock --backend fake
+    curl -s localhost:8765/extract -d '{"paths": ["C:/.../Cove.docx"]}'
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import queue
+import signal
+import socketserver
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from extraction_cache import ExtractionCache
+from vault_modules import load_importer
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# How long a worker waits for more requests to join a batch
+BATCH_WINDOW = 0.005
+MAX_BATCH = 32
+MAX_BODY_BYTES = 16 << 20
+
+
+def _log(message: str) -> None:
+    print(f"[vault-service] {message}", file=sys.stderr, flush=True)
+
+
+class _QuietStdout:
+    """Discards stdout (the importer's and parser's progress output) while in use.
+
+    contextlib.redirect_stdout swaps the process-wide sys.stdout, so when
+    worker and handler threads overlap one can restore another's discarded
+    stream. Here the first thread in swaps it and the last one out restores
+    it. Service logs go to stderr and are unaffected.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._saved = None
+
+    @contextlib.contextmanager
+    def __call__(self):
+        with self._lock:
+            if self._depth == 0:
+                self._saved = sys.stdout
+                sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+            self._depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._depth -= 1
+                if self._depth == 0:
+                    sys.stdout.close()
+                    sys.stdout = self._saved
+
+
+_quiet = _QuietStdout()
+
+
+class DocumentCache:
+    """Paragraphs of each document, reused until its mtime or size changes."""
+
+    def __init__(self, read_paragraphs):
+        self.read_paragraphs = read_paragraphs
+        self.documents = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def paragraphs(self, path: str) -> list[str]:
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self.documents.get(path)
+            if cached and cached[0] == signature:
+                self.hits += 1
+                return cached[1]
+        paragraphs = self.read_paragraphs(path)
+        with self._lock:
+            self.misses += 1
+            self.documents[path] = (signature, paragraphs)
+        return paragraphs
+
+    def forget(self, path: str) -> None:
+        with self._lock:
+            self.documents.pop(path, None)
+
+
+class _BatchWorker:
+    """A worker thread that takes jobs off a queue in batches.
+
+    Jobs that arrive within BATCH_WINDOW of each other (up to MAX_BATCH) are
+    handed to `process(jobs)` together; each job is (key, payload, future).
+    """
+
+    def __init__(self, process, name: str):
+        self.process = process
+        self.jobs = queue.Queue()
+        self.batches = 0
+        self.jobs_done = 0
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, key, payload) -> Future:
+        future = Future()
+        self.jobs.put((key, payload, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.jobs.get()]
+            deadline = time.monotonic() + BATCH_WINDOW
+            while len(batch) < MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.jobs.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.batches += 1
+            self.jobs_done += len(batch)
+            try:
+                self.process(batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+class ExtractionService:
+    """extract_character() behind a batching worker with warm caches."""
+
+    def __init__(self, importer, cache: ExtractionCache = None):
+        self.importer = importer
+        self.cache = cache if cache is not None else ExtractionCache(importer.EXTRACTOR_VERSION)
+        self.documents = DocumentCache(importer.extract_paragraphs)
+        self.coalesced = 0
+        # Held while the cache is used, so save() can run beside the worker
+        self._cache_lock = threading.Lock()
+        # One worker: the extraction cache is not thread-safe, and extraction
+        # holds the GIL anyway
+        self.worker = _BatchWorker(self._process, 'extraction-worker')
+
+    def submit(self, path: str, fields: list[str] = None) -> Future:
+        return self.worker.submit((os.path.abspath(path), tuple(fields) if fields else None), None)
+
+    def _process(self, batch):
+        by_key = defaultdict(list)
+        for key, _, future in batch:
+            by_key[key].append(future)
+        self.coalesced += len(batch) - len(by_key)
+        for (path, fields), futures in by_key.items():
+            try:
+                result = self.extract(path, list(fields) if fields else None)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future in futures:
+                future.set_result(result)
+
+    def extract(self, path: str, fields: list[str] = None) -> dict:
+        """Extract one document (not thread-safe; the worker calls this)."""
+        importer = self.importer
+        filename = os.path.basename(path)
+        # The importer reports progress on stdout
+        with _quiet():
+            if 'ideas' in filename.lower():
+                document = importer.extract_ideas_document(path)
+                if document and fields:
+                    document = {f: document.get(f) for f in ['name'] + fields if f in document}
+                return document
+            paragraphs = self.documents.paragraphs(path)
+            with self._cache_lock:
+                character = importer.extract_character(path, self.cache, fields, paragraphs=paragraphs)
+                self.cache.rollover()
+        return character
+
+    def save(self, path: str) -> None:
+        """Write the extraction cache, so a restart starts warm."""
+        with self._cache_lock:
+            self.cache.save(path)
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.worker.jobs_done,
+            'batches': self.worker.batches,
+            'coalesced': self.coalesced,
+            'documents': {'hits': self.documents.hits, 'misses': self.documents.misses},
+            'extraction_cache': self.cache.stats(),
+        }
+
+
+class ParseService:
+    """The LLM parse path (test_parser) with a warm backend and response cache.
+
+    Non-streaming requests that arrive together are packed into shared
+    requests with parse_batch(); streaming requests are parsed on their own.
+    """
+
+    def __init__(self, backend_name: str = 'gemini', model_name: str = None, fake_latency: float = 0.05):
+        import test_parser
+        from llm_batching import pack_batches
+        from llm_cache import ResponseCache
+        from llm_client import make_backend
+
+        self.parser = test_parser
+        self.pack_batches = pack_batches
+        self.backend = make_backend(backend_name, model_name, fake_latency=fake_latency)
+        self.cache = ResponseCache()
+        self.worker = _BatchWorker(self._process, 'parse-worker')
+
+    def submit(self, name: str, text: str) -> Future:
+        return self.worker.submit(name, text)
+
+    def _process(self, batch):
+        # Requests for the same name join one parse; the same name with
+        # different text is parsed separately
+        groups = {}
+        separate = []
+        for name, text, future in batch:
+            group = groups.setdefault(name, (text, []))
+            if group[0] == text:
+                group[1].append(future)
+            else:
+                separate.append((name, text, future))
+
+        documents = [(name, text) for name, (text, _) in groups.items()]
+        with _quiet():
+            for documents_batch in self.pack_batches(documents):
+                results = self.parser.parse_batch(documents_batch, backend=self.backend, cache=self.cache)
+                for name, _ in documents_batch:
+                    for future in groups[name][1]:
+                        future.set_result(results[name])
+            for name, text, future in separate:
+                future.set_result(self.parse(name, text))
+
+    def parse(self, name: str, text: str, on_item=None) -> dict:
+        with _quiet():
+            return self.parser.parse_document(text, name, backend=self.backend, cache=self.cache,
+                                              stream=on_item is not None, on_item=on_item)
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.worker.jobs_done,
+            'batches': self.worker.batches,
+            'model': self.backend.model_name,
+            'response_cache': self.cache.stats(),
+        }
+
+
+# =============================================================================
+# HTTP API
+# =============================================================================
+
+class VaultRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'VaultService/1'
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, data) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _stream_line(self, data) -> None:
+        line = (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+        self.wfile.write(f"{len(line):x}\r\n".encode('ascii') + line + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+        status = {'status': 'ok', 'extraction': self.server.extraction.stats()}
+        if self.server.parsing:
+            status['parse'] = self.server.parsing.stats()
+        self._send_json(200, status)
+
+    def do_POST(self):
+        try:
+            body = self._read_body()
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        if self.path == '/extract':
+            self._extract(body)
+        elif self.path == '/parse':
+            self._parse(body)
+        else:
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def _extract(self, body: dict) -> None:
+        paths = body.get('paths') or ([body['path']] if body.get('path') else [])
+        fields = body.get('fields')
+        if not paths:
+            self._send_json(400, {'error': "Give 'path' or 'paths'"})
+            return
+        unknown = [f for f in fields or [] if f not in self.server.extraction.importer.CHARACTER_FIELDS]
+        if unknown:
+            self._send_json(400, {'error': f"Unknown field(s): {', '.join(unknown)}"})
+            return
+
+        pending = {self.server.extraction.submit(path, fields): path for path in paths}
+        done = threading.Condition()
+        finished = []
+
+        def on_done(future):
+            with done:
+                finished.append(future)
+                done.notify()
+
+        for future in pending:
+            future.add_done_callback(on_done)
+
+        # Results go out in completion order as they finish
+        self._start_stream()
+        for _ in range(len(pending)):
+            with done:
+                while not finished:
+                    done.wait()
+                future = finished.pop(0)
+            error = future.exception()
+            if error is not None:
+                self._stream_line({'path': pending[future], 'error': str(error)})
+            else:
+                self._stream_line({'path': pending[future], 'character': future.result()})
+        self._end_stream()
+
+    def _parse(self, body: dict) -> None:
+        parsing = self.server.parsing
+        if parsing is None:
+            self._send_json(503, {'error': "Parsing is disabled (start with --backend)"})
+            return
+        name = body.get('name')
+        text = body.get('text')
+        if not name or not text:
+            self._send_json(400, {'error': "Give 'name' and 'text'"})
+            return
+
+        if not body.get('stream'):
+            try:
+                self._send_json(200, parsing.submit(name, text).result())
+            except Exception as e:
+                self._send_json(502, {'error': str(e)})
+            return
+
+        # Chunked documents report items from several threads
+        lock = threading.Lock()
+
+        def on_item(key, item):
+            with lock:
+                self._stream_line({'key': key, 'item': item})
+
+        self._start_stream()
+        try:
+            result = parsing.parse(name, text, on_item)
+            self._stream_line({'result': result})
+        except Exception as e:
+            self._stream_line({'error': str(e)})
+        self._end_stream()
+
+
+class VaultHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class VaultUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(extraction: ExtractionService, parsing: ParseService = None,
+                host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, socket_path: str = None,
+                verbose: bool = False):
+    """An HTTP server on host:port, or on a Unix socket when `socket_path` is given."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = VaultUnixServer(socket_path, VaultRequestHandler)
+    else:
+        server = VaultHTTPServer((host, port), VaultRequestHandler)
+    server.extraction = extraction
+    server.parsing = parsing
+    server.verbose = verbose
+    return server
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Serve vault extraction and parsing over local HTTP.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--socket', default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument('--backend', choices=['gemini', 'fake', 'none'], default='none',
+                        help="LLM backend for /parse ('none' disables it)")
+    parser.add_argument('--model', default=None)
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    importer = load_importer()
+    cache = ExtractionCache.load(importer.EXTRACTION_CACHE_FILE, importer.EXTRACTOR_VERSION)
+    extraction = ExtractionService(importer, cache)
+    parsing = ParseService(args.backend, args.model) if args.backend != 'none' else None
+    server = make_server(extraction, parsing, args.host, args.port, args.socket, args.verbose)
+
+    where = args.socket or f"http://{args.host}:{args.port}"
+    _log(f"Ready in {time.perf_counter() - started:.2f}s on {where}")
+    # Stopped by a service manager (SIGTERM) as well as Ctrl+C, the cache is saved
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+        extraction.save(importer.EXTRACTION_CACHE_FILE)
+        _log(f"Saved extraction cache to {importer.EXTRACTION_CACHE_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Watch the characters folder and re-extract documents as players save them.
+
+Players edit their Word documents continually. Instead of re-running the
+whole importer by hand, this keeps the importer warm (see vault_service.py)
+and re-extracts only the documents that were created, modified or deleted,
+then rewrites the import output, NPC registry and search index and, with
+--push, sends the changed characters to the import API.
+
+Changes are detected with inotify on Linux and by polling modification time
+and size elsewhere (including Windows). Word's lock and temp files ("~$Cove.docx",
+"~WRL0001.tmp") are ignored, and a document is only read once it has stopped
+changing for DEBOUNCE_SECONDS, so a save is picked up well within a second.
+
+Usage:
+    python vault_watch.py
+    python vault_watch.py --dir ./Charactere --push
+    python vault_watch.py --poll              (force polling)
+"""
+
+import argparse
+import contextlib
+import ctypes
+import ctypes.util
+import io
+import os
+import select
+import struct
+import sys
+import time
+
+from character_stream import CharacterWriter
+from extraction_cache import ExtractionCache
+from npc_registry import NPCRegistry
+from vault_modules import load_importer
+from vault_search import DEFAULT_INDEX_DIR, update_index
+from vault_service import ExtractionService
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+POLL_INTERVAL = 0.25
+# A document must be unchanged this long before it is read
+DEBOUNCE_SECONDS = 0.25
+
+
+def is_document(filename: str) -> bool:
+    """Word documents, excluding Word's "~$" lock files and other temp files."""
+    return filename.lower().endswith('.docx') and not filename.startswith('~')
+
+
+def _signature(path: str):
+    """(mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def scan_documents(directory: str) -> dict:
+    """filename -> (mtime_ns, size) for every document in `directory`."""
+    found = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and is_document(entry.name):
+                stat = entry.stat()
+                found[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return found
+
+
+def _same_character(character: dict, previous: dict) -> bool:
+    """Whether two extractions of a document differ only in their import time."""
+    if previous is None:
+        return False
+    return ({k: v for k, v in character.items() if k != 'imported_at'}
+            == {k: v for k, v in previous.items() if k != 'imported_at'})
+
+
+class PollingWatcher:
+    """Detects changes by rescanning the directory's modification times and sizes."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.known = scan_documents(directory)
+
+    def wait(self, timeout: float) -> set[str]:
+        """Filenames that changed since the last call, after up to `timeout` seconds."""
+        time.sleep(min(timeout, POLL_INTERVAL))
+        current = scan_documents(self.directory)
+        changed = {name for name in current.keys() | self.known.keys()
+                   if current.get(name) != self.known.get(name)}
+        self.known = current
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Detects changes from Linux inotify events (through libc, no extra packages)."""
+
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, directory: str):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = (self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO
+                | self.IN_CREATE | self.IN_DELETE)
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"Cannot watch {directory}")
+
+    def wait(self, timeout: float) -> set[str]:
+        """Filenames with events, after up to `timeout` seconds."""
+        changed = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if is_document(name):
+                changed.add(name)
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def make_watcher(directory: str, polling: bool = False):
+    """An InotifyWatcher where the platform supports it, else a PollingWatcher."""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directory)
+
+
+class VaultWatcher:
+    """Keeps the import output in step with the documents in one directory."""
+
+    def __init__(self, importer, directory: str, output_file: str, cache: ExtractionCache = None,
+                 cache_file: str = None, index_dir=DEFAULT_INDEX_DIR, push: bool = False,
+                 registry: NPCRegistry = None, registry_file: str = None):
+        self.importer = importer
+        self.directory = directory
+        self.output_file = output_file
+        self.cache_file = cache_file
+        self.registry = registry
+        self.registry_file = registry_file
+        self.index_dir = index_dir
+        self.push = push
+        self.service = ExtractionService(importer, cache)
+        self.characters = {}     # filename -> character
+        self.signatures = {}     # filename -> (mtime_ns, size) when last extracted
+        self.pending = {}        # filename -> (signature, time it was last seen changing)
+
+    def extract(self, filename: str):
+        path = os.path.join(self.directory, filename)
+        signature = _signature(path)
+        try:
+            character = self.service.submit(path).result()
+        except Exception as e:
+            print(f"  {filename}: {e}")
+            return None
+        self.signatures[filename] = signature
+        if character:
+            previous = self.characters.get(filename)
+            if self.registry is not None:
+                if previous and previous['name'] != character['name']:
+                    self.registry.remove_character(previous['name'])
+                if 'relationships' in character:
+                    # Tags each relationship with its 'npc_id', as the importer does
+                    self.registry.update_character(character['name'], character.get('relationships'))
+            self.characters[filename] = character
+        return character
+
+    def initial_import(self) -> None:
+        """Extract every document (mostly cache hits) and write the output."""
+        for filename in sorted(scan_documents(self.directory)):
+            self.extract(filename)
+        self.publish([])
+        print(f"Watching {self.directory} ({len(self.characters)} characters)")
+
+    def notice(self, filenames) -> None:
+        """Start (or restart) the debounce window for changed documents."""
+        now = time.monotonic()
+        for filename in filenames:
+            self.pending[filename] = (_signature(os.path.join(self.directory, filename)), now)
+
+    def settle(self) -> None:
+        """Re-extract or drop documents that have stopped changing."""
+        now = time.monotonic()
+        changed = []
+        removed = []
+        for filename, (signature, seen) in list(self.pending.items()):
+            if now - seen < DEBOUNCE_SECONDS:
+                continue
+            current = _signature(os.path.join(self.directory, filename))
+            if current != signature:
+                # Still being written
+                self.pending[filename] = (current, now)
+                continue
+            del self.pending[filename]
+            if current is None:
+                character = self.characters.pop(filename, None)
+                if character is not None:
+                    if self.registry is not None:
+                        self.registry.remove_character(character['name'])
+                    self.signatures.pop(filename, None)
+                    self.service.cache.drop(filename)
+                    removed.append(filename)
+            elif current != self.signatures.get(filename):
+                started = time.monotonic()
+                previous = self.characters.get(filename)
+                character = self.extract(filename)
+                # A save without edits (or a touch) leaves the character as it was
+                if character and not _same_character(character, previous):
+                    changed.append(character)
+                    print(f"  Updated {character['name']} from {filename} "
+                          f"({time.monotonic() - started:.2f}s)")
+        for filename in removed:
+            print(f"  Removed {filename}")
+        if changed or removed:
+            self.publish(changed)
+
+    def publish(self, changed: list[dict]) -> None:
+        """Write the output file, cache, registry and search index; push `changed` to the API."""
+        characters = [self.characters[name] for name in sorted(self.characters)]
+        with CharacterWriter(self.output_file) as writer:
+            for character in characters:
+                writer.write(character)
+        if self.cache_file:
+            self.service.save(self.cache_file)
+        if self.registry is not None and self.registry_file:
+            self.registry.save(self.registry_file)
+        update_index(characters, self.index_dir)
+        if self.push and changed:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = self.importer.send_to_api(changed, self.importer.API_URL)
+            if 'error' in result:
+                print(f"  API: {result['error']}")
+            else:
+                print(f"  API: {result.get('imported', 0)} imported, {result.get('updated', 0)} updated")
+
+    def run(self, watcher) -> None:
+        while True:
+            timeout = DEBOUNCE_SECONDS if self.pending else 1.0
+            self.notice(watcher.wait(timeout))
+            self.settle()
+
+
+def main(argv: list[str] = None):
+    importer = load_importer()
+    parser = argparse.ArgumentParser(description="Re-extract vault characters as their documents change.")
+    parser.add_argument('--dir', default=importer.CHARACTERS_DIR, help="folder of character documents")
+    parser.add_argument('--output', default=importer.OUTPUT_FILE, help="import JSON to keep up to date")
+    parser.add_argument('--push', action='store_true', help=f"send changed characters to {importer.API_URL}")
+    parser.add_argument('--poll', action='store_true', help="poll for changes instead of using inotify")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.dir):
+        print(f"Error: Directory not found: {args.dir}")
+        return
+
+    cache = ExtractionCache.load(importer.EXTRACTION_CACHE_FILE, importer.EXTRACTOR_VERSION)
+    registry = NPCRegistry.load(importer.NPC_REGISTRY_FILE)
+    vault = VaultWatcher(importer, args.dir, args.output, cache, importer.EXTRACTION_CACHE_FILE,
+                         push=args.push, registry=registry, registry_file=importer.NPC_REGISTRY_FILE)
+    watcher = make_watcher(args.dir, args.poll)
+    vault.initial_import()
+    print(f"Using {type(watcher).__name__}; press Ctrl+C to stop")
+    try:
+        vault.run(watcher)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+if __name__ == "__main__":
+    main()